@@ -0,0 +1,19 @@
+'''Benchmarks the build time of the ConvolutionAware initializer.
+
+Builds the kernels of convolutions of increasing widths and prints the
+time spent in the initializer, which dominates the construction of wide
+models such as ResNet50 or DenseNet-FCN when it is used.
+'''
+from __future__ import print_function
+
+import time
+
+from keras_contrib.initializers import ConvolutionAware
+
+shapes = [(3, 3, 64, 64), (3, 3, 256, 256), (3, 3, 512, 512),
+          (1, 1, 1024, 2048), (3, 3, 1024, 1024)]
+init = ConvolutionAware(seed=0)
+for shape in shapes:
+    start = time.time()
+    init(shape)
+    print('%-20s %8.3f s' % (shape, time.time() - start))
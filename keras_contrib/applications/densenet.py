@@ -65,6 +65,9 @@ from keras.layers import GlobalAveragePooling2D
 from keras.layers import Input
 from keras.layers import concatenate
 from keras.layers import BatchNormalization
+from keras.engine import Layer
+from keras.engine import InputSpec
+from keras import initializers
 from keras.regularizers import l2
 from keras.utils.layer_utils import convert_all_kernels_in_model
 from keras.utils.data_utils import get_file
@@ -72,8 +75,10 @@ from keras.engine.topology import get_source_inputs
 from keras_applications.imagenet_utils import _obtain_input_shape
 from keras.applications.imagenet_utils import decode_predictions
 from keras.applications.imagenet_utils import preprocess_input as _preprocess_input
+from keras.utils.generic_utils import get_custom_objects
 import keras.backend as K
 
+from keras_contrib import backend as KC
 from keras_contrib.layers.convolutional import SubPixelUpscaling
 from keras_contrib.layers.convolutional import SpatialActivation2D
 
@@ -117,7 +122,8 @@ def DenseNet(input_shape=None,
              pooling=None,
              classes=10,
              activation='softmax',
-             transition_pooling='avg'):
+             transition_pooling='avg',
+             efficient=False):
     '''Instantiate the DenseNet architecture.
 
     The model and the weights are compatible with both
@@ -181,6 +187,12 @@ def DenseNet(input_shape=None,
             None for no pooling during scale transition blocks. Please note that this
             default differs from the DenseNetFCN paper in accordance with the DenseNet
             paper.
+        efficient: if True, builds the memory-efficient variant of the dense
+            blocks. The concatenation, batch normalization and relu preceding
+            each convolution are recomputed during the backward pass instead of
+            being stored, so the memory used by a dense block grows linearly
+            with its depth at the cost of extra computation during training.
+            Gradient checkpointing is only available with the TensorFlow backend.
 
     # Returns
         A Keras model instance.
@@ -223,7 +235,7 @@ def DenseNet(input_shape=None,
     x = __create_dense_net(classes, img_input, include_top, depth, nb_dense_block,
                            growth_rate, nb_filter, nb_layers_per_block, bottleneck,
                            reduction, dropout_rate, weight_decay, subsample_initial_block,
-                           pooling, activation, transition_pooling)
+                           pooling, activation, transition_pooling, efficient)
 
     # Ensure that the model takes into account
     # any potential predecessors of `input_tensor`.
@@ -306,7 +318,7 @@ def DenseNetFCN(input_shape=None, nb_dense_block=5, growth_rate=16, nb_layers_pe
                 reduction=0.0, dropout_rate=0.0, weight_decay=1E-4, init_conv_filters=48,
                 include_top=True, weights=None, input_tensor=None, classes=1, activation='softmax',
                 upsampling_conv=128, upsampling_type='deconv', early_transition=False,
-                transition_pooling='max', initial_kernel_size=(3, 3)):
+                transition_pooling='max', initial_kernel_size=(3, 3), efficient=False):
     '''Instantiate the DenseNet FCN architecture.
         Note that when using TensorFlow,
         for best performance you should set
@@ -354,6 +366,12 @@ def DenseNetFCN(input_shape=None, nb_dense_block=5, growth_rate=16, nb_layers_pe
                 transition up to reduce the network size.
             initial_kernel_size: The first Conv2D kernel might vary in size based on the
                 application, this parameter makes it configurable.
+            efficient: if True, builds the memory-efficient variant of the dense
+                blocks. The concatenation, batch normalization and relu preceding
+                each convolution are recomputed during the backward pass instead of
+                being stored, so the memory used by a dense block grows linearly
+                with its depth at the cost of extra computation during training.
+                Gradient checkpointing is only available with the TensorFlow backend.
 
         # Returns
             A Keras model instance.
@@ -417,7 +435,8 @@ def DenseNetFCN(input_shape=None, nb_dense_block=5, growth_rate=16, nb_layers_pe
                                reduction, dropout_rate, weight_decay,
                                nb_layers_per_block, upsampling_conv, upsampling_type,
                                init_conv_filters, input_shape, activation,
-                               early_transition, transition_pooling, initial_kernel_size)
+                               early_transition, transition_pooling, initial_kernel_size,
+                               efficient)
 
     # Ensure that the model takes into account
     # any potential predecessors of `input_tensor`.
@@ -441,12 +460,14 @@ def DenseNetImageNet121(input_shape=None,
                         input_tensor=None,
                         pooling=None,
                         classes=1000,
-                        activation='softmax'):
+                        activation='softmax',
+                        efficient=False):
     return DenseNet(input_shape, depth=121, nb_dense_block=4, growth_rate=32, nb_filter=64,
                     nb_layers_per_block=[6, 12, 24, 16], bottleneck=bottleneck, reduction=reduction,
                     dropout_rate=dropout_rate, weight_decay=weight_decay, subsample_initial_block=True,
                     include_top=include_top, weights=weights, input_tensor=input_tensor,
-                    pooling=pooling, classes=classes, activation=activation)
+                    pooling=pooling, classes=classes, activation=activation,
+                    efficient=efficient)
 
 
 def DenseNetImageNet169(input_shape=None,
@@ -459,12 +480,14 @@ def DenseNetImageNet169(input_shape=None,
                         input_tensor=None,
                         pooling=None,
                         classes=1000,
-                        activation='softmax'):
+                        activation='softmax',
+                        efficient=False):
     return DenseNet(input_shape, depth=169, nb_dense_block=4, growth_rate=32, nb_filter=64,
                     nb_layers_per_block=[6, 12, 32, 32], bottleneck=bottleneck, reduction=reduction,
                     dropout_rate=dropout_rate, weight_decay=weight_decay, subsample_initial_block=True,
                     include_top=include_top, weights=weights, input_tensor=input_tensor,
-                    pooling=pooling, classes=classes, activation=activation)
+                    pooling=pooling, classes=classes, activation=activation,
+                    efficient=efficient)
 
 
 def DenseNetImageNet201(input_shape=None,
@@ -477,12 +500,14 @@ def DenseNetImageNet201(input_shape=None,
                         input_tensor=None,
                         pooling=None,
                         classes=1000,
-                        activation='softmax'):
+                        activation='softmax',
+                        efficient=False):
     return DenseNet(input_shape, depth=201, nb_dense_block=4, growth_rate=32, nb_filter=64,
                     nb_layers_per_block=[6, 12, 48, 32], bottleneck=bottleneck, reduction=reduction,
                     dropout_rate=dropout_rate, weight_decay=weight_decay, subsample_initial_block=True,
                     include_top=include_top, weights=weights, input_tensor=input_tensor,
-                    pooling=pooling, classes=classes, activation=activation)
+                    pooling=pooling, classes=classes, activation=activation,
+                    efficient=efficient)
 
 
 def DenseNetImageNet264(input_shape=None,
@@ -495,12 +520,14 @@ def DenseNetImageNet264(input_shape=None,
                         input_tensor=None,
                         pooling=None,
                         classes=1000,
-                        activation='softmax'):
+                        activation='softmax',
+                        efficient=False):
     return DenseNet(input_shape, depth=264, nb_dense_block=4, growth_rate=32, nb_filter=64,
                     nb_layers_per_block=[6, 12, 64, 48], bottleneck=bottleneck, reduction=reduction,
                     dropout_rate=dropout_rate, weight_decay=weight_decay, subsample_initial_block=True,
                     include_top=include_top, weights=weights, input_tensor=input_tensor,
-                    pooling=pooling, classes=classes, activation=activation)
+                    pooling=pooling, classes=classes, activation=activation,
+                    efficient=efficient)
 
 
 def DenseNetImageNet161(input_shape=None,
@@ -513,25 +540,190 @@ def DenseNetImageNet161(input_shape=None,
                         input_tensor=None,
                         pooling=None,
                         classes=1000,
-                        activation='softmax'):
+                        activation='softmax',
+                        efficient=False):
     return DenseNet(input_shape, depth=161, nb_dense_block=4, growth_rate=48, nb_filter=96,
                     nb_layers_per_block=[6, 12, 36, 24], bottleneck=bottleneck, reduction=reduction,
                     dropout_rate=dropout_rate, weight_decay=weight_decay, subsample_initial_block=True,
                     include_top=include_top, weights=weights, input_tensor=input_tensor,
-                    pooling=pooling, classes=classes, activation=activation)
+                    pooling=pooling, classes=classes, activation=activation,
+                    efficient=efficient)
 
 
 def name_or_none(prefix, name):
     return prefix + name if (prefix is not None and name is not None) else None
 
 
-def __conv_block(ip, nb_filter, bottleneck=False, dropout_rate=None, weight_decay=1e-4, block_prefix=None, dims=2):
+class ConcatBNReLU(Layer):
+    '''Concatenation followed by batch normalization and relu.
+
+    Building block of the memory-efficient DenseNet. During training the
+    concatenated and normalized feature maps are recomputed in the backward
+    pass rather than stored, so only the individual inputs are kept in memory.
+    See [Memory-Efficient Implementation of DenseNets](https://arxiv.org/abs/1707.06990).
+
+    The weights are `[gamma, beta, moving_mean, moving_variance]`, the same
+    as those of a `BatchNormalization` layer applied to the concatenation,
+    so weights can be exchanged with the standard DenseNet.
+
+    # Arguments
+        axis: Integer, the axis along which the inputs are concatenated
+            and normalized (typically the features axis).
+        momentum: Momentum for the moving mean and the moving variance.
+        epsilon: Small float added to variance to avoid dividing by zero.
+        beta_initializer: Initializer for the beta weight.
+        gamma_initializer: Initializer for the gamma weight.
+        moving_mean_initializer: Initializer for the moving mean.
+        moving_variance_initializer: Initializer for the moving variance.
+
+    # Input shape
+        A list of tensors which have the same shape except along `axis`.
+
+    # Output shape
+        The shape of the concatenation of the inputs along `axis`.
+    '''
+
+    def __init__(self,
+                 axis=-1,
+                 momentum=0.99,
+                 epsilon=1e-3,
+                 beta_initializer='zeros',
+                 gamma_initializer='ones',
+                 moving_mean_initializer='zeros',
+                 moving_variance_initializer='ones',
+                 **kwargs):
+        super(ConcatBNReLU, self).__init__(**kwargs)
+        self.axis = axis
+        self.momentum = momentum
+        self.epsilon = epsilon
+        self.beta_initializer = initializers.get(beta_initializer)
+        self.gamma_initializer = initializers.get(gamma_initializer)
+        self.moving_mean_initializer = initializers.get(moving_mean_initializer)
+        self.moving_variance_initializer = initializers.get(moving_variance_initializer)
+
+    def build(self, input_shape):
+        if not isinstance(input_shape, list):
+            input_shape = [input_shape]
+        dims = [shape[self.axis] for shape in input_shape]
+        if None in dims:
+            raise ValueError('Axis ' + str(self.axis) + ' of the input tensors '
+                             'should have a defined dimension but the layer '
+                             'received inputs with shapes ' + str(input_shape) + '.')
+        self.input_spec = [InputSpec(ndim=len(shape), axes={self.axis: dim})
+                           for shape, dim in zip(input_shape, dims)]
+        shape = (sum(dims),)
+
+        self.gamma = self.add_weight(shape=shape,
+                                     name='gamma',
+                                     initializer=self.gamma_initializer)
+        self.beta = self.add_weight(shape=shape,
+                                    name='beta',
+                                    initializer=self.beta_initializer)
+        self.moving_mean = self.add_weight(shape=shape,
+                                           name='moving_mean',
+                                           initializer=self.moving_mean_initializer,
+                                           trainable=False)
+        self.moving_variance = self.add_weight(shape=shape,
+                                               name='moving_variance',
+                                               initializer=self.moving_variance_initializer,
+                                               trainable=False)
+        self.built = True
+
+    def call(self, inputs, training=None):
+        if not isinstance(inputs, list):
+            inputs = [inputs]
+        ndim = K.ndim(inputs[0])
+        axis = self.axis % ndim
+        reduction_axes = [i for i in range(ndim) if i != axis]
+        broadcast_shape = [1] * ndim
+        broadcast_shape[axis] = K.int_shape(self.gamma)[0]
+
+        # as in `BatchNormalization`, the statistics are only broadcast when
+        # the features are not on the last axis
+        needs_broadcasting = axis != ndim - 1
+
+        def normalize_inference():
+            x = K.concatenate(inputs, axis=axis)
+            if needs_broadcasting:
+                x = K.batch_normalization(x,
+                                          K.reshape(self.moving_mean, broadcast_shape),
+                                          K.reshape(self.moving_variance, broadcast_shape),
+                                          K.reshape(self.beta, broadcast_shape),
+                                          K.reshape(self.gamma, broadcast_shape),
+                                          axis=axis,
+                                          epsilon=self.epsilon)
+            else:
+                x = K.batch_normalization(x,
+                                          self.moving_mean,
+                                          self.moving_variance,
+                                          self.beta,
+                                          self.gamma,
+                                          axis=axis,
+                                          epsilon=self.epsilon)
+            return K.relu(x)
+
+        if training in {0, False}:
+            return normalize_inference()
+
+        def concat_bn_relu(gamma, beta, *features):
+            x = K.concatenate(list(features), axis=axis)
+            mean, variance = KC.moments(x, reduction_axes, keep_dims=True)
+            x = (x - mean) / K.sqrt(variance + self.epsilon)
+            x = x * K.reshape(gamma, broadcast_shape) + K.reshape(beta, broadcast_shape)
+            return K.relu(x)
+
+        normed_training = KC.recompute_grad(concat_bn_relu)(self.gamma, self.beta, *inputs)
+
+        # the statistics for the moving averages do not require gradients,
+        # so the concatenation used to compute them is not kept either.
+        x = K.stop_gradient(K.concatenate(inputs, axis=axis))
+        mean, variance = KC.moments(x, reduction_axes)
+        if K.backend() != 'cntk':
+            sample_size = K.prod([K.shape(x)[i] for i in reduction_axes])
+            sample_size = K.cast(sample_size, dtype=K.dtype(x))
+
+            # sample variance - unbiased estimator of population variance
+            variance *= sample_size / (sample_size - (1.0 + self.epsilon))
+
+        self.add_update([K.moving_average_update(self.moving_mean, mean, self.momentum),
+                         K.moving_average_update(self.moving_variance, variance, self.momentum)],
+                        inputs)
+
+        return K.in_train_phase(normed_training, normalize_inference, training=training)
+
+    def compute_output_shape(self, input_shape):
+        if not isinstance(input_shape, list):
+            return input_shape
+        output_shape = list(input_shape[0])
+        for shape in input_shape[1:]:
+            output_shape[self.axis] += shape[self.axis]
+        return tuple(output_shape)
+
+    def get_config(self):
+        config = {
+            'axis': self.axis,
+            'momentum': self.momentum,
+            'epsilon': self.epsilon,
+            'beta_initializer': initializers.serialize(self.beta_initializer),
+            'gamma_initializer': initializers.serialize(self.gamma_initializer),
+            'moving_mean_initializer': initializers.serialize(self.moving_mean_initializer),
+            'moving_variance_initializer': initializers.serialize(self.moving_variance_initializer)
+        }
+        base_config = super(ConcatBNReLU, self).get_config()
+        return dict(list(base_config.items()) + list(config.items()))
+
+
+get_custom_objects().update({'ConcatBNReLU': ConcatBNReLU})
+
+
+def __conv_block(ip, nb_filter, bottleneck=False, dropout_rate=None, weight_decay=1e-4, block_prefix=None, dims=2,
+                 efficient=False):
     '''
     Adds a convolution layer (with batch normalization and relu),
     and optionally a bottleneck layer.
 
     # Arguments
-        ip: Input tensor
+        ip: Input tensor, or list of the tensors to concatenate if `efficient`
         nb_filter: integer, the dimensionality of the output space
             (i.e. the number output of filters in the convolution)
         bottleneck: if True, adds a bottleneck convolution block
@@ -539,6 +731,8 @@ def __conv_block(ip, nb_filter, bottleneck=False, dropout_rate=None, weight_deca
         weight_decay: weight decay factor
         block_prefix: str, for unique layer naming
         dims: default of 2 for Conv2D, 1 for Conv1D, 0 for Dense.
+        efficient: if True, concatenates, normalizes and activates `ip`
+            with a memory-efficient `ConcatBNReLU` layer.
 
      # Input shape
         4D tensor with shape:
@@ -559,8 +753,11 @@ def __conv_block(ip, nb_filter, bottleneck=False, dropout_rate=None, weight_deca
     with K.name_scope('ConvBlock'):
         concat_axis = 1 if K.image_data_format() == 'channels_first' else -1
 
-        x = BatchNormalization(axis=concat_axis, epsilon=1.1e-5, name=name_or_none(block_prefix, '_bn'))(ip)
-        x = Activation('relu')(x)
+        if efficient:
+            x = ConcatBNReLU(axis=concat_axis, epsilon=1.1e-5, name=name_or_none(block_prefix, '_bn'))(ip)
+        else:
+            x = BatchNormalization(axis=concat_axis, epsilon=1.1e-5, name=name_or_none(block_prefix, '_bn'))(ip)
+            x = Activation('relu')(x)
 
         if bottleneck:
             inter_channel = nb_filter * 4
@@ -597,7 +794,7 @@ def __conv_block(ip, nb_filter, bottleneck=False, dropout_rate=None, weight_deca
 
 def __dense_block(x, nb_layers, nb_filter, growth_rate, bottleneck=False, dropout_rate=None,
                   weight_decay=1e-4, grow_nb_filters=True, return_concat_list=False,
-                  block_prefix=None, dims=2):
+                  block_prefix=None, dims=2, efficient=False):
     '''
     Build a dense_block where the output of each conv_block is fed
     to subsequent ones
@@ -617,6 +814,9 @@ def __dense_block(x, nb_layers, nb_filter, growth_rate, bottleneck=False, dropou
             feature maps along with the actual output
         block_prefix: str, for block unique naming
         dims: default of 2 for Conv2D, 1 for Conv1D, 0 for Dense.
+        efficient: if True, the growing feature maps are not concatenated
+            after each conv_block, every conv_block instead normalizes the
+            list of all preceding feature maps with a `ConcatBNReLU` layer.
 
     # Return
         If return_concat_list is True, returns a list of the output
@@ -632,16 +832,20 @@ def __dense_block(x, nb_layers, nb_filter, growth_rate, bottleneck=False, dropou
         x_list = [x]
 
         for i in range(nb_layers):
-            cb = __conv_block(x, growth_rate, bottleneck, dropout_rate, weight_decay,
+            cb = __conv_block(x_list if efficient else x, growth_rate, bottleneck, dropout_rate, weight_decay,
                               block_prefix=name_or_none(block_prefix, '_%i' % i),
-                              dims=dims)
+                              dims=dims, efficient=efficient)
             x_list.append(cb)
 
-            x = concatenate([x, cb], axis=concat_axis)
+            if not efficient:
+                x = concatenate([x, cb], axis=concat_axis)
 
             if grow_nb_filters:
                 nb_filter += growth_rate
 
+        if efficient and nb_layers > 0:
+            x = concatenate(x_list, axis=concat_axis)
+
         if return_concat_list:
             return x, nb_filter, x_list
         else:
@@ -741,7 +945,8 @@ def __transition_up_block(ip, nb_filters, type='deconv', weight_decay=1E-4, bloc
 
 def __create_dense_net(nb_classes, img_input, include_top, depth=40, nb_dense_block=3, growth_rate=12, nb_filter=-1,
                        nb_layers_per_block=-1, bottleneck=False, reduction=0.0, dropout_rate=None, weight_decay=1e-4,
-                       subsample_initial_block=False, pooling=None, activation='softmax', transition_pooling='avg'):
+                       subsample_initial_block=False, pooling=None, activation='softmax', transition_pooling='avg',
+                       efficient=False):
     ''' Build the DenseNet model
 
     # Arguments
@@ -784,6 +989,7 @@ def __create_dense_net(nb_classes, img_input, include_top, depth=40, nb_dense_bl
             None for no pooling during scale transition blocks. Please note that this
             default differs from the DenseNetFCN paper in accordance with the DenseNet
             paper.
+        efficient: if True, builds memory-efficient dense blocks
 
     # Returns
         a keras tensor
@@ -850,7 +1056,7 @@ def __create_dense_net(nb_classes, img_input, include_top, depth=40, nb_dense_bl
         for block_idx in range(nb_dense_block - 1):
             x, nb_filter = __dense_block(x, nb_layers[block_idx], nb_filter, growth_rate, bottleneck=bottleneck,
                                          dropout_rate=dropout_rate, weight_decay=weight_decay,
-                                         block_prefix='dense_%i' % block_idx)
+                                         block_prefix='dense_%i' % block_idx, efficient=efficient)
             # add transition_block
             x = __transition_block(x, nb_filter, compression=compression, weight_decay=weight_decay,
                                    block_prefix='tr_%i' % block_idx, transition_pooling=transition_pooling)
@@ -859,7 +1065,7 @@ def __create_dense_net(nb_classes, img_input, include_top, depth=40, nb_dense_bl
         # The last dense_block does not have a transition_block
         x, nb_filter = __dense_block(x, final_nb_layer, nb_filter, growth_rate, bottleneck=bottleneck,
                                      dropout_rate=dropout_rate, weight_decay=weight_decay,
-                                     block_prefix='dense_%i' % (nb_dense_block - 1))
+                                     block_prefix='dense_%i' % (nb_dense_block - 1), efficient=efficient)
 
         x = BatchNormalization(axis=concat_axis, epsilon=1.1e-5, name='final_bn')(x)
         x = Activation('relu')(x)
@@ -880,7 +1086,8 @@ def __create_dense_net(nb_classes, img_input, include_top, depth=40, nb_dense_bl
 
 
 def __densenet_fcn_encoder(input_tensor, early_transition, init_conv_filters, reduction, weight_decay,
-                           transition_pooling, nb_dense_block, nb_layers, growth_rate, dropout_rate):
+                           transition_pooling, nb_dense_block, nb_layers, growth_rate, dropout_rate,
+                           efficient=False):
 
     x = input_tensor
     # compute compression factor
@@ -895,7 +1102,8 @@ def __densenet_fcn_encoder(input_tensor, early_transition, init_conv_filters, re
     # Add dense blocks and transition down block
     for block_idx in range(nb_dense_block):
         x, nb_filter = __dense_block(x, nb_layers[block_idx], nb_filter, growth_rate, dropout_rate=dropout_rate,
-                                     weight_decay=weight_decay, block_prefix='dense_%i' % block_idx)
+                                     weight_decay=weight_decay, block_prefix='dense_%i' % block_idx,
+                                     efficient=efficient)
 
         # Skip connection
         skip_list.append(x)
@@ -909,7 +1117,7 @@ def __densenet_fcn_encoder(input_tensor, early_transition, init_conv_filters, re
 
 
 def __densenet_fcn_decoder(input_tensor, bottleneck_nb_layers, nb_filter, growth_rate, dropout_rate, weight_decay, nb_dense_block,
-                           skip_list, nb_layers, concat_axis, upsampling_type, early_transition):
+                           skip_list, nb_layers, concat_axis, upsampling_type, early_transition, efficient=False):
     x = input_tensor
 
     # The last dense_block does not have a transition_down_block
@@ -917,7 +1125,8 @@ def __densenet_fcn_decoder(input_tensor, bottleneck_nb_layers, nb_filter, growth
     _, nb_filter, concat_list = __dense_block(x, bottleneck_nb_layers, nb_filter, growth_rate,
                                               dropout_rate=dropout_rate, weight_decay=weight_decay,
                                               return_concat_list=True,
-                                              block_prefix='dense_%i' % nb_dense_block)
+                                              block_prefix='dense_%i' % nb_dense_block,
+                                              efficient=efficient)
 
     skip_list = skip_list[::-1]  # reverse the skip list
 
@@ -940,7 +1149,8 @@ def __densenet_fcn_decoder(input_tensor, bottleneck_nb_layers, nb_filter, growth
                                                      nb_filter=growth_rate, growth_rate=growth_rate,
                                                      dropout_rate=dropout_rate, weight_decay=weight_decay,
                                                      return_concat_list=True, grow_nb_filters=False,
-                                                     block_prefix='dense_%i' % (nb_dense_block + 1 + block_idx))
+                                                     block_prefix='dense_%i' % (nb_dense_block + 1 + block_idx),
+                                                     efficient=efficient)
 
     if early_transition:
         x_up = __transition_up_block(x_up, nb_filters=nb_filter, type=upsampling_type, weight_decay=weight_decay,
@@ -952,7 +1162,8 @@ def __create_fcn_dense_net(nb_classes, img_input, include_top, nb_dense_block=5,
                            reduction=0.0, dropout_rate=None, weight_decay=1e-4,
                            nb_layers_per_block=4, nb_upsampling_conv=128, upsampling_type='deconv',
                            init_conv_filters=48, input_shape=None, activation='softmax',
-                           early_transition=False, transition_pooling='max', initial_kernel_size=(3, 3)):
+                           early_transition=False, transition_pooling='max', initial_kernel_size=(3, 3),
+                           efficient=False):
     ''' Build the DenseNet-FCN model
 
     # Arguments
@@ -982,6 +1193,7 @@ def __create_fcn_dense_net(nb_classes, img_input, include_top, nb_dense_block=5,
             paper in accordance with the DenseNetFCN paper.
         initial_kernel_size: The first Conv2D kernel might vary in size based on the
             application, this parameter makes it configurable.
+        efficient: if True, builds memory-efficient dense blocks
 
     # Returns
         a keras tensor
@@ -1031,11 +1243,12 @@ def __create_fcn_dense_net(nb_classes, img_input, include_top, nb_dense_block=5,
 
         x, skip_list, nb_filter = __densenet_fcn_encoder(
             x, early_transition, init_conv_filters, reduction, weight_decay, transition_pooling,
-            nb_dense_block, nb_layers, growth_rate, dropout_rate)
+            nb_dense_block, nb_layers, growth_rate, dropout_rate, efficient)
 
         x_up = __densenet_fcn_decoder(
             x, bottleneck_nb_layers, nb_filter, growth_rate, dropout_rate, weight_decay,
-            nb_dense_block, skip_list, nb_layers, concat_axis, upsampling_type, early_transition)
+            nb_dense_block, skip_list, nb_layers, concat_axis, upsampling_type, early_transition,
+            efficient)
         if include_top:
             x = Conv2D(nb_classes, (1, 1), activation='linear', padding='same', use_bias=False)(x_up)
 
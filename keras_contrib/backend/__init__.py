@@ -6,6 +6,7 @@ from keras import backend as K
 # single import statement.
 
 from keras.backend import *
+from .common import *
 
 
 if K.backend() == 'theano':
@@ -31,3 +31,26 @@ def moments(x, axes, shift=None, keep_dims=False):
     ''' Calculates and returns the mean and variance of the input '''
     mean, variant = KCN._moments(x, axes=axes, shift=shift, keep_dims=keep_dims)
     return mean, variant
+
+
+def bincount(x, minlength):
+    ''' Counts the occurrences of each value of the int32 tensor `x`,
+    which must be in `[0, minlength)`. Returns a tensor of shape `(minlength,)`. '''
+    return KCN.sum(KCN.one_hot(KCN.flatten(x), minlength), axis=0)
+
+
+def sparse_gradient(grad):
+    ''' CNTK gradients are dense, returns `None`. '''
+    return None
+
+
+def recompute_grad(fn):
+    ''' Gradient checkpointing is not available with CNTK,
+    `fn` is returned unchanged and its activations are stored as usual. '''
+    return fn
+
+
+def gradients_with_checkpoints(loss, variables, checkpoints):
+    ''' Gradient checkpointing is not available with CNTK,
+    the gradients are computed as usual and `checkpoints` is ignored. '''
+    return KCN.gradients(loss, variables)
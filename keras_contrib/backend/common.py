@@ -0,0 +1,19 @@
+from keras import backend as K
+
+
+def upcast(x):
+    """Casts a float16 tensor to float32, other tensors are returned unchanged.
+
+    Used for the numerically sensitive parts of a float16 model, such as
+    moments, norms and log-sum-exp reductions, which are accumulated in
+    float32 and cast back to the compute dtype afterwards.
+
+    # Arguments
+        x: Tensor or variable.
+
+    # Returns
+        A tensor.
+    """
+    if K.dtype(x) == 'float16':
+        return K.cast(x, 'float32')
+    return x
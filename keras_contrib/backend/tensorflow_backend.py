@@ -19,36 +19,61 @@ from keras.backend.tensorflow_backend import logsumexp
 py_all = all
 
 
+def _transpose(x, perm):
+    """Transposes `x`, eliding the transpose pair if `x` is itself a transpose.
+
+    Consecutive contrib ops running NHWC kernels on channels first tensors
+    transpose back and forth, this returns the untransposed tensor instead.
+    # Arguments
+        x: A tensor.
+        perm: permutation of the dimensions of `x`.
+    # Returns
+        A tensor.
+    """
+    if x.op.type == 'Transpose':
+        x_perm = tf.contrib.util.constant_value(x.op.inputs[1])
+        if x_perm is not None and [x_perm[i] for i in perm] == list(range(len(perm))):
+            return x.op.inputs[0]
+    return tf.transpose(x, perm)
+
+
 def _preprocess_conv2d_input(x, data_format):
     """Transpose and cast the input before the conv2d.
     # Arguments
         x: input tensor.
         data_format: string, `"channels_last"` or `"channels_first"`.
     # Returns
-        A tensor.
+        A tensor and the TensorFlow data format of the tensor,
+        `"NCHW"` when the channels first kernels are supported.
     """
     if dtype(x) == 'float64':
         x = tf.cast(x, 'float32')
+    tf_data_format = 'NHWC'
     if data_format == 'channels_first':
-        # TF uses the last dimension as channel dimension,
-        # instead of the 2nd one.
-        # TH input shape: (samples, input_depth, rows, cols)
-        # TF input shape: (samples, rows, cols, input_depth)
-        x = tf.transpose(x, (0, 2, 3, 1))
-    return x
+        if KTF._has_nchw_support():
+            tf_data_format = 'NCHW'
+        else:
+            # TF uses the last dimension as channel dimension,
+            # instead of the 2nd one.
+            # TH input shape: (samples, input_depth, rows, cols)
+            # TF input shape: (samples, rows, cols, input_depth)
+            x = _transpose(x, (0, 2, 3, 1))
+    return x, tf_data_format
 
 
-def _postprocess_conv2d_output(x, data_format):
+def _postprocess_conv2d_output(x, data_format, tf_data_format='NHWC'):
     """Transpose and cast the output from conv2d if needed.
     # Arguments
         x: A tensor.
         data_format: string, `"channels_last"` or `"channels_first"`.
+        tf_data_format: string, `"NHWC"` or `"NCHW"`, the TensorFlow
+            data format of `x`.
     # Returns
         A tensor.
     """
 
-    if data_format == 'channels_first':
-        x = tf.transpose(x, (0, 3, 1, 2))
+    if data_format == 'channels_first' and tf_data_format == 'NHWC':
+        x = _transpose(x, (0, 3, 1, 2))
 
     if floatx() == 'float64':
         x = tf.cast(x, 'float64')
@@ -90,29 +115,26 @@ def conv2d(x, kernel, strides=(1, 1), padding='valid', data_format='channels_fir
     else:
         raise Exception('Invalid border mode: ' + str(padding))
 
-    strides = (1,) + strides + (1,)
-
     if floatx() == 'float64':
         # tf conv2d only supports float32
         x = tf.cast(x, 'float32')
         kernel = tf.cast(kernel, 'float32')
 
     if data_format == 'channels_first':
-        # TF uses the last dimension as channel dimension,
-        # instead of the 2nd one.
-        # TH input shape: (samples, input_depth, rows, cols)
-        # TF input shape: (samples, rows, cols, input_depth)
         # TH kernel shape: (depth, input_depth, rows, cols)
         # TF kernel shape: (rows, cols, input_depth, depth)
-        x = tf.transpose(x, (0, 2, 3, 1))
         kernel = tf.transpose(kernel, (2, 3, 1, 0))
-        x = tf.nn.conv2d(x, kernel, strides, padding=padding)
-        x = tf.transpose(x, (0, 3, 1, 2))
-    elif data_format == 'channels_last':
-        x = tf.nn.conv2d(x, kernel, strides, padding=padding)
-    else:
+    elif data_format != 'channels_last':
         raise Exception('Unknown data_format: ' + str(data_format))
 
+    x, tf_data_format = _preprocess_conv2d_input(x, data_format)
+    if tf_data_format == 'NCHW':
+        strides = (1, 1) + strides
+    else:
+        strides = (1,) + strides + (1,)
+    x = tf.nn.conv2d(x, kernel, strides, padding=padding, data_format=tf_data_format)
+    x = _postprocess_conv2d_output(x, data_format, tf_data_format)
+
     if floatx() == 'float64':
         x = tf.cast(x, 'float64')
     return x
@@ -139,7 +161,7 @@ def extract_image_patches(x, ksizes, ssizes, padding='same',
     strides = [1, ssizes[0], ssizes[1], 1]
     padding = _preprocess_padding(padding)
     if data_format == 'channels_first':
-        x = KTF.permute_dimensions(x, (0, 2, 3, 1))
+        x = _transpose(x, (0, 2, 3, 1))
     bs_i, w_i, h_i, ch_i = KTF.int_shape(x)
     patches = tf.extract_image_patches(x, kernel, strides, [1, 1, 1, 1],
                                        padding)
@@ -157,9 +179,9 @@ def depth_to_space(input, scale, data_format=None):
     if data_format is None:
         data_format = image_data_format()
     data_format = data_format.lower()
-    input = _preprocess_conv2d_input(input, data_format)
-    out = tf.depth_to_space(input, scale)
-    out = _postprocess_conv2d_output(out, data_format)
+    input, tf_data_format = _preprocess_conv2d_input(input, data_format)
+    out = tf.depth_to_space(input, scale, data_format=tf_data_format)
+    out = _postprocess_conv2d_output(out, data_format, tf_data_format)
     return out
 
 
@@ -169,6 +191,187 @@ def moments(x, axes, shift=None, keep_dims=False):
     return tf.nn.moments(x, axes, shift=shift, keep_dims=keep_dims)
 
 
+def bincount(x, minlength):
+    ''' Counts the occurrences of each value of the int32 tensor `x`.
+
+    # Arguments
+        x: int32 tensor with values in `[0, minlength)`.
+        minlength: length of the output.
+
+    # Returns
+        An int32 tensor of shape `(minlength,)`.
+    '''
+    return tf.bincount(KTF.flatten(x), minlength=minlength, maxlength=minlength)
+
+
+def sparse_gradient(grad):
+    """Returns the rows of a sparse gradient, such as the gradient of an `Embedding`.
+
+    # Arguments
+        grad: a gradient returned by `K.gradients`.
+
+    # Returns
+        `None` for a dense gradient, or a tuple `(values, indices)` for an
+        `IndexedSlices` gradient, where `indices` are unique row indices and
+        `values` the sums of the gradient rows for each of them.
+    """
+    if not isinstance(grad, tf.IndexedSlices):
+        return None
+    indices, positions = tf.unique(grad.indices)
+    values = tf.unsorted_segment_sum(grad.values, positions, tf.shape(indices)[0])
+    return values, indices
+
+
+def scatter_update(x, indices, updates):
+    """Updates the rows `indices` of the variable `x` to `updates`.
+
+    # Returns
+        The update op, as `K.update`.
+    """
+    return tf.scatter_update(x, indices, updates)
+
+
+def recompute_grad(fn):
+    """Wraps `fn` so its intermediate activations are recomputed in the backward pass.
+
+    Only the inputs and the output of `fn` are kept in memory after the forward
+    pass. When gradients are requested, `fn` is evaluated a second time, which
+    trades extra computation for a reduced memory footprint (gradient checkpointing).
+
+    `fn` must be a pure function of its positional tensor arguments, i.e. any
+    variable it depends on (such as a batch normalization `gamma`) has to be
+    passed in explicitly so that it receives a gradient, and it must not
+    create update ops.
+
+    # Arguments
+        fn: function mapping one or more tensors to a single tensor.
+
+    # Returns
+        A function with the same signature as `fn`.
+    """
+    @tf.custom_gradient
+    def _recompute(*args):
+        output = fn(*args)
+
+        def grad(dy):
+            # the data dependency on `dy` keeps the recomputation
+            # from being scheduled during the forward pass.
+            with tf.control_dependencies([dy]):
+                inputs = [tf.identity(arg) for arg in args]
+            recomputed = fn(*inputs)
+            return tf.gradients(recomputed, inputs, grad_ys=[dy])
+
+        return output, grad
+
+    def wrapper(*args):
+        return _recompute(*args)
+
+    return wrapper
+
+
+def _segment_ops(target, boundary):
+    """Returns the ops computing `target` from the `boundary` tensors.
+
+    Only ops that depend on a boundary tensor or a placeholder are returned,
+    everything else (variable reads, constants) is shared with the forward
+    pass. Random ops are shared too, so that e.g. dropout masks are not
+    resampled when the segment is recomputed.
+    """
+    ops = set()
+    stack = [target.op]
+    while stack:
+        op = stack.pop()
+        if op in ops:
+            continue
+        ops.add(op)
+        stack.extend(x.op for x in op.inputs if x not in boundary)
+
+    # op ids follow creation order, which is a topological order
+    sources = set(boundary)
+    dependent = set()
+    for op in sorted(ops, key=lambda op: op._id):
+        if op.type == 'Placeholder':
+            sources.update(op.outputs)
+        elif op.type.startswith('Random') or op.type == 'TruncatedNormal':
+            continue
+        elif any(x in sources or x.op in dependent for x in op.inputs):
+            dependent.add(op)
+    return dependent
+
+
+def _sum_gradients(grads):
+    grads = [g for g in grads if g is not None]
+    if not grads:
+        return None
+    if len(grads) == 1:
+        return grads[0]
+    return tf.add_n([tf.convert_to_tensor(g) for g in grads])
+
+
+def gradients_with_checkpoints(loss, variables, checkpoints):
+    """Returns the gradients of `loss` w.r.t. `variables`, recomputing activations.
+
+    The graph is split into segments at the `checkpoints` tensors. Only the
+    checkpoints are kept in memory after the forward pass; the activations
+    inside a segment are recomputed from the checkpoints it reads when the
+    backward pass reaches it, so that at most one segment is materialized at
+    a time (gradient checkpointing, Chen et al. 2016,
+    https://arxiv.org/abs/1604.06174).
+
+    # Arguments
+        loss: Scalar tensor to minimize.
+        variables: List of variables.
+        checkpoints: List of tensors to keep in memory, typically the outputs
+            of the residual blocks or cells of a network.
+
+    # Returns
+        A list of gradient tensors, `None` for the variables `loss`
+        does not depend on.
+    """
+    from tensorflow.contrib import graph_editor as ge
+
+    variables = list(variables)
+    # the ones closest to the loss are processed first
+    checkpoints = sorted(set(checkpoints), key=lambda x: x.op._id, reverse=True)
+    boundary = set(checkpoints)
+    checkpoint_grads = dict((x, []) for x in checkpoints)
+    variable_grads = [[] for _ in variables]
+
+    def accumulate(xs, grads):
+        for x, g in zip(xs, grads[:len(xs)]):
+            checkpoint_grads[x].append(g)
+        for acc, g in zip(variable_grads, grads[len(xs):]):
+            acc.append(g)
+
+    # the head of the network is small and is differentiated as usual
+    grads = tf.gradients(loss, checkpoints + variables, stop_gradients=checkpoints,
+                         colocate_gradients_with_ops=True)
+    accumulate(checkpoints, grads)
+
+    for target in checkpoints:
+        dy = _sum_gradients(checkpoint_grads.pop(target))
+        if dy is None:
+            continue
+        ops = _segment_ops(target, boundary)
+        inputs = [x for x in boundary
+                  if x is not target and any(x in op.inputs for op in ops)]
+        # the data dependency on `dy` keeps the recomputation
+        # from being scheduled during the forward pass.
+        with tf.control_dependencies([dy]):
+            replacements = dict((x, tf.stop_gradient(x)) for x in inputs)
+        _, info = ge.copy_with_input_replacements(ge.sgv(ops), replacements)
+        for op in ops:
+            copied = info.transformed(op)
+            if not any(x.op in ops for x in op.inputs):
+                ge.add_control_inputs(copied, [dy.op])
+        recomputed = info.transformed(target)
+        grads = tf.gradients(recomputed, [replacements[x] for x in inputs] + variables,
+                             grad_ys=[dy], colocate_gradients_with_ops=True)
+        accumulate(inputs, grads)
+
+    return [_sum_gradients(grads) for grads in variable_grads]
+
+
 def clip(x, min_value, max_value):
     """Element-wise value clipping.
 
@@ -150,6 +150,34 @@ def moments(x, axes, shift=None, keep_dims=False):
     return mean_batch, var_batch
 
 
+def bincount(x, minlength):
+    ''' Counts the occurrences of each value of the int32 tensor `x`,
+    which must be in `[0, minlength)`. Returns a tensor of shape `(minlength,)`. '''
+    return T.extra_ops.bincount(KTH.flatten(x), minlength=minlength)
+
+
+def sparse_gradient(grad):
+    ''' Theano gradients are dense, returns `None`. '''
+    return None
+
+
+def scatter_update(x, indices, updates):
+    ''' Updates the rows `indices` of the variable `x` to `updates`. '''
+    return (x, T.set_subtensor(x[indices], updates))
+
+
+def recompute_grad(fn):
+    ''' Gradient checkpointing is not available with Theano,
+    `fn` is returned unchanged and its activations are stored as usual. '''
+    return fn
+
+
+def gradients_with_checkpoints(loss, variables, checkpoints):
+    ''' Gradient checkpointing is not available with Theano,
+    the gradients are computed as usual and `checkpoints` is ignored. '''
+    return KTH.gradients(loss, variables)
+
+
 def clip(x, min_value, max_value):
     """Element-wise value clipping.
 
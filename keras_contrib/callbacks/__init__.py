@@ -1,3 +1,5 @@
-from .snapshot import SnapshotCallbackBuilder, SnapshotModelCheckpoint
+from .snapshot import SnapshotCallbackBuilder, SnapshotModelCheckpoint, AsyncModelCheckpoint
 from .dead_relu_detector import DeadReluDetector
-from .cyclical_learning_rate import CyclicLR
+from .cyclical_learning_rate import CyclicLR, lr_range_test
+from .training_monitor import TrainingMonitor
+from .stochastic_weight_averaging import StochasticWeightAveraging
@@ -1,3 +1,6 @@
+import warnings
+from collections import deque
+
 from keras.callbacks import *
 
 
@@ -31,6 +34,13 @@ class CyclicLR(Callback):
             Defines whether scale_fn is evaluated on
             cycle number or cycle iterations (training
             iterations since start of cycle). Default is 'cycle'.
+        graph_mode: boolean. If True, the learning rate is computed in the
+            training graph from `optimizer.iterations` instead of being set
+            from Python at each batch, see `attach`. `scale_fn` must then be
+            written with backend functions.
+        history_size: maximum number of records kept in `history`, the
+            oldest records being dropped. `None` keeps all of them.
+        history_every: number of batches between two records of `history`.
 
     The amplitude of the cycle can be scaled on a per-iteration or
     per-cycle basis.
@@ -60,6 +70,15 @@ class CyclicLR(Callback):
             model.fit(X_train, Y_train, callbacks=[clr])
         ```
 
+    The learning rate can be computed in the training graph, avoiding the
+    transfers between Python and the device at every batch:
+        ```python
+            clr = CyclicLR(base_lr=0.001, max_lr=0.006, step_size=2000.,
+                           graph_mode=True, history_every=100)
+            clr.attach(model.optimizer)
+            model.fit(X_train, Y_train, callbacks=[clr])
+        ```
+
     # References
 
       - [Cyclical Learning Rates for Training Neural Networks](https://arxiv.org/abs/1506.01186)
@@ -73,7 +92,10 @@ class CyclicLR(Callback):
             mode='triangular',
             gamma=1.,
             scale_fn=None,
-            scale_mode='cycle'):
+            scale_mode='cycle',
+            graph_mode=False,
+            history_size=None,
+            history_every=1):
         super(CyclicLR, self).__init__()
 
         assert mode in ['triangular', 'triangular2',
@@ -99,6 +121,10 @@ class CyclicLR(Callback):
         self.clr_iterations = 0.
         self.trn_iterations = 0.
         self.history = {}
+        self.graph_mode = graph_mode
+        self.history_size = history_size
+        self.history_every = history_every
+        self.optimizer = None
 
         self._reset()
 
@@ -114,6 +140,38 @@ class CyclicLR(Callback):
         if new_step_size is not None:
             self.step_size = new_step_size
         self.clr_iterations = 0.
+        if self.optimizer is not None:
+            K.set_value(self.schedule_base_lr, self.base_lr)
+            K.set_value(self.schedule_max_lr, self.max_lr)
+            K.set_value(self.schedule_step_size, self.step_size)
+            K.set_value(self.schedule_offset, K.get_value(self.optimizer.iterations))
+
+    def attach(self, optimizer):
+        """Computes the learning rate of `optimizer` in its graph.
+
+        `optimizer.lr` is replaced by the schedule, a tensor computed from
+        `optimizer.iterations`, so this must be called before the training
+        function of the model is built, that is before its first training
+        batch. The schedule restarts from the current iteration.
+
+        # Arguments
+            optimizer: the optimizer of the model, with `lr` and `iterations`
+                attributes.
+        """
+        self.optimizer = optimizer
+        self.schedule_base_lr = K.variable(self.base_lr, name='base_lr')
+        self.schedule_max_lr = K.variable(self.max_lr, name='max_lr')
+        self.schedule_step_size = K.variable(self.step_size, name='step_size')
+        self.schedule_offset = K.variable(K.get_value(optimizer.iterations) - self.clr_iterations,
+                                          name='offset')
+
+        iterations = K.cast(optimizer.iterations, K.floatx()) - self.schedule_offset
+        period = 2. * self.schedule_step_size
+        cycle = 1. + K.round((iterations - iterations % period) / period)
+        x = K.abs(iterations / self.schedule_step_size - 2. * cycle + 1.)
+        scale = self.scale_fn(cycle if self.scale_mode == 'cycle' else iterations)
+        optimizer.lr = self.schedule_base_lr + (self.schedule_max_lr - self.schedule_base_lr) * \
+            K.maximum(0., 1. - x) * scale
 
     def clr(self):
         cycle = np.floor(1 + self.clr_iterations / (2 * self.step_size))
@@ -128,7 +186,11 @@ class CyclicLR(Callback):
     def on_train_begin(self, logs={}):
         logs = logs or {}
 
-        if self.clr_iterations == 0:
+        if self.graph_mode:
+            if self.optimizer is not self.model.optimizer:
+                raise ValueError('`CyclicLR` with `graph_mode=True` requires '
+                                 '`attach(model.optimizer)` before training.')
+        elif self.clr_iterations == 0:
             K.set_value(self.model.optimizer.lr, self.base_lr)
         else:
             K.set_value(self.model.optimizer.lr, self.clr())
@@ -138,17 +200,172 @@ class CyclicLR(Callback):
         logs = logs or {}
         self.trn_iterations += 1
         self.clr_iterations += 1
-        K.set_value(self.model.optimizer.lr, self.clr())
+        if not self.graph_mode:
+            K.set_value(self.model.optimizer.lr, self.clr())
 
-        self.history.setdefault(
-            'lr', []).append(
-            K.get_value(
-                self.model.optimizer.lr))
-        self.history.setdefault('iterations', []).append(self.trn_iterations)
+        if self.trn_iterations % self.history_every:
+            return
+        self._record('lr', self._current_lr())
+        self._record('iterations', self.trn_iterations)
 
         for k, v in logs.items():
-            self.history.setdefault(k, []).append(v)
+            self._record(k, v)
+
+    def _record(self, key, value):
+        if key not in self.history:
+            self.history[key] = [] if self.history_size is None else deque(maxlen=self.history_size)
+        self.history[key].append(value)
 
     def on_epoch_end(self, epoch, logs=None):
         logs = logs or {}
-        logs['lr'] = K.get_value(self.model.optimizer.lr)
+        logs['lr'] = self._current_lr()
+
+    def _current_lr(self):
+        if self.graph_mode:
+            # the schedule of the graph, without reading it from the device
+            return self.clr()
+        return K.get_value(self.model.optimizer.lr)
+
+
+def _range_test_batches(x, y, batch_size, seed):
+    """Yields training batches, looping over arrays as many times as needed."""
+    if y is None:
+        # a generator or a `keras.utils.Sequence` of `(x, y)` batches
+        if hasattr(x, '__getitem__') and hasattr(x, '__len__') and not isinstance(x, (list, np.ndarray)):
+            while True:
+                for i in range(len(x)):
+                    yield x[i][:2]
+        else:
+            for batch in x:
+                yield batch[:2]
+        return
+    xs = x if isinstance(x, list) else [x]
+    ys = y if isinstance(y, list) else [y]
+    random = np.random.RandomState(seed)
+    while True:
+        index = random.permutation(len(xs[0]))
+        for start in range(0, len(index) - batch_size + 1, batch_size):
+            batch = index[start:start + batch_size]
+            yield [a[batch] for a in xs], [a[batch] for a in ys]
+
+
+def lr_range_test(model, x, y=None, min_lr=1e-7, max_lr=10., num_batches=100,
+                  mode='exponential', batch_size=32, smoothing=0.98,
+                  diverge_threshold=4., skip_batches=10, min_decrease=0.05, seed=None):
+    """Learning rate range test, to choose the bounds of `CyclicLR`.
+
+    The model is trained for at most `num_batches` batches while its learning
+    rate grows from `min_lr` to `max_lr`, recording the training loss. The
+    sweep stops early once the smoothed loss exceeds `diverge_threshold` times
+    its minimum. The weights of the model and of its optimizer, and the
+    learning rate, are snapshotted in memory before the sweep and restored
+    afterwards, so the model can be trained right after the test.
+
+    The suggested `max_lr` is the learning rate at the minimum of the smoothed
+    loss, past which the loss stops decreasing, and the suggested `base_lr`
+    the learning rate at which the smoothed loss decreases the fastest, at
+    most a quarter of `max_lr` and at least `min_lr`. The first
+    `skip_batches` batches, whose smoothed loss is noisy, are left out, and
+    the minimum must be `min_decrease` below the loss at the end of them.
+
+    # Arguments
+        model: a compiled model.
+        x: training inputs, a numpy array or list of numpy arrays, or a
+            generator or `keras.utils.Sequence` of `(x, y)` batches.
+        y: training targets, `None` if `x` is a generator or a `Sequence`.
+        min_lr: learning rate of the first batch.
+        max_lr: learning rate of the last batch.
+        num_batches: number of batches of the sweep.
+        mode: `'exponential'` or `'linear'` growth of the learning rate.
+        batch_size: number of samples per batch, for numpy array inputs.
+        smoothing: float in `[0, 1)`, the losses are smoothed by an
+            exponential moving average of this momentum, bias corrected.
+        diverge_threshold: the sweep stops when the smoothed loss exceeds
+            this multiple of its minimum.
+        skip_batches: number of warm-up batches left out of the suggestion,
+            at most half of the batches of the sweep.
+        min_decrease: float in `[0, 1)`, the relative decrease of the smoothed
+            loss required for a suggestion. Without it, a warning is issued
+            and the learning rates at the end of the warm-up are suggested.
+        seed: seed of the shuffling of numpy array inputs.
+
+    # Returns
+        A dict with the learning rates `lrs`, the `losses` and the
+        `smoothed_losses` of the sweep, and the suggested `base_lr` and
+        `max_lr`.
+
+    # Raises
+        ValueError: if `mode` is unknown, or the learning rate of the model
+            is computed in its graph, see `CyclicLR.attach`.
+
+    # Example
+        ```python
+            result = lr_range_test(model, x_train, y_train, num_batches=200)
+            clr = CyclicLR(base_lr=result['base_lr'], max_lr=result['max_lr'],
+                           step_size=4 * len(x_train) // 32)
+            model.fit(x_train, y_train, batch_size=32, callbacks=[clr])
+        ```
+    """
+    if mode not in ['exponential', 'linear']:
+        raise ValueError('`mode` must be "exponential" or "linear", got: ' + str(mode))
+    optimizer = model.optimizer
+    # variables of TensorFlow, Theano and CNTK, unlike a graph-side schedule
+    if not any(hasattr(optimizer.lr, name) for name in ['assign', 'set_value', 'value']):
+        raise ValueError('The learning rate of the optimizer is a tensor, the range '
+                         'test requires a learning rate variable.')
+    steps = np.arange(num_batches) / float(max(num_batches - 1, 1))
+    if mode == 'exponential':
+        lrs = min_lr * (max_lr / float(min_lr)) ** steps
+    else:
+        lrs = min_lr + (max_lr - min_lr) * steps
+
+    # builds the optimizer slots before the snapshot
+    model._make_train_function()
+    initial_lr = K.get_value(optimizer.lr)
+    weights = model.get_weights()
+    optimizer_weights = optimizer.get_weights()
+
+    losses = []
+    smoothed_losses = []
+    average = 0.
+    try:
+        batches = _range_test_batches(x, y, batch_size, seed)
+        for i, (lr, (x_batch, y_batch)) in enumerate(zip(lrs, batches)):
+            K.set_value(optimizer.lr, lr)
+            loss = model.train_on_batch(x_batch, y_batch)
+            if isinstance(loss, list):
+                loss = loss[0]
+            loss = float(loss)
+            losses.append(loss)
+            average = smoothing * average + (1. - smoothing) * loss
+            smoothed_losses.append(average / (1. - smoothing ** (i + 1)))
+            if not np.isfinite(loss) or smoothed_losses[-1] > diverge_threshold * min(smoothed_losses):
+                break
+    finally:
+        model.set_weights(weights)
+        optimizer.set_weights(optimizer_weights)
+        K.set_value(optimizer.lr, initial_lr)
+
+    lrs = lrs[:len(losses)]
+    smoothed = np.array(smoothed_losses)
+    start = min(skip_batches, len(smoothed) // 2)
+    window = np.where(np.isfinite(smoothed[start:]), smoothed[start:], np.inf)
+    best = start + int(np.argmin(window))
+    if not smoothed[best] <= (1. - min_decrease) * smoothed[start]:
+        warnings.warn('The smoothed loss did not decrease during the learning rate '
+                      'range test, the suggested learning rates are not reliable.')
+        best = start
+    suggested_max_lr = lrs[best]
+    if best > start + 1:
+        # slope of the loss with respect to the learning rate scale of the sweep
+        scale = np.log(lrs[start:best + 1]) if mode == 'exponential' else lrs[start:best + 1]
+        steepest = start + int(np.argmin(np.gradient(smoothed[start:best + 1], scale)))
+        suggested_base_lr = min(lrs[steepest], suggested_max_lr / 4.)
+    else:
+        suggested_base_lr = suggested_max_lr / 4.
+    suggested_base_lr = max(suggested_base_lr, lrs[0])
+    return {'lrs': lrs,
+            'losses': np.array(losses),
+            'smoothed_losses': smoothed,
+            'base_lr': float(suggested_base_lr),
+            'max_lr': float(suggested_max_lr)}
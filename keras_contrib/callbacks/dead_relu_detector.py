@@ -1,94 +1,147 @@
+import warnings
+
 import numpy as np
 
 from keras.callbacks import Callback
 from keras import backend as K
-from keras.layers import Input
+from keras.utils import Sequence
 
 
 class DeadReluDetector(Callback):
     """Reports the number of dead ReLUs after each training epoch
     ReLU is considered to be dead if it did not fire once for entire training set
 
+    The outputs of all the ReLU layers are computed together by a single function,
+    one batch at a time, and only a per channel "ever fired" flag is kept between
+    batches, so memory does not grow with the size of the dataset.
+
     # Arguments
-        x_train: Training dataset to check whether or not neurons fire
+        x_train: Training dataset to check whether or not neurons fire, a numpy
+            array or list of numpy arrays, or a generator or `keras.utils.Sequence`
+            yielding inputs or `(inputs, targets)` tuples
         verbose: verbosity mode
             True means that even a single dead neuron triggers a warning message
             False means that only significant number of dead neurons (10% or more)
             triggers a warning message
+        batch_size: number of samples per batch when `x_train` is an array
+        steps: number of batches drawn when `x_train` is a generator,
+            defaults to `len(x_train)` for a `Sequence`
     """
 
-    def __init__(self, x_train, verbose=False):
+    def __init__(self, x_train, verbose=False, batch_size=32, steps=None):
         super(DeadReluDetector, self).__init__()
         self.x_train = x_train
         self.verbose = verbose
+        self.batch_size = batch_size
+        self.steps = steps
         self.dead_neurons_share_threshold = 0.1
+        self.relu_layers = None
+        self.relu_function = None
+
+    def set_model(self, model):
+        super(DeadReluDetector, self).set_model(model)
+        self.relu_function = None
 
     @staticmethod
     def is_relu_layer(layer):
         # Should work for all layers with relu activation. Tested for Dense and Conv2D
         return 'activation' in layer.get_config() and layer.get_config()['activation'] == 'relu'
 
-    def get_relu_activations(self):
+    def get_relu_layers(self):
+        """Returns the indices of the layers with weights and a relu activation."""
+        return [index for index, layer in enumerate(self.model.layers)
+                if self.is_relu_layer(layer) and layer.get_weights()]
+
+    def _build_relu_function(self):
         model_input = self.model.input
-        is_multi_input = isinstance(model_input, list)
-        if not is_multi_input:
+        if not isinstance(model_input, list):
             model_input = [model_input]
-
-        funcs = {}
-        for index, layer in enumerate(self.model.layers):
-            if not layer.get_weights():
-                continue
-            funcs[index] = K.function(model_input + [K.learning_phase()], [layer.output])
-
-        if is_multi_input:
-            list_inputs = []
-            list_inputs.extend(self.x_train)
-            list_inputs.append(1.)
+        self.relu_layers = self.get_relu_layers()
+        outputs = [self.model.layers[index].output for index in self.relu_layers]
+        self.relu_function = K.function(model_input + [K.learning_phase()], outputs)
+
+    def _batches(self):
+        x_train = self.x_train
+        if isinstance(x_train, Sequence):
+            steps = self.steps or len(x_train)
+            batches = (x_train[i] for i in range(steps))
+        elif hasattr(x_train, '__next__') or hasattr(x_train, 'next'):
+            if self.steps is None:
+                raise ValueError('`steps` is required when `x_train` is a generator.')
+            batches = (next(x_train) for _ in range(self.steps))
         else:
-            list_inputs = [self.x_train, 1.]
-
-        layer_outputs = {index: func(list_inputs)[0] for index, func in funcs.items()}
-        for layer_index, layer_activations in layer_outputs.items():
-            if self.is_relu_layer(self.model.layers[layer_index]):
-                layer_name = self.model.layers[layer_index].name
-                # layer_weight is a list [W] (+ [b])
-                layer_weight = self.model.layers[layer_index].get_weights()
-
-                # with kernel and bias, the weights are saved as a list [W, b]. If only weights, it is [W]
-                if type(layer_weight) is not list:
-                    raise ValueError("'Layer_weight' should be a list, but was {}".format(type(layer_weight)))
+            inputs = x_train if isinstance(x_train, list) else [x_train]
+            num_samples = len(inputs[0])
+            batches = ([x[start:start + self.batch_size] for x in inputs]
+                       for start in range(0, num_samples, self.batch_size))
+        for batch in batches:
+            if isinstance(batch, tuple):
+                batch = batch[0]
+            if not isinstance(batch, list):
+                batch = [batch]
+            yield batch
+
+    def _channel_axis(self, layer_index):
+        # should work for both Conv and Flat
+        if K.image_data_format() == 'channels_last':
+            # features in last axis
+            return -1
+        # features before the convolution axis, for weight_len the input and output have to be subtracted
+        weight_len = len(self.model.layers[layer_index].get_weights()[0].shape)
+        return -1 - (weight_len - 2)
+
+    def _relu_activations(self):
+        # yields the outputs of the ReLU layers for each batch of `x_train`
+        if self.relu_function is None:
+            self._build_relu_function()
+        if not self.relu_layers:
+            return
+        for batch in self._batches():
+            yield self.relu_function(batch + [1.])
 
-                # there are no weights for current layer; skip it
-                # this is only legitimate if layer is "Activation"
-                if len(layer_weight) == 0:
-                    continue
-
-                layer_weight_shape = np.shape(layer_weight[0])
-                yield [layer_index, layer_activations, layer_name, layer_weight_shape]
+    def get_relu_activations(self):
+        """Returns the outputs of the ReLU layers on the whole of `x_train`.
+
+        Deprecated: the outputs of all the batches are kept in memory, use
+        `get_fired_neurons` instead.
+
+        # Returns
+            A list of `[layer_index, activations, layer_name, weight_shape]`.
+        """
+        warnings.warn('`get_relu_activations` is deprecated and keeps the outputs of the whole '
+                      'dataset in memory, use `get_fired_neurons` instead.', DeprecationWarning)
+        batches = list(self._relu_activations())
+        if not batches:
+            return []
+        return [[index, np.concatenate(outputs), self.model.layers[index].name,
+                 np.shape(self.model.layers[index].get_weights()[0])]
+                for index, outputs in zip(self.relu_layers, zip(*batches))]
+
+    def get_fired_neurons(self):
+        """Computes which neurons of each ReLU layer fired at least once on `x_train`.
+
+        # Returns
+            A list of `[layer_index, fired, layer_name]`, where `fired` is a
+            boolean numpy array with one entry per feature map.
+        """
+        axes = None
+        fired = []
+        for activations in self._relu_activations():
+            if axes is None:
+                axes = [self._channel_axis(index) for index in self.relu_layers]
+                fired = [None] * len(self.relu_layers)
+            for i, (values, axis) in enumerate(zip(activations, axes)):
+                axis = axis % values.ndim
+                reduce_axes = tuple(a for a in range(values.ndim) if a != axis)
+                batch_fired = np.any(values > 0, axis=reduce_axes)
+                fired[i] = batch_fired if fired[i] is None else fired[i] | batch_fired
+        return [[index, flags, self.model.layers[index].name]
+                for index, flags in zip(self.relu_layers, fired) if flags is not None]
 
     def on_epoch_end(self, epoch, logs={}):
-        for relu_activation in self.get_relu_activations():
-            layer_index, activation_values, layer_name, layer_weight_shape = relu_activation
-
-            shape_act = activation_values.shape
-
-            weight_len = len(layer_weight_shape)
-            act_len = len(shape_act)
-
-            # should work for both Conv and Flat
-            if K.image_data_format() == 'channels_last':
-                # features in last axis
-                axis_filter = -1
-            else:
-                # features before the convolution axis, for weight_len the input and output have to be subtracted
-                axis_filter = -1 - (weight_len - 2)
-
-            total_featuremaps = shape_act[axis_filter]
-
-            axis = tuple(
-                i for i in range(act_len) if (i != axis_filter) and (i != (len(shape_act) + axis_filter)))
-
-            dead_neurons = np.sum(np.sum(activation_values, axis=axis) == 0)
+        for layer_index, fired, layer_name in self.get_fired_neurons():
+            total_featuremaps = len(fired)
+            dead_neurons = int(np.sum(~fired))
 
             dead_neurons_share = float(dead_neurons) / float(total_featuremaps)
             if (self.verbose and dead_neurons > 0) or dead_neurons_share >= self.dead_neurons_share_threshold:
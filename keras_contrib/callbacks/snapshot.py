@@ -7,6 +7,8 @@ import numpy as np
 
 from keras.callbacks import Callback, ModelCheckpoint, LearningRateScheduler
 
+from ..utils.save_load_utils import AsyncWeightsWriter
+
 try:
     import requests
 except ImportError:
@@ -26,20 +28,87 @@ class SnapshotModelCheckpoint(Callback):
         nb_epochs: total number of epochs that the model will be trained for.
         nb_snapshots: number of times the weights of the model will be saved.
         fn_prefix: prefix for the filename of the weights.
+        async_save: if True, the weights are copied to host memory and
+            written by a background thread, see `AsyncWeightsWriter`, so
+            training does not wait for the file to be written.
+        max_pending: maximum number of snapshots waiting to be written
+            when `async_save` is True.
     """
 
-    def __init__(self, nb_epochs, nb_snapshots, fn_prefix='Model'):
+    def __init__(self, nb_epochs, nb_snapshots, fn_prefix='Model',
+                 async_save=False, max_pending=2):
         super(SnapshotModelCheckpoint, self).__init__()
 
         self.check = nb_epochs // nb_snapshots
         self.fn_prefix = fn_prefix
+        self.async_save = async_save
+        self.max_pending = max_pending
+        self.writer = None
+
+    def on_train_begin(self, logs=None):
+        if self.async_save and self.writer is None:
+            self.writer = AsyncWeightsWriter(self.max_pending)
 
     def on_epoch_end(self, epoch, logs={}):
         if epoch != 0 and (epoch + 1) % self.check == 0:
             filepath = self.fn_prefix + '-%d.h5' % ((epoch + 1) // self.check)
-            self.model.save_weights(filepath, overwrite=True)
+            if self.writer is not None:
+                self.writer.save(self.model, filepath)
+            else:
+                self.model.save_weights(filepath, overwrite=True)
             # print("Saved snapshot at weights/%s_%d.h5" % (self.fn_prefix, epoch))
 
+    def on_train_end(self, logs=None):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class AsyncModelCheckpoint(ModelCheckpoint):
+    """`ModelCheckpoint` of the model weights, written on a background thread.
+
+    Same as `ModelCheckpoint` with `save_weights_only=True`, except that the
+    weights are copied to host memory and written by an `AsyncWeightsWriter`.
+
+    # Arguments:
+        max_pending: maximum number of checkpoints waiting to be written.
+        Other arguments are those of `ModelCheckpoint`.
+    """
+
+    def __init__(self, filepath, max_pending=2, **kwargs):
+        kwargs['save_weights_only'] = True
+        super(AsyncModelCheckpoint, self).__init__(filepath, **kwargs)
+        self.max_pending = max_pending
+        self.writer = None
+
+    def on_train_begin(self, logs=None):
+        if self.writer is None:
+            self.writer = AsyncWeightsWriter(self.max_pending)
+
+    def on_epoch_end(self, epoch, logs=None):
+        # `ModelCheckpoint` decides when to save, the writer saves
+        model = self.model
+        self.model = _AsyncSaveProxy(model, self.writer)
+        try:
+            super(AsyncModelCheckpoint, self).on_epoch_end(epoch, logs)
+        finally:
+            self.model = model
+
+    def on_train_end(self, logs=None):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class _AsyncSaveProxy(object):
+
+    def __init__(self, model, writer):
+        self.model = model
+        self.writer = writer
+
+    def save_weights(self, filepath, overwrite=True):
+        self.writer.save(self.model, filepath)
+
 
 class SnapshotCallbackBuilder:
     """Callback builder for snapshot ensemble training of a model.
@@ -63,13 +132,16 @@ class SnapshotCallbackBuilder:
         self.M = nb_snapshots
         self.alpha_zero = init_lr
 
-    def get_callbacks(self, model_prefix='Model'):
+    def get_callbacks(self, model_prefix='Model', async_save=False):
         """
         Creates a list of callbacks that can be used during training to create a
         snapshot ensemble of the model.
 
         Args:
             model_prefix: prefix for the filename of the weights.
+            async_save: if True, the best model and the snapshots are written
+                on background threads, so training does not stall while the
+                weight files are written.
 
         Returns: list of 3 callbacks [ModelCheckpoint, LearningRateScheduler,
                  SnapshotModelCheckpoint] which can be provided to the 'fit' function
@@ -77,10 +149,16 @@ class SnapshotCallbackBuilder:
         if not os.path.exists('weights/'):
             os.makedirs('weights/')
 
-        callback_list = [ModelCheckpoint('weights/%s-Best.h5' % model_prefix, monitor='val_acc',
-                                         save_best_only=True, save_weights_only=True),
+        if async_save:
+            best_checkpoint = AsyncModelCheckpoint('weights/%s-Best.h5' % model_prefix, monitor='val_acc',
+                                                   save_best_only=True)
+        else:
+            best_checkpoint = ModelCheckpoint('weights/%s-Best.h5' % model_prefix, monitor='val_acc',
+                                              save_best_only=True, save_weights_only=True)
+        callback_list = [best_checkpoint,
                          LearningRateScheduler(schedule=self._cosine_anneal_schedule),
-                         SnapshotModelCheckpoint(self.T, self.M, fn_prefix='weights/%s' % model_prefix)]
+                         SnapshotModelCheckpoint(self.T, self.M, fn_prefix='weights/%s' % model_prefix,
+                                                 async_save=async_save)]
 
         return callback_list
 
@@ -0,0 +1,162 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import numpy as np
+
+from keras.callbacks import Callback
+from keras.layers import BatchNormalization
+from keras import backend as K
+
+from .. import backend as KC
+from ..layers.normalization import BatchRenormalization
+
+
+class StochasticWeightAveraging(Callback):
+    """Averages the weights of the model at the end of each learning rate cycle.
+
+    Instead of saving one snapshot per cycle of the cosine annealing schedule
+    of `SnapshotCallbackBuilder`, the weights at the end of each cycle are
+    added to a running average kept in host memory, updated in place. At the
+    end of training, the model is set to the averaged weights, whose single
+    forward pass approximates the snapshot ensemble.
+
+    The moving statistics of averaged weights do not match the averaged
+    model, so the statistics of the `BatchNormalization` and
+    `BatchRenormalization` layers are recomputed by a streamed pass over
+    `bn_data`, in training mode, averaging the statistics of the batches.
+
+    # Arguments
+        nb_epochs: total number of epochs that the model will be trained for.
+        nb_snapshots: number of learning rate cycles, as for
+            `SnapshotModelCheckpoint`.
+        start_snapshot: index, starting from 1, of the first cycle averaged.
+        filepath: path where the averaged weights are saved at the end of
+            training, or None.
+        bn_data: inputs of the model used to recompute the normalization
+            statistics, a numpy array or list of numpy arrays, or a
+            generator or `keras.utils.Sequence` yielding inputs or
+            `(inputs, targets)` batches. None leaves the statistics
+            unchanged.
+        batch_size: number of samples per batch, for numpy array `bn_data`.
+        bn_steps: number of batches of a generator `bn_data`, defaults to
+            the length of a `Sequence`.
+
+    # Raises
+        ValueError: at the end of training, if `bn_data` is a generator and
+            `bn_steps` is None.
+
+    # Example
+        ```python
+            builder = SnapshotCallbackBuilder(nb_epochs=200, nb_snapshots=5)
+            swa = StochasticWeightAveraging(200, 5, filepath='weights/Model-SWA.h5',
+                                            bn_data=x_train[:2048])
+            model.fit(x_train, y_train, epochs=200,
+                      callbacks=[LearningRateScheduler(builder._cosine_anneal_schedule), swa])
+        ```
+
+    # References
+        - [Averaging Weights Leads to Wider Optima and Better Generalization](https://arxiv.org/abs/1803.05407)
+    """
+
+    def __init__(self, nb_epochs, nb_snapshots, start_snapshot=1, filepath=None,
+                 bn_data=None, batch_size=32, bn_steps=None):
+        super(StochasticWeightAveraging, self).__init__()
+        self.check = nb_epochs // nb_snapshots
+        self.start_snapshot = start_snapshot
+        self.filepath = filepath
+        self.bn_data = bn_data
+        self.batch_size = batch_size
+        self.bn_steps = bn_steps
+        self.averaged_weights = None
+        self.num_averaged = 0
+
+    def on_train_begin(self, logs=None):
+        self.averaged_weights = None
+        self.num_averaged = 0
+
+    def on_epoch_end(self, epoch, logs=None):
+        if (epoch + 1) % self.check or (epoch + 1) // self.check < self.start_snapshot:
+            return
+        weights = self.model.get_weights()
+        if self.averaged_weights is None:
+            self.averaged_weights = weights
+        else:
+            # average += (weights - average) / n, in place
+            n = self.num_averaged + 1.
+            for average, w in zip(self.averaged_weights, weights):
+                average *= (n - 1.) / n
+                w *= 1. / n
+                average += w
+        self.num_averaged += 1
+
+    def on_train_end(self, logs=None):
+        if self.averaged_weights is None:
+            return
+        self.model.set_weights(self.averaged_weights)
+        if self.bn_data is not None:
+            self.update_normalization_statistics()
+        if self.filepath is not None:
+            self.model.save_weights(self.filepath, overwrite=True)
+
+    def _bn_batches(self):
+        data = self.bn_data
+        if isinstance(data, (list, np.ndarray)):
+            xs = data if isinstance(data, list) else [data]
+            for start in range(0, len(xs[0]), self.batch_size):
+                yield [x[start:start + self.batch_size] for x in xs]
+            return
+        if hasattr(data, '__getitem__') and hasattr(data, '__len__'):
+            batches = (data[i] for i in range(self.bn_steps or len(data)))
+        elif self.bn_steps is None:
+            raise ValueError('`bn_steps` is required when `bn_data` is a generator.')
+        else:
+            batches = (next(data) for _ in range(self.bn_steps))
+        for batch in batches:
+            if isinstance(batch, tuple):
+                batch = batch[0]
+            yield batch if isinstance(batch, list) else [batch]
+
+    def update_normalization_statistics(self):
+        """Recomputes the moving statistics of the normalization layers on `bn_data`."""
+        layers = [layer for layer in self.model.layers
+                  if isinstance(layer, (BatchNormalization, BatchRenormalization))]
+        if not layers:
+            return
+        outputs = []
+        for layer in layers:
+            x = KC.upcast(layer.get_input_at(0))
+            axes = list(range(K.ndim(x)))
+            del axes[layer.axis]
+            shape = K.shape(x)
+            count = K.cast(K.prod(K.stack([shape[axis] for axis in axes])), 'float32')
+            outputs += [K.mean(x, axis=axes), K.var(x, axis=axes), count]
+        inputs = list(self.model._feed_inputs)
+        learning_phase = not isinstance(K.learning_phase(), int)
+        if learning_phase:
+            inputs += [K.learning_phase()]
+        function = K.function(inputs, outputs)
+
+        # statistics of the batches, weighted by their number of values
+        totals = [[0., 0., 0.] for _ in layers]
+        for batch in self._bn_batches():
+            values = function(batch + ([1.] if learning_phase else []))
+            for i, layer in enumerate(layers):
+                mean, variance, count = values[3 * i:3 * i + 3]
+                if not isinstance(layer, BatchRenormalization):
+                    # unbiased variance, as `BatchNormalization`
+                    variance = variance * count / (count - (1. + layer.epsilon))
+                totals[i][0] += count * mean
+                totals[i][1] += count * variance
+                totals[i][2] += count
+
+        updates = []
+        for layer, (mean, variance, count) in zip(layers, totals):
+            mean = mean / count
+            variance = variance / count
+            if isinstance(layer, BatchRenormalization):
+                updates += [(layer.running_mean, mean),
+                            (layer.running_variance, variance + layer.epsilon)]
+            else:
+                updates += [(layer.moving_mean, mean),
+                            (layer.moving_variance, variance)]
+        K.batch_set_value(updates)
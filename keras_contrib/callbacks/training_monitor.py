@@ -0,0 +1,228 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import csv
+import time
+from collections import OrderedDict
+
+import numpy as np
+import six
+
+from keras.callbacks import Callback
+from keras import backend as K
+
+from .. import backend as KC
+
+
+# bounds of the saturating activations
+_ACTIVATION_BOUNDS = {'sigmoid': (0., 1.),
+                      'hard_sigmoid': (0., 1.),
+                      'softmax': (0., 1.),
+                      'tanh': (-1., 1.),
+                      'softsign': (-1., 1.)}
+
+
+class TrainingMonitor(Callback):
+    """Records activation and gradient statistics of layers during training.
+
+    Every `sample_every` batches, a batch of the monitoring data is evaluated
+    by a single function computing, for each monitored layer:
+        - `sparsity`: fraction of the outputs equal to 0.
+        - `saturation`: fraction of the outputs within `saturation_eps` of the
+            bounds of a sigmoid, hard_sigmoid, softmax, tanh or softsign
+            activation, NaN for other activations.
+        - `mean` and `variance` of the outputs.
+        - `grad_norm`: norm of the gradients of the loss with respect to the
+            trainable weights of the layer, NaN for layers without weights.
+
+    The last `buffer_size` records are kept in ring buffers, see `get_history`,
+    and are appended to a CSV file if `log_path` is set.
+
+    The time spent by the monitor is compared to the time of the training
+    steps. Whenever it exceeds `max_overhead`, the sampling interval is doubled,
+    so the overhead of the callback stays bounded.
+
+    # Arguments
+        x: monitoring inputs, a numpy array or list of numpy arrays.
+        y: monitoring targets, a numpy array or list of numpy arrays.
+        layers: list of layers or layer names to monitor, defaults to the
+            layers with trainable weights.
+        sample_every: number of training batches between two records.
+        batch_size: number of monitoring samples evaluated per record.
+        buffer_size: number of records kept in memory.
+        log_path: path of the CSV log, or None.
+        saturation_eps: distance to the activation bounds counted as saturated.
+        max_overhead: maximum fraction of the training time spent monitoring.
+        seed: seed of the sampling of the monitoring batches.
+
+    # Example
+        ```python
+            monitor = TrainingMonitor(x_val[:256], y_val[:256], sample_every=50,
+                                      log_path='health.csv')
+            model.fit(x_train, y_train, callbacks=[monitor])
+            print(monitor.overhead)
+        ```
+    """
+
+    statistics = ('sparsity', 'saturation', 'mean', 'variance', 'grad_norm')
+
+    def __init__(self, x, y, layers=None, sample_every=100, batch_size=32,
+                 buffer_size=1000, log_path=None, saturation_eps=1e-3,
+                 max_overhead=0.02, seed=None):
+        super(TrainingMonitor, self).__init__()
+        self.x = x
+        self.y = y
+        self.layers = layers
+        self.sample_every = sample_every
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self.log_path = log_path
+        self.saturation_eps = saturation_eps
+        self.max_overhead = max_overhead
+        self.random = np.random.RandomState(seed)
+        self.monitor_function = None
+        self.log_file = None
+
+    def set_model(self, model):
+        super(TrainingMonitor, self).set_model(model)
+        self.monitor_function = None
+
+    def _get_layers(self):
+        if self.layers is None:
+            return [layer for layer in self.model.layers
+                    if layer.trainable_weights and not isinstance(layer.output, list)]
+        return [self.model.get_layer(layer) if isinstance(layer, six.string_types) else layer
+                for layer in self.layers]
+
+    def _build_monitor_function(self):
+        if getattr(self.model, 'optimizer', None) is None:
+            raise ValueError('`TrainingMonitor` requires a compiled model.')
+        self.monitored_layers = self._get_layers()
+        outputs = []
+        self._has_saturation = []
+        self._has_grad_norm = []
+        for layer in self.monitored_layers:
+            x = KC.upcast(layer.output)
+            outputs.append(K.mean(K.cast(K.equal(x, 0.), 'float32')))
+            config = layer.get_config()
+            bounds = _ACTIVATION_BOUNDS.get(config.get('activation'))
+            self._has_saturation.append(bounds is not None)
+            if bounds is not None:
+                low, high = bounds
+                saturated = K.maximum(K.cast(K.less_equal(x, low + self.saturation_eps), 'float32'),
+                                      K.cast(K.greater_equal(x, high - self.saturation_eps), 'float32'))
+                outputs.append(K.mean(saturated))
+            outputs.append(K.mean(x))
+            outputs.append(K.var(x))
+            self._has_grad_norm.append(bool(layer.trainable_weights))
+            if layer.trainable_weights:
+                grads = K.gradients(self.model.total_loss, layer.trainable_weights)
+                outputs.append(K.sqrt(sum([K.sum(K.square(KC.upcast(g)))
+                                           for g in grads if g is not None])))
+        inputs = (self.model._feed_inputs +
+                  self.model._feed_targets +
+                  self.model._feed_sample_weights)
+        if self.model.uses_learning_phase and not isinstance(K.learning_phase(), int):
+            inputs += [K.learning_phase()]
+        self.monitor_function = K.function(inputs, outputs)
+        x, y, sample_weights = self.model._standardize_user_data(self.x, self.y)
+        self.monitor_data = x + y + sample_weights
+
+        shape = (self.buffer_size, len(self.monitored_layers))
+        self.buffers = OrderedDict((name, np.full(shape, np.nan, dtype='float32'))
+                                   for name in self.statistics)
+        self.steps = np.zeros(self.buffer_size, dtype='int64')
+        self.records = 0
+
+    def _sample_inputs(self):
+        num_samples = len(self.monitor_data[0])
+        index = self.random.choice(num_samples, min(self.batch_size, num_samples), replace=False)
+        inputs = [a[index] for a in self.monitor_data]
+        if self.model.uses_learning_phase and not isinstance(K.learning_phase(), int):
+            inputs += [1.]
+        return inputs
+
+    def record(self, step):
+        """Evaluates and stores the statistics of the monitored layers."""
+        if self.monitor_function is None:
+            self._build_monitor_function()
+        values = iter(self.monitor_function(self._sample_inputs()))
+        row = self.records % self.buffer_size
+        self.steps[row] = step
+        for i, (saturation, grad_norm) in enumerate(zip(self._has_saturation, self._has_grad_norm)):
+            self.buffers['sparsity'][row, i] = next(values)
+            if saturation:
+                self.buffers['saturation'][row, i] = next(values)
+            else:
+                self.buffers['saturation'][row, i] = np.nan
+            self.buffers['mean'][row, i] = next(values)
+            self.buffers['variance'][row, i] = next(values)
+            if grad_norm:
+                self.buffers['grad_norm'][row, i] = next(values)
+            else:
+                self.buffers['grad_norm'][row, i] = np.nan
+        self.records += 1
+        if self.log_file is not None:
+            for i, layer in enumerate(self.monitored_layers):
+                self.log_writer.writerow([step, layer.name] +
+                                         ['%.6g' % self.buffers[name][row, i] for name in self.statistics])
+
+    def get_history(self):
+        """Returns the records kept in the ring buffers.
+
+        # Returns
+            A dict with the training `steps` of the records and, for each
+            statistic, an array of shape `(records, monitored layers)`, in
+            chronological order.
+        """
+        if self.monitor_function is None:
+            return {}
+        count = min(self.records, self.buffer_size)
+        order = (np.arange(count) + self.records - count) % self.buffer_size
+        history = {'steps': self.steps[order],
+                   'layers': [layer.name for layer in self.monitored_layers]}
+        for name, buffer in self.buffers.items():
+            history[name] = buffer[order]
+        return history
+
+    @property
+    def overhead(self):
+        """Fraction of the training time spent monitoring."""
+        return self.monitor_time / max(self.train_time + self.monitor_time, 1e-12)
+
+    def on_train_begin(self, logs=None):
+        self.step = 0
+        self.train_time = 0.
+        self.monitor_time = 0.
+        self.batch_start = None
+        if self.monitor_function is None:
+            self._build_monitor_function()
+        if self.log_path is not None:
+            self.log_file = open(self.log_path, 'a')
+            self.log_writer = csv.writer(self.log_file)
+            if self.log_file.tell() == 0:
+                self.log_writer.writerow(('step', 'layer') + self.statistics)
+
+    def on_batch_begin(self, batch, logs=None):
+        self.batch_start = time.time()
+
+    def on_batch_end(self, batch, logs=None):
+        if self.batch_start is not None:
+            self.train_time += time.time() - self.batch_start
+        self.step += 1
+        if self.step % self.sample_every:
+            return
+        start = time.time()
+        self.record(self.step)
+        self.monitor_time += time.time() - start
+        if self.overhead > self.max_overhead:
+            self.sample_every *= 2
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.log_file is not None:
+            self.log_file.flush()
+
+    def on_train_end(self, logs=None):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
@@ -37,62 +37,50 @@ class ConvolutionAware(Initializer):
 
             transpose_dimensions = (2, 1, 0)
             kernel_shape = (row,)
-            correct_ifft = lambda shape, s=[None]: np.fft.irfft(shape, s[0])
-            correct_fft = np.fft.rfft
 
         elif rank == 4:
             row, column, stack_size, filters_size = shape
 
-            transpose_dimensions = (2, 3, 0, 1)
+            transpose_dimensions = (2, 3, 1, 0)
             kernel_shape = (row, column)
-            correct_ifft = np.fft.irfft2
-            correct_fft = np.fft.rfft2
 
         elif rank == 5:
             x, y, z, stack_size, filters_size = shape
 
-            transpose_dimensions = (3, 4, 0, 1, 2)
+            transpose_dimensions = (2, 3, 4, 1, 0)
             kernel_shape = (x, y, z)
-            correct_fft = np.fft.rfftn
-            correct_ifft = np.fft.irfftn
         else:
             return K.variable(self.orthogonal(shape), dtype=K.floatx())
 
-        kernel_fourier_shape = correct_fft(np.zeros(kernel_shape)).shape
+        kernel_fourier_shape = kernel_shape[:-1] + (kernel_shape[-1] // 2 + 1,)
 
-        init = []
-        for i in range(filters_size):
-            basis = self._create_basis(
-                stack_size, np.prod(kernel_fourier_shape))
-            basis = basis.reshape((stack_size,) + kernel_fourier_shape)
+        # one basis per filter, all computed at once
+        basis = self._create_basis(filters_size, stack_size, np.prod(kernel_fourier_shape))
+        basis = basis.reshape((filters_size, stack_size) + kernel_fourier_shape)
 
-            filters = [correct_ifft(x, kernel_shape) +
-                       np.random.normal(0, self.eps_std, kernel_shape) for
-                       x in basis]
-
-            init.append(filters)
+        axes = tuple(range(-len(kernel_shape), 0))
+        init = np.fft.irfftn(basis, kernel_shape, axes=axes)
+        init += np.random.normal(0, self.eps_std, init.shape)
 
         # Format of array is now: filters, stack, row, column
-        init = np.array(init)
         init = self._scale_filters(init, variance)
         return init.transpose(transpose_dimensions)
 
-    def _create_basis(self, filters, size):
+    def _create_basis(self, filters_size, filters, size):
+        """Returns `filters_size` stacks of `filters` orthogonal vectors of `size`."""
         if size == 1:
-            return np.random.normal(0.0, self.eps_std, (filters, size))
+            return np.random.normal(0.0, self.eps_std, (filters_size, filters, size))
 
         nbb = filters // size + 1
-        li = []
-        for i in range(nbb):
-            a = np.random.normal(0.0, 1.0, (size, size))
-            a = self._symmetrize(a)
-            u, _, v = np.linalg.svd(a)
-            li.extend(u.T.tolist())
-        p = np.array(li[:filters], dtype=K.floatx())
-        return p
+        a = np.random.normal(0.0, 1.0, (filters_size, nbb, size, size))
+        a = self._symmetrize(a)
+        # batched over the leading dimensions
+        u, _, v = np.linalg.svd(a)
+        p = np.swapaxes(u, -1, -2).reshape((filters_size, nbb * size, size))
+        return p[:, :filters].astype(K.floatx())
 
     def _symmetrize(self, a):
-        return a + a.T - np.diag(a.diagonal())
+        return a + np.swapaxes(a, -1, -2) - a * np.eye(a.shape[-1])
 
     def _scale_filters(self, filters, variance):
         c_var = np.var(filters)
@@ -181,21 +181,25 @@ class CosineConvolution2D(Layer):
         if self.data_format == 'channels_first':
             kernel_sum_axes = [1, 2, 3]
             if self.use_bias:
-                b = K.reshape(self.b, (self.filters, 1, 1, 1))
+                b = K.reshape(K.upcast(self.b), (self.filters, 1, 1, 1))
                 xb = 1.
         elif self.data_format == 'channels_last':
             kernel_sum_axes = [0, 1, 2]
             if self.use_bias:
-                b = K.reshape(self.b, (1, 1, 1, self.filters))
+                b = K.reshape(K.upcast(self.b), (1, 1, 1, self.filters))
                 xb = 1.
 
-        Wnorm = K.sqrt(K.sum(K.square(self.W), axis=kernel_sum_axes, keepdims=True) + K.square(b) + K.epsilon())
-        xnorm = K.sqrt(K.conv2d(K.square(x), self.kernel_norm, strides=self.strides,
+        # the norms are accumulated in float32 when computing in float16
+        W = K.upcast(self.W)
+        Wnorm = K.sqrt(K.sum(K.square(W), axis=kernel_sum_axes, keepdims=True) + K.square(b) + K.epsilon())
+        x_norm_input = K.upcast(x)
+        xnorm = K.sqrt(K.conv2d(K.square(x_norm_input), K.cast(self.kernel_norm, K.dtype(x_norm_input)),
+                                strides=self.strides,
                                 padding=self.padding,
                                 data_format=self.data_format,
                                 filter_shape=self.kernel_norm_shape) + xb + K.epsilon())
 
-        W = self.W / Wnorm
+        W = K.cast(W / Wnorm, K.dtype(self.W))
 
         output = K.conv2d(x, W, strides=self.strides,
                           padding=self.padding,
@@ -205,7 +209,7 @@ class CosineConvolution2D(Layer):
         if K.backend() == 'theano':
             xnorm = K.pattern_broadcast(xnorm, [False, True, False, False])
 
-        output /= xnorm
+        output /= K.cast(xnorm, K.dtype(output))
 
         if self.use_bias:
             b /= Wnorm
@@ -216,7 +220,7 @@ class CosineConvolution2D(Layer):
             else:
                 raise ValueError('Invalid data_format:', self.data_format)
             b /= xnorm
-            output += b
+            output += K.cast(b, K.dtype(output))
         output = self.activation(output)
         return output
 
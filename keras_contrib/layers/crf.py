@@ -382,11 +382,12 @@ class CRF(Layer):
     def get_energy(self, y_true, input_energy, mask):
         """Energy = a1' y1 + u1' y1 + y1' U y2 + u2' y2 + y2' U y3 + u3' y3 + an' y3
         """
+        chain_kernel = K.cast(self.chain_kernel, K.dtype(input_energy))
         input_energy = K.sum(input_energy * y_true, 2)  # (B, T)
-        chain_energy = K.sum(K.dot(y_true[:, :-1, :], self.chain_kernel) * y_true[:, 1:, :], 2)  # (B, T-1)
+        chain_energy = K.sum(K.dot(y_true[:, :-1, :], chain_kernel) * y_true[:, 1:, :], 2)  # (B, T-1)
 
         if mask is not None:
-            mask = K.cast(mask, K.floatx())
+            mask = K.cast(mask, K.dtype(input_energy))
             chain_mask = mask[:, :-1] * mask[:, 1:]  # (B, T-1), mask[:,:-1]*mask[:,1:] makes it work with any padding
             input_energy = input_energy * mask
             chain_energy = chain_energy * chain_mask
@@ -401,14 +402,17 @@ class CRF(Layer):
         input_energy = self.activation(K.dot(X, self.kernel) + self.bias)
         if self.use_boundary:
             input_energy = self.add_boundary_energy(input_energy, mask, self.left_boundary, self.right_boundary)
+        # the log-sum-exp recursion is accumulated in float32 when computing in float16
+        input_energy = K.upcast(input_energy)
+        y_true = K.cast(y_true, K.dtype(input_energy))
         energy = self.get_energy(y_true, input_energy, mask)
         logZ = self.get_log_normalization_constant(input_energy, mask, input_length=K.int_shape(X)[1])
         nloglik = logZ + energy
         if mask is not None:
-            nloglik = nloglik / K.sum(K.cast(mask, K.floatx()), 1)
+            nloglik = nloglik / K.sum(K.cast(mask, K.dtype(nloglik)), 1)
         else:
-            nloglik = nloglik / K.cast(K.shape(X)[1], K.floatx())
-        return nloglik
+            nloglik = nloglik / K.cast(K.shape(X)[1], K.dtype(nloglik))
+        return K.cast(nloglik, K.dtype(X))
 
     def step(self, input_energy_t, states, return_logZ=True):
         # not in the following  `prev_target_val` has shape = (B, F)
@@ -452,7 +456,7 @@ class CRF(Layer):
 
         If `return_logZ = False`, compute the Viterbi's best path lookup table.
         """
-        chain_energy = self.chain_kernel
+        chain_energy = K.cast(self.chain_kernel, K.dtype(input_energy))
         chain_energy = K.expand_dims(chain_energy, 0)  # shape=(1, F, F): F=num of output features. 1st F is for t-1, 2nd F for t
         prev_target_val = K.zeros_like(input_energy[:, 0, :])  # shape=(B, F), dtype=float32
 
@@ -465,7 +469,7 @@ class CRF(Layer):
         constants = [chain_energy]
 
         if mask is not None:
-            mask2 = K.cast(K.concatenate([mask, K.zeros_like(mask[:, :1])], axis=1), K.floatx())
+            mask2 = K.cast(K.concatenate([mask, K.zeros_like(mask[:, :1])], axis=1), K.dtype(input_energy))
             constants.append(mask2)
 
         def _step(input_energy_i, states):
@@ -491,13 +495,15 @@ class CRF(Layer):
         input_energy = self.activation(K.dot(X, self.kernel) + self.bias)
         if self.use_boundary:
             input_energy = self.add_boundary_energy(input_energy, mask, self.left_boundary, self.right_boundary)
+        # the log-sum-exp recursions are accumulated in float32 when computing in float16
+        input_energy = K.upcast(input_energy)
         input_length = K.int_shape(X)[1]
         alpha = self.forward_recursion(input_energy, mask=mask, input_length=input_length)
         beta = self.backward_recursion(input_energy, mask=mask, input_length=input_length)
         if mask is not None:
-            input_energy = input_energy * K.expand_dims(K.cast(mask, K.floatx()))
+            input_energy = input_energy * K.expand_dims(K.cast(mask, K.dtype(input_energy)))
         margin = -(self.shift_right(alpha) + input_energy + self.shift_left(beta))
-        return self.softmaxNd(margin)
+        return K.cast(self.softmaxNd(margin), K.dtype(X))
 
     def viterbi_decoding(self, X, mask=None):
         input_energy = self.activation(K.dot(X, self.kernel) + self.bias)
@@ -532,4 +538,5 @@ class CRF(Layer):
         best_paths = K.reverse(best_paths, 1)
         best_paths = K.squeeze(best_paths, 2)
 
-        return K.one_hot(best_paths, self.units)
+        # in the dtype of the train phase output, float16 for float16 models
+        return K.cast(K.one_hot(best_paths, self.units), K.dtype(X))
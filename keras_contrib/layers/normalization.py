@@ -110,9 +110,10 @@ class InstanceNormalization(Layer):
 
         del reduction_axes[0]
 
-        mean = K.mean(inputs, reduction_axes, keepdims=True)
-        stddev = K.std(inputs, reduction_axes, keepdims=True) + self.epsilon
-        normed = (inputs - mean) / stddev
+        # the statistics are accumulated in float32 when computing in float16
+        mean = K.mean(K.upcast(inputs), reduction_axes, keepdims=True)
+        stddev = K.std(K.upcast(inputs), reduction_axes, keepdims=True) + self.epsilon
+        normed = (inputs - K.cast(mean, K.dtype(inputs))) / K.cast(stddev, K.dtype(inputs))
 
         broadcast_shape = [1] * len(input_shape)
         if self.axis is not None:
@@ -290,7 +291,10 @@ class BatchRenormalization(Layer):
         broadcast_shape = [1] * len(input_shape)
         broadcast_shape[self.axis] = input_shape[self.axis]
 
-        mean_batch, var_batch = K.moments(inputs, reduction_axes, shift=None, keep_dims=False)
+        # the statistics are accumulated in float32 when computing in float16
+        mean_batch, var_batch = K.moments(K.upcast(inputs), reduction_axes, shift=None, keep_dims=False)
+        mean_batch = K.cast(mean_batch, K.dtype(inputs))
+        var_batch = K.cast(var_batch, K.dtype(inputs))
         std_batch = (K.sqrt(var_batch + self.epsilon))
 
         r = std_batch / (K.sqrt(self.running_variance + self.epsilon))
@@ -519,8 +523,9 @@ class GroupNormalization(Layer):
         inputs = K.reshape(inputs, group_shape)
 
         group_reduction_axes = list(range(len(group_axes)))
-        mean, variance = K.moments(inputs, group_reduction_axes[2:], keep_dims=True)
-        inputs = (inputs - mean) / (K.sqrt(variance + self.epsilon))
+        # the statistics are accumulated in float32 when computing in float16
+        mean, variance = K.moments(K.upcast(inputs), group_reduction_axes[2:], keep_dims=True)
+        inputs = (inputs - K.cast(mean, K.dtype(inputs))) / K.cast(K.sqrt(variance + self.epsilon), K.dtype(inputs))
 
         # prepare broadcast shape
         inputs = K.reshape(inputs, group_shape)
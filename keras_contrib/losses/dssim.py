@@ -1,24 +1,39 @@
 from __future__ import absolute_import
+import numpy as np
 from keras.objectives import *
 import keras_contrib.backend as KC
 
 
 class DSSIMObjective():
-    def __init__(self, k1=0.01, k2=0.03, kernel_size=3, max_value=1.0):
+    def __init__(self, k1=0.01, k2=0.03, kernel_size=3, max_value=1.0,
+                 strides=None, window='box', sigma=1.5):
         """
         Difference of Structural Similarity (DSSIM loss function). Clipped between 0 and 0.5
         Note : You should add a regularization term like a l2 loss in addition to this one.
-        Note : In theano, the `kernel_size` must be a factor of the output size. So 3 could
-               not be the `kernel_size` for an output of 32.
+
+        The local means, variances and covariance are computed over each window and
+        all the channels with an average pooling (or a separable gaussian convolution)
+        of the channel averaged images, so the memory used stays proportional to the
+        image size, even for overlapping windows.
 
         # Arguments
             k1: Parameter of the SSIM (default 0.01)
             k2: Parameter of the SSIM (default 0.03)
             kernel_size: Size of the sliding window (default 3)
             max_value: Max value of the output (default 1.0)
+            strides: Step of the sliding window, defaults to `kernel_size`
+                (non-overlapping windows). Use 1 for overlapping windows.
+            window: 'box' weights every pixel of a window equally, 'gaussian'
+                weights them with a gaussian of standard deviation `sigma`.
+            sigma: Standard deviation of the gaussian window, in pixels.
         """
+        if window not in {'box', 'gaussian'}:
+            raise ValueError('`window` must be "box" or "gaussian", got: ' + str(window))
         self.__name__ = 'DSSIMObjective'
         self.kernel_size = kernel_size
+        self.strides = kernel_size if strides is None else strides
+        self.window = window
+        self.sigma = sigma
         self.k1 = k1
         self.k2 = k2
         self.max_value = max_value
@@ -30,30 +45,36 @@ class DSSIMObjective():
     def __int_shape(self, x):
         return KC.int_shape(x) if self.backend == 'tensorflow' else KC.shape(x)
 
-    def __call__(self, y_true, y_pred):
-        # There are additional parameters for this function
-        # Note: some of the 'modes' for edge behavior do not yet have a gradient definition in the Theano tree
-        #   and cannot be used for learning
+    def __local_mean(self, x):
+        """Mean of `x` over each window and all the channels."""
+        channel_axis = 1 if self.dim_ordering == 'channels_first' else -1
+        x = K.mean(x, axis=channel_axis, keepdims=True)
+        kernel = (self.kernel_size, self.kernel_size)
+        strides = (self.strides, self.strides)
+        if self.window == 'box':
+            return K.pool2d(x, kernel, strides=strides, padding='valid',
+                            data_format=self.dim_ordering, pool_mode='avg')
+        # the gaussian window is separable, rows and columns are filtered in turn
+        offsets = np.arange(self.kernel_size) - (self.kernel_size - 1) / 2.
+        weights = np.exp(-offsets ** 2 / (2. * self.sigma ** 2))
+        weights = K.constant(weights / weights.sum(), dtype=K.dtype(x))
+        x = K.conv2d(x, K.reshape(weights, (self.kernel_size, 1, 1, 1)), strides=(self.strides, 1),
+                     padding='valid', data_format=self.dim_ordering)
+        return K.conv2d(x, K.reshape(weights, (1, self.kernel_size, 1, 1)), strides=(1, self.strides),
+                        padding='valid', data_format=self.dim_ordering)
 
-        kernel = [self.kernel_size, self.kernel_size]
+    def __call__(self, y_true, y_pred):
         y_true = KC.reshape(y_true, [-1] + list(self.__int_shape(y_pred)[1:]))
         y_pred = KC.reshape(y_pred, [-1] + list(self.__int_shape(y_pred)[1:]))
 
-        patches_pred = KC.extract_image_patches(y_pred, kernel, kernel, 'valid', self.dim_ordering)
-        patches_true = KC.extract_image_patches(y_true, kernel, kernel, 'valid', self.dim_ordering)
-
-        # Reshape to get the var in the cells
-        bs, w, h, c1, c2, c3 = self.__int_shape(patches_pred)
-        patches_pred = KC.reshape(patches_pred, [-1, w, h, c1 * c2 * c3])
-        patches_true = KC.reshape(patches_true, [-1, w, h, c1 * c2 * c3])
         # Get mean
-        u_true = KC.mean(patches_true, axis=-1)
-        u_pred = KC.mean(patches_pred, axis=-1)
+        u_true = self.__local_mean(y_true)
+        u_pred = self.__local_mean(y_pred)
         # Get variance
-        var_true = K.var(patches_true, axis=-1)
-        var_pred = K.var(patches_pred, axis=-1)
-        # Get std dev
-        covar_true_pred = K.mean(patches_true * patches_pred, axis=-1) - u_true * u_pred
+        var_true = self.__local_mean(K.square(y_true)) - K.square(u_true)
+        var_pred = self.__local_mean(K.square(y_pred)) - K.square(u_pred)
+        # Get covariance
+        covar_true_pred = self.__local_mean(y_true * y_pred) - u_true * u_pred
 
         ssim = (2 * u_true * u_pred + self.c1) * (2 * covar_true_pred + self.c2)
         denom = (K.square(u_true) + K.square(u_pred) + self.c1) * (var_pred + var_true + self.c2)
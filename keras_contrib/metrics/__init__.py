@@ -9,3 +9,4 @@ from .segmentation_metrics import binary_accuracy
 from .segmentation_metrics import categorical_accuracy
 from .segmentation_metrics import top_k_categorical_accuracy
 from .segmentation_metrics import sparse_top_k_categorical_accuracy
+from .segmentation_metrics import ConfusionMatrixMetric
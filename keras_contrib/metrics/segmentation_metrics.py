@@ -3,8 +3,11 @@
     adapted from: https://github.com/theduynguyen/Keras-FCN
 """
 import sys
+import numpy as np
 from keras import metrics
+from keras.engine import Layer
 import keras.backend as K
+from .. import backend as KC
 
 
 def _end_mean(x, axis=-1):
@@ -148,4 +151,139 @@ def mean_intersection_over_union(y_true, y_pred, smooth=None, axis=-1):
     iou = (intersection + smooth) / (
         (union_per_class - intersection) + smooth)
 
-    return K.mean(iou)
\ No newline at end of file
+    return K.mean(iou)
+
+
+def confusion_matrix(y_true, y_pred, classes, ignore_label=None):
+    """Confusion matrix of integer label arrays, computed with `np.bincount`.
+
+    # Arguments
+        y_true: integer array of ground truth labels.
+        y_pred: integer array of predicted labels, same size as `y_true`.
+        classes: int, number of classes.
+        ignore_label: label of the pixels to leave out, in addition to any
+            label outside of `[0, classes)`.
+
+    # Returns
+        An int64 array of shape `(classes, classes)`, the rows are indexed by
+        the ground truth and the columns by the prediction.
+    """
+    y_true = np.asarray(y_true).ravel().astype('int64')
+    y_pred = np.asarray(y_pred).ravel().astype('int64')
+    valid = (y_true >= 0) & (y_true < classes)
+    if ignore_label is not None:
+        valid &= y_true != ignore_label
+    index = y_true[valid] * classes + y_pred[valid]
+    return np.bincount(index, minlength=classes ** 2).reshape((classes, classes))
+
+
+def confusion_matrix_metrics(confusion):
+    """Derives the segmentation metrics from a confusion matrix.
+
+    Classes that appear neither in the ground truth nor in the predictions are
+    left out of the means.
+
+    # Arguments
+        confusion: array of shape `(classes, classes)`, as returned
+            by `confusion_matrix`.
+
+    # Returns
+        A dict with the `mean_iou`, `class_iou` (an array with the IoU of
+        every class, nan for absent classes), `pixel_accuracy` and
+        `mean_accuracy`.
+    """
+    confusion = np.asarray(confusion, dtype='float64')
+    true_positives = np.diag(confusion)
+    true_counts = confusion.sum(axis=1)
+    union = true_counts + confusion.sum(axis=0) - true_positives
+    with np.errstate(divide='ignore', invalid='ignore'):
+        class_iou = true_positives / union
+        class_accuracy = true_positives / true_counts
+    return {'mean_iou': np.nanmean(class_iou) if np.any(union) else 0.,
+            'class_iou': class_iou,
+            'pixel_accuracy': true_positives.sum() / max(confusion.sum(), 1.),
+            'mean_accuracy': np.nanmean(class_accuracy) if np.any(true_counts) else 0.}
+
+
+class ConfusionMatrixMetric(Layer):
+    """Stateful semantic segmentation metric over a whole epoch.
+
+    The confusion matrix of the argmax predictions is accumulated over all
+    the batches of an epoch with a bincount of `true * classes + pred`, so no
+    one-hot prediction is built, and the reported value is the dataset level
+    metric rather than an average of per-batch metrics. The accumulated matrix
+    is available in the `confusion` variable, see `confusion_matrix_metrics`
+    to derive the per-class IoU from it.
+
+    # Arguments
+        classes: int, number of classes.
+        metric: one of `'mean_iou'`, `'pixel_accuracy'`, `'mean_accuracy'`,
+            or `'class_iou'` for the IoU of the class `class_id`.
+        class_id: int, class of the `'class_iou'` metric.
+        sparse_target: if True, `y_true` holds the class indices, else it is
+            one-hot encoded and all-zero pixels are ignored.
+        ignore_label: label of the pixels to leave out, in addition to any
+            label outside of `[0, classes)`. Only used with `sparse_target`.
+        name: name of the metric, defaults to `metric`.
+
+    # Example
+
+    ```python
+        model.compile(loss='sparse_categorical_crossentropy', optimizer='sgd',
+                      metrics=[ConfusionMatrixMetric(21, sparse_target=True)])
+    ```
+    """
+
+    def __init__(self, classes, metric='mean_iou', class_id=None,
+                 sparse_target=False, ignore_label=None, name=None, **kwargs):
+        if metric not in {'mean_iou', 'pixel_accuracy', 'mean_accuracy', 'class_iou'}:
+            raise ValueError('Invalid metric: ' + str(metric))
+        if metric == 'class_iou' and class_id is None:
+            raise ValueError('`class_id` is required by the "class_iou" metric.')
+        if name is None:
+            name = metric if class_id is None else '%s_%d' % (metric, class_id)
+        super(ConfusionMatrixMetric, self).__init__(name=name, **kwargs)
+        self.stateful = True
+        self.classes = classes
+        self.metric = metric
+        self.class_id = class_id
+        self.sparse_target = sparse_target
+        self.ignore_label = ignore_label
+        self.confusion = K.variable(np.zeros((classes, classes)), dtype='int64',
+                                    name='confusion_matrix')
+
+    def reset_states(self):
+        K.set_value(self.confusion, np.zeros((self.classes, self.classes)))
+
+    def __call__(self, y_true, y_pred):
+        classes = self.classes
+        y_pred_labels = K.flatten(K.cast(K.argmax(y_pred, axis=-1), 'int32'))
+        if self.sparse_target:
+            y_true_labels = K.flatten(K.cast(y_true, 'int32'))
+            valid = K.cast(K.greater_equal(y_true_labels, 0), 'int32') * K.cast(K.less(y_true_labels, classes), 'int32')
+            if self.ignore_label is not None:
+                valid *= K.cast(K.not_equal(y_true_labels, self.ignore_label), 'int32')
+        else:
+            y_true_labels = K.flatten(K.cast(K.argmax(y_true, axis=-1), 'int32'))
+            valid = K.flatten(K.cast(K.greater(K.max(y_true, axis=-1), 0), 'int32'))
+
+        # ignored pixels are counted in an extra bin, which is dropped
+        index = valid * (y_true_labels * classes + y_pred_labels) + (1 - valid) * classes ** 2
+        counts = KC.bincount(index, classes ** 2 + 1)[:classes ** 2]
+        confusion = self.confusion + K.cast(K.reshape(counts, (classes, classes)), 'int64')
+        self.add_update(K.update(self.confusion, confusion), inputs=[y_true, y_pred])
+
+        confusion = K.cast(confusion, K.floatx())
+        true_positives = K.sum(confusion * K.eye(classes), axis=1)
+        true_counts = K.sum(confusion, axis=1)
+        if self.metric == 'pixel_accuracy':
+            return K.sum(true_positives) / K.maximum(K.sum(confusion), 1.)
+        if self.metric == 'mean_accuracy':
+            denom = true_counts
+        else:
+            denom = true_counts + K.sum(confusion, axis=0) - true_positives
+        present = K.cast(K.greater(denom, 0), K.floatx())
+        ratio = true_positives / K.maximum(denom, 1.)
+        if self.metric == 'class_iou':
+            return ratio[self.class_id]
+        return K.sum(ratio) / K.maximum(K.sum(present), 1.)
@@ -1,4 +1,5 @@
 from .ftml import FTML
+from .gradient_accumulation import GradientAccumulation
 from .padam import Padam
 
 # aliases
@@ -3,6 +3,14 @@ from keras.optimizers import Optimizer
 from .. import backend as K
 from keras.utils.generic_utils import get_custom_objects
 
+from .fused_updates import flat_size
+from .fused_updates import flatten
+from .fused_updates import group_by_dtype
+from .fused_updates import split
+from .loss_scaling import LossScaler
+from .loss_scaling import get_master_weights
+from .loss_scaling import read_master_weight
+
 
 class FTML(Optimizer):
     """FTML optimizer.
@@ -13,52 +21,105 @@ class FTML(Optimizer):
         beta_2: float, 0 < beta < 1. Generally close to 1.
         epsilon: float >= 0. Fuzz factor.
         decay: float >= 0. Learning rate decay over each update.
+        loss_scale: `None`, float or `'dynamic'`. Loss scaling for models
+            computing in float16, see `LossScaler`. The slots and updates of
+            float16 weights are always computed on float32 master copies.
+        fused: boolean. If True, the slots of all the parameters of a dtype
+            are stored in flat buffers, and the update is computed by a few
+            ops over the concatenated parameters and gradients instead of a
+            chain of ops per parameter. The results are the same, with fewer,
+            larger ops for models with many weights.
+        lazy: boolean. If True, the parameters receiving sparse gradients,
+            such as the embeddings of an `Embedding` layer with the TensorFlow
+            backend, only have the rows of the batch updated, so the cost of
+            a step depends on the number of tokens instead of the vocabulary
+            size. The second moment of a row is decayed for the steps it was
+            skipped when it is next updated, its other slots are kept from
+            its last update. Parameters with a constraint are always updated
+            densely.
 
     # References
         - [FTML - Follow the Moving Leader in Deep Learning](http://www.cse.ust.hk/~szhengac/papers/icml17.pdf)
     """
 
     def __init__(self, lr=0.0025, beta_1=0.6, beta_2=0.999,
-                 epsilon=1e-8, decay=0., **kwargs):
+                 epsilon=1e-8, decay=0., loss_scale=None, fused=False, lazy=False, **kwargs):
         super(FTML, self).__init__(**kwargs)
         self.__dict__.update(locals())
-        self.iterations = K.variable(0)
-        self.lr = K.variable(lr)
-        self.beta_1 = K.variable(beta_1)
-        self.beta_2 = K.variable(beta_2)
-        self.decay = K.variable(decay)
+        self.loss_scaler = LossScaler(loss_scale)
+        self.iterations = K.variable(0, dtype='int64', name='iterations')
+        self.lr = K.variable(lr, dtype='float32')
+        self.beta_1 = K.variable(beta_1, dtype='float32')
+        self.beta_2 = K.variable(beta_2, dtype='float32')
+        self.decay = K.variable(decay, dtype='float32')
         self.epsilon = epsilon
         self.inital_decay = decay
 
     def get_updates(self, loss, params):
-        grads = self.get_gradients(loss, params)
-        self.updates = [K.update_add(self.iterations, 1)]
+        grads = self.loss_scaler.get_gradients(self, loss, params)
+        update = self.loss_scaler.update
+        # the step is computed once, and the increment assigns it: the other
+        # reads of a variable are not ordered with its update in the training
+        # function, and could see the incremented value
+        step = self.iterations + 1
+        self.updates = [update(self.iterations, step)]
 
         lr = self.lr
         if self.inital_decay > 0:
-            lr *= (1. / (1. + self.decay * self.iterations))
+            lr *= (1. / (1. + self.decay * K.cast(step - 1, K.dtype(self.decay))))
 
-        t = self.iterations + 1
+        t = K.cast(step, 'float32')
 
         lr_t = lr / (1. - K.pow(self.beta_1, t))
 
-        shapes = [K.get_variable_shape(p) for p in params]
-        zs = [K.zeros(shape) for shape in shapes]
-        vs = [K.zeros(shape) for shape in shapes]
-        ds = [K.zeros(shape) for shape in shapes]
-        self.weights = [self.iterations] + zs + vs + ds
+        masters = get_master_weights(params)
+        sparse_grads = [K.sparse_gradient(g) if self.lazy and getattr(p, 'constraint', None) is None else None
+                        for p, g in zip(params, grads)]
+        if self.fused:
+            self.master_weights = [w for w, p in zip(masters, params) if w is not p]
+            self.exact_weights = []
+            self.weights = [self.iterations]
+            dense = [i for i, sparse in enumerate(sparse_grads) if sparse is None]
+            for group in group_by_dtype([masters[i] for i in dense]):
+                group = [dense[i] for i in group]
+                self._fused_updates([params[i] for i in group], [masters[i] for i in group],
+                                    [grads[i] for i in group], lr_t, t)
+            for p, w, sparse in zip(params, masters, sparse_grads):
+                if sparse is not None:
+                    z, v, d = [K.zeros(K.int_shape(w), dtype=K.dtype(w)) for _ in range(3)]
+                    self.exact_weights += [z, d]
+                    self.weights += [z, v, d]
+                    self._lazy_updates(p, w, sparse, lr_t, t, step, z, v, d)
+            self.weights += self.master_weights
+            return self.updates + self.loss_scaler.get_updates()
 
-        for p, g, z, v, d in zip(params, grads, zs, vs, ds):
-            v_t = self.beta_2 * v + (1. - self.beta_2) * K.square(g)
-            d_t = (K.sqrt(v_t / (1. - K.pow(self.beta_2, t))) + self.epsilon) / lr_t
-            sigma_t = d_t - self.beta_1 * d
-            z_t = self.beta_1 * z + (1. - self.beta_1) * g - sigma_t * p
+        shapes = [K.get_variable_shape(p) for p in params]
+        zs = [K.zeros(shape, dtype=K.dtype(w)) for shape, w in zip(shapes, masters)]
+        vs = [K.zeros(shape, dtype=K.dtype(w)) for shape, w in zip(shapes, masters)]
+        ds = [K.zeros(shape, dtype=K.dtype(w)) for shape, w in zip(shapes, masters)]
+        self.master_weights = [w for w, p in zip(masters, params) if w is not p]
+        # `z` is `-d * p` at the last update, and the next update cancels the
+        # `d` of `z` with the stored `d`: quantizing either moves the parameters
+        self.exact_weights = zs + ds
+        self.weights = [self.iterations] + zs + vs + ds + self.master_weights
+
+        for p, w, g, sparse, z, v, d in zip(params, masters, grads, sparse_grads, zs, vs, ds):
+            if sparse is not None:
+                self._lazy_updates(p, w, sparse, lr_t, t, step, z, v, d)
+                continue
+            dtype = K.dtype(w)
+            beta_1 = K.cast(self.beta_1, dtype)
+            beta_2 = K.cast(self.beta_2, dtype)
+            v_t = beta_2 * v + (1. - beta_2) * K.square(g)
+            d_t = (K.sqrt(v_t / K.cast(1. - K.pow(self.beta_2, t), dtype)) + self.epsilon) / K.cast(lr_t, dtype)
+            sigma_t = d_t - beta_1 * d
+            z_t = beta_1 * z + (1. - beta_1) * g - sigma_t * read_master_weight(p, w)
 
             p_t = - z_t / d_t
 
-            self.updates.append(K.update(z, z_t))
-            self.updates.append(K.update(v, v_t))
-            self.updates.append(K.update(d, d_t))
+            self.updates.append(update(z, z_t))
+            self.updates.append(update(v, v_t))
+            self.updates.append(update(d, d_t))
 
             new_p = p_t
 
@@ -66,15 +127,90 @@ class FTML(Optimizer):
             if getattr(p, 'constraint', None) is not None:
                 new_p = p.constraint(new_p)
 
-            self.updates.append(K.update(p, new_p))
-        return self.updates
+            self.updates.append(update(w, new_p))
+            if w is not p:
+                self.updates.append(update(p, K.cast(new_p, K.dtype(p))))
+        return self.updates + self.loss_scaler.get_updates()
+
+    def _lazy_updates(self, p, w, sparse, lr_t, t, step, z, v, d):
+        update = self.loss_scaler.scatter_update
+        values, indices = sparse
+        dtype = K.dtype(w)
+        # step at which each row was last updated
+        last_steps = K.zeros((K.int_shape(w)[0],), dtype='int64')
+        self.weights.append(last_steps)
+
+        last = K.gather(last_steps, indices)
+        skipped = K.cast(step - 1 - last, dtype)
+        skipped = K.reshape(skipped, (-1,) + (1,) * (K.ndim(w) - 1))
+        beta_1 = K.cast(self.beta_1, dtype)
+        beta_2 = K.cast(self.beta_2, dtype)
+        z_rows = K.gather(z, indices)
+        v_rows = K.gather(v, indices)
+        d_rows = K.gather(d, indices)
+        w_rows = read_master_weight(p, w, indices)
+        # the second moment is decayed for the skipped steps, in which the
+        # gradients of the rows were 0, before the update of this step
+        v_t = K.pow(beta_2, skipped + 1.) * v_rows + (1. - beta_2) * K.square(values)
+        d_t = (K.sqrt(v_t / K.cast(1. - K.pow(self.beta_2, t), dtype)) + self.epsilon) / K.cast(lr_t, dtype)
+        sigma_t = d_t - beta_1 * d_rows
+        z_t = beta_1 * z_rows + (1. - beta_1) * values - sigma_t * w_rows
+
+        new_rows = - z_t / d_t
+
+        self.updates.append(update(z, indices, z_rows, z_t))
+        self.updates.append(update(v, indices, v_rows, v_t))
+        self.updates.append(update(d, indices, d_rows, d_t))
+        self.updates.append(update(last_steps, indices, last, K.ones_like(last) * step))
+
+        self.updates.append(update(w, indices, w_rows, new_rows))
+        if w is not p:
+            self.updates.append(update(p, indices, K.gather(p, indices), K.cast(new_rows, K.dtype(p))))
+
+    def _fused_updates(self, params, masters, grads, lr_t, t):
+        update = self.loss_scaler.update
+        dtype = K.dtype(masters[0])
+        shapes = [K.int_shape(w) for w in masters]
+        size = flat_size(shapes)
+        z = K.zeros((size,), dtype=dtype)
+        v = K.zeros((size,), dtype=dtype)
+        d = K.zeros((size,), dtype=dtype)
+
+        w = flatten([read_master_weight(p, w) for p, w in zip(params, masters)])
+        g = flatten(grads)
+        beta_1 = K.cast(self.beta_1, dtype)
+        beta_2 = K.cast(self.beta_2, dtype)
+        v_t = beta_2 * v + (1. - beta_2) * K.square(g)
+        d_t = (K.sqrt(v_t / K.cast(1. - K.pow(self.beta_2, t), dtype)) + self.epsilon) / K.cast(lr_t, dtype)
+        sigma_t = d_t - beta_1 * d
+        z_t = beta_1 * z + (1. - beta_1) * g - sigma_t * w
+
+        p_t = - z_t / d_t
+
+        self.updates.append(update(z, z_t))
+        self.updates.append(update(v, v_t))
+        self.updates.append(update(d, d_t))
+        self.exact_weights += [z, d]
+
+        for p, w, new_p in zip(params, masters, split(p_t, shapes)):
+            # Apply constraints.
+            if getattr(p, 'constraint', None) is not None:
+                new_p = p.constraint(new_p)
+
+            self.updates.append(update(w, new_p))
+            if w is not p:
+                self.updates.append(update(p, K.cast(new_p, K.dtype(p))))
+        self.weights += [z, v, d]
 
     def get_config(self):
         config = {'lr': float(K.get_value(self.lr)),
                   'beta_1': float(K.get_value(self.beta_1)),
                   'beta_2': float(K.get_value(self.beta_2)),
                   'decay': float(K.get_value(self.decay)),
-                  'epsilon': self.epsilon}
+                  'epsilon': self.epsilon,
+                  'loss_scale': self.loss_scaler.loss_scale,
+                  'fused': self.fused,
+                  'lazy': self.lazy}
         base_config = super(FTML, self).get_config()
         return dict(list(base_config.items()) + list(config.items()))
 
@@ -0,0 +1,36 @@
+import numpy as np
+from keras import backend as K
+
+
+def group_by_dtype(variables):
+    """Returns the indices of `variables` grouped by dtype, in order of first appearance."""
+    groups = {}
+    order = []
+    for i, x in enumerate(variables):
+        dtype = K.dtype(x)
+        if dtype not in groups:
+            groups[dtype] = []
+            order.append(dtype)
+        groups[dtype].append(i)
+    return [groups[dtype] for dtype in order]
+
+
+def flat_size(shapes):
+    """Returns the number of elements of tensors of the given shapes."""
+    return sum(int(np.prod(shape)) for shape in shapes)
+
+
+def flatten(tensors):
+    """Concatenates `tensors` in a single 1D tensor."""
+    return K.concatenate([K.reshape(x, (-1,)) for x in tensors], axis=0)
+
+
+def split(flat, shapes):
+    """Splits a tensor returned by `flatten` back to tensors of the given shapes."""
+    tensors = []
+    start = 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        tensors.append(K.reshape(flat[start:start + size], shape))
+        start += size
+    return tensors
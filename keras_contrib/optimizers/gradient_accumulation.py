@@ -0,0 +1,169 @@
+import contextlib
+import copy
+
+import keras
+from keras import backend as K
+from keras import optimizers
+from keras.optimizers import Optimizer
+from keras.utils.generic_utils import get_custom_objects
+
+from .. import backend as KC
+
+
+@contextlib.contextmanager
+def _gated_updates(condition):
+    """Makes the variable updates created in the context no-ops unless `condition`."""
+    update = K.update
+    update_add = K.update_add
+    update_sub = K.update_sub
+    # `scatter_update` is not available with every backend
+    scatter_update = getattr(KC, 'scatter_update', None)
+
+    def gated_update(x, new_x):
+        return update(x, K.switch(condition, new_x, x))
+
+    def gated_update_add(x, increment):
+        increment = K.cast(increment, K.dtype(x))
+        return update_add(x, K.switch(condition, increment, K.zeros_like(increment)))
+
+    def gated_update_sub(x, decrement):
+        decrement = K.cast(decrement, K.dtype(x))
+        return update_sub(x, K.switch(condition, decrement, K.zeros_like(decrement)))
+
+    def gated_scatter_update(x, indices, updates):
+        return scatter_update(x, indices, K.switch(condition, updates, K.gather(x, indices)))
+
+    # the keras optimizers use `keras.backend`, the contrib ones may also use
+    # the functions re-exported by `keras_contrib.backend`
+    modules = [keras.backend, KC]
+    originals = [(module, name, getattr(module, name))
+                 for module in modules
+                 for name in ['update', 'update_add', 'update_sub']]
+    gated = {'update': gated_update,
+             'update_add': gated_update_add,
+             'update_sub': gated_update_sub}
+    try:
+        for module, name, _ in originals:
+            setattr(module, name, gated[name])
+        if scatter_update is not None:
+            KC.scatter_update = gated_scatter_update
+        yield
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+        if scatter_update is not None:
+            KC.scatter_update = scatter_update
+
+
+class GradientAccumulation(Optimizer):
+    """Applies an optimizer to the gradients accumulated over several batches.
+
+    The gradients of each batch are summed in a slot per parameter, and every
+    `accum_steps` batches the wrapped optimizer updates the parameters with
+    their mean, then the slots are reset. Training with batches of size `n`
+    thus approximates training with batches of size `n * accum_steps`, with
+    the activation memory of batches of size `n`. Layers computing batch
+    statistics, such as `BatchNormalization`, still see batches of size `n`.
+
+    The learning rate is the one of the wrapped optimizer, so callbacks such
+    as `CyclicLR` or `LearningRateScheduler` can set it. These callbacks count
+    batches, not updates: a `step_size` of `k * accum_steps` batches is a
+    half cycle of `k` updates.
+
+    # Arguments
+        optimizer: the wrapped optimizer, an instance or a name, such as a
+            `Padam` or `FTML` instance. Its `clipnorm` and `clipvalue` are
+            applied to the gradients of each batch.
+        accum_steps: int >= 1, number of batches per update.
+
+    # Raises
+        ValueError: if `accum_steps < 1`, or the wrapped optimizer uses
+            dynamic loss scaling.
+
+    # Example
+        ```python
+            # updates of batch size 64 with batches of size 16
+            model.compile(optimizer=GradientAccumulation(Padam(), accum_steps=4),
+                          loss='categorical_crossentropy')
+            model.fit(x_train, y_train, batch_size=16)
+        ```
+    """
+
+    def __init__(self, optimizer, accum_steps=2, **kwargs):
+        super(GradientAccumulation, self).__init__(**kwargs)
+        if accum_steps < 1:
+            raise ValueError('`accum_steps` must be >= 1, got: ' + str(accum_steps))
+        self.optimizer = optimizers.get(optimizer)
+        if getattr(getattr(self.optimizer, 'loss_scaler', None), 'dynamic', False):
+            raise ValueError('`GradientAccumulation` does not support dynamic loss '
+                             'scaling, use a static `loss_scale` instead.')
+        self.accum_steps = accum_steps
+        with K.name_scope(self.__class__.__name__):
+            self.iterations = K.variable(0, dtype='int64', name='iterations')
+
+    @property
+    def lr(self):
+        return self.optimizer.lr
+
+    @lr.setter
+    def lr(self, lr):
+        self.optimizer.lr = lr
+
+    @property
+    def master_weights(self):
+        return getattr(self.optimizer, 'master_weights', [])
+
+    @property
+    def exact_weights(self):
+        return getattr(self.optimizer, 'exact_weights', [])
+
+    def get_updates(self, loss, params):
+        loss_scaler = getattr(self.optimizer, 'loss_scaler', None)
+        if loss_scaler is not None:
+            grads = loss_scaler.get_gradients(self.optimizer, loss, params)
+        else:
+            grads = self.optimizer.get_gradients(loss, params)
+        # the step is computed once, and the increment assigns it, so that the
+        # accumulation boundary can not read the incremented value
+        step = self.iterations + 1
+        self.updates = [K.update(self.iterations, step)]
+        apply = K.equal(step % self.accum_steps, 0)
+
+        accumulators = [K.zeros(K.int_shape(p), dtype=K.dtype(g)) for p, g in zip(params, grads)]
+        mean_grads = []
+        for accumulator, g in zip(accumulators, grads):
+            accumulator_t = accumulator + g
+            mean_grads.append(accumulator_t / float(self.accum_steps))
+            self.updates.append(K.update(accumulator, K.switch(apply, K.zeros_like(accumulator_t),
+                                                               accumulator_t)))
+
+        # the wrapped optimizer is given the mean gradients, and its updates
+        # are only applied at the last batch of each accumulation
+        self.optimizer.get_gradients = lambda loss, params: mean_grads
+        if loss_scaler is not None:
+            loss_scaler.get_gradients = lambda optimizer, loss, params: mean_grads
+        try:
+            with _gated_updates(apply):
+                self.updates += self.optimizer.get_updates(loss, params)
+        finally:
+            del self.optimizer.get_gradients
+            if loss_scaler is not None:
+                del loss_scaler.get_gradients
+        self.weights = [self.iterations] + accumulators + self.optimizer.weights
+        return self.updates
+
+    def get_config(self):
+        config = {'optimizer': optimizers.serialize(self.optimizer),
+                  'accum_steps': self.accum_steps}
+        base_config = super(GradientAccumulation, self).get_config()
+        return dict(list(base_config.items()) + list(config.items()))
+
+    @classmethod
+    def from_config(cls, config):
+        config = dict(config)
+        # `deserialize` changes the class name of the config it is given
+        optimizer = optimizers.deserialize(copy.deepcopy(config.pop('optimizer')))
+        return cls(optimizer, **config)
+
+
+get_custom_objects().update({'GradientAccumulation': GradientAccumulation})
@@ -0,0 +1,160 @@
+import numpy as np
+from keras import backend as K
+from keras.optimizers import clip_norm
+
+from .. import backend as KC
+
+
+def get_master_weights(params):
+    """Returns float32 master copies of the float16 `params`.
+
+    The optimizer slots and the updates of float16 parameters are computed on
+    their master copy, which is then cast back to the parameter, so that small
+    updates are not rounded away. Other parameters are returned unchanged.
+    The copies are initialized from the current values of the parameters, and
+    read with `read_master_weight`, which follows the parameters set later.
+
+    # Arguments
+        params: List of variables.
+
+    # Returns
+        A list of variables.
+    """
+    return [K.variable(K.get_value(p), dtype='float32') if K.dtype(p) == 'float16' else p
+            for p in params]
+
+
+def read_master_weight(p, w, indices=None):
+    """Returns the value of the master copy `w` of the parameter `p`.
+
+    The elements of a float16 parameter set since the last update, such as by
+    `model.set_weights` or `model.load_weights`, no longer match their master
+    copy, and are read from the parameter instead.
+
+    # Arguments
+        p: the parameter.
+        w: its master copy, returned by `get_master_weights`.
+        indices: None, or the indices of the rows to read.
+
+    # Returns
+        A tensor.
+    """
+    if indices is not None:
+        if w is p:
+            return K.gather(w, indices)
+        p, w = K.gather(p, indices), K.gather(w, indices)
+    elif w is p:
+        return w
+    return K.switch(K.equal(K.cast(w, K.dtype(p)), p), w, K.cast(p, K.dtype(w)))
+
+
+class LossScaler(object):
+    """Loss scaling for the gradients of a float16 model.
+
+    The loss is multiplied by a scale before differentiation so that small
+    float16 gradients do not underflow, and the gradients are divided by it
+    (in float32) before being used by the optimizer.
+
+    # Arguments
+        loss_scale: `None` disables loss scaling, a float sets a static scale
+            and `'dynamic'` starts from `initial_scale`, halves the scale and
+            skips the update whenever the gradients overflow and doubles it
+            after `scale_window` consecutive finite steps.
+        initial_scale: float, the initial dynamic scale.
+        scale_window: int, number of finite steps before the dynamic scale
+            is increased.
+
+    # References
+        - [Mixed Precision Training](https://arxiv.org/abs/1710.03740)
+    """
+
+    def __init__(self, loss_scale=None, initial_scale=2. ** 15, scale_window=2000):
+        if loss_scale is not None and loss_scale != 'dynamic' and loss_scale <= 0:
+            raise ValueError('`loss_scale` must be None, a positive float '
+                             'or "dynamic", got: ' + str(loss_scale))
+        self.loss_scale = loss_scale
+        self.dynamic = loss_scale == 'dynamic'
+        self.scale_window = scale_window
+        self.finite = None
+        if loss_scale is not None:
+            with K.name_scope('LossScaler'):
+                self.scale = K.variable(initial_scale if self.dynamic else loss_scale,
+                                        dtype='float32', name='scale')
+                self.finite_steps = K.variable(0, dtype='int64', name='finite_steps')
+
+    def get_gradients(self, optimizer, loss, params):
+        """Same as `optimizer.get_gradients`, on the scaled loss.
+
+        # Arguments
+            optimizer: the optimizer whose `clipnorm` and `clipvalue`
+                are applied to the unscaled gradients.
+            loss: Scalar tensor to minimize.
+            params: List of variables.
+
+        # Returns
+            A list of gradient tensors, in float32 for float16 parameters.
+        """
+        if self.loss_scale is None:
+            return [KC.upcast(g) for g in optimizer.get_gradients(loss, params)]
+        # the scaled loss is kept in float32 so that the scale itself can not
+        # overflow, overflowing gradients are caught by the dynamic scaling
+        loss = KC.upcast(loss)
+        grads = K.gradients(loss * K.cast(self.scale, K.dtype(loss)), params)
+        _check_gradients(grads)
+        grads = [KC.upcast(g) for g in grads]
+        grads = [g / K.cast(self.scale, K.dtype(g)) for g in grads]
+        if self.dynamic:
+            total = sum([K.cast(K.sum(g), 'float32') for g in grads])
+            self.finite = K.less(K.abs(total), np.inf)
+        return _clip_gradients(optimizer, grads)
+
+    def update(self, x, new_x):
+        """Same as `K.update`, skipped when the gradients overflowed."""
+        if self.finite is not None:
+            new_x = K.switch(self.finite, new_x, x)
+        return K.update(x, new_x)
+
+    def scatter_update(self, x, indices, rows, new_rows):
+        """Same as `KC.scatter_update`, skipped when the gradients overflowed.
+
+        # Arguments
+            x: variable.
+            indices: indices of the updated rows.
+            rows: current values of the rows.
+            new_rows: new values of the rows.
+        """
+        if self.finite is not None:
+            new_rows = K.switch(self.finite, new_rows, rows)
+        return KC.scatter_update(x, indices, new_rows)
+
+    def get_updates(self):
+        """Returns the updates of the dynamic loss scale."""
+        if self.finite is None:
+            return []
+        finite_steps = K.switch(self.finite, self.finite_steps + 1,
+                                K.zeros_like(self.finite_steps))
+        grow = K.greater_equal(finite_steps, self.scale_window)
+        scale = K.switch(self.finite,
+                         K.switch(grow, self.scale * 2., self.scale),
+                         K.maximum(self.scale / 2., 1.))
+        finite_steps = K.switch(grow, K.zeros_like(finite_steps), finite_steps)
+        return [K.update(self.scale, scale),
+                K.update(self.finite_steps, finite_steps)]
+
+
+def _check_gradients(grads):
+    if None in grads:
+        raise ValueError('An operation has `None` for gradient. '
+                         'Please make sure that all of your ops have a '
+                         'gradient defined (i.e. are differentiable). '
+                         'Common ops without gradient: '
+                         'K.argmax, K.round, K.eval.')
+
+
+def _clip_gradients(optimizer, grads):
+    if getattr(optimizer, 'clipnorm', 0) > 0:
+        norm = K.sqrt(sum([K.sum(K.square(g)) for g in grads]))
+        grads = [clip_norm(g, optimizer.clipnorm, norm) for g in grads]
+    if getattr(optimizer, 'clipvalue', 0) > 0:
+        grads = [K.clip(g, -optimizer.clipvalue, optimizer.clipvalue) for g in grads]
+    return grads
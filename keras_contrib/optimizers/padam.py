@@ -1,11 +1,35 @@
+import numpy as np
 from keras import backend as K
 from keras.optimizers import Optimizer
 from keras.utils.generic_utils import get_custom_objects
 
+from .. import backend as KC
+
+from .fused_updates import flat_size
+from .fused_updates import flatten
+from .fused_updates import group_by_dtype
+from .fused_updates import split
+from .loss_scaling import LossScaler
+from .loss_scaling import get_master_weights
+from .loss_scaling import read_master_weight
+
+
+def _cast(x, dtype):
+    if K.dtype(x) == dtype:
+        return x
+    return K.cast(x, dtype)
+
+
+def _factored_shapes(shape):
+    """Shapes of the row and column statistics of a factored second moment."""
+    return [shape[:-1], shape[:-2] + shape[-1:]]
+
 
 class Padam(Optimizer):
     def __init__(self, lr=1e-1, beta_1=0.9, beta_2=0.999,
-                 epsilon=1e-8, decay=0., amsgrad=False, partial=1. / 8., **kwargs):
+                 epsilon=1e-8, decay=0., amsgrad=False, partial=1. / 8.,
+                 loss_scale=None, fused=False, lazy=False,
+                 factored=False, first_moment_dtype=None, **kwargs):
         """ Partially adaptive momentum estimation optimizer.
 
         # Arguments
@@ -19,8 +43,38 @@ class Padam(Optimizer):
                 Beyond".
             partial: float, 0 <= partial <= 0.5 . Parameter controlling partial momentum adaption. For `partial=0`, this optimizer behaves like SGD, for `partial=0.5`
             it behaves like AMSGrad.
+            loss_scale: `None`, float or `'dynamic'`. Loss scaling for models
+                computing in float16, see `LossScaler`. The slots and updates of
+                float16 weights are always computed on float32 master copies.
+            fused: boolean. If True, the slots of all the parameters of a dtype
+                are stored in flat buffers, and the update is computed by a
+                few ops over the concatenated parameters and gradients instead
+                of a chain of ops per parameter. The results are the same,
+                with fewer, larger ops for models with many weights.
+            lazy: boolean. If True, the parameters receiving sparse gradients,
+                such as the embeddings of an `Embedding` layer with the
+                TensorFlow backend, only have the rows of the batch updated,
+                so the cost of a step depends on the number of tokens instead
+                of the vocabulary size. The moments of a row are decayed for
+                the steps it was skipped when it is next updated. Parameters
+                with a constraint are always updated densely.
+            factored: boolean. If True, the second moments (and their maximum
+                with `amsgrad`) of the parameters of 2 or more dimensions,
+                such as dense and convolution kernels, are stored as the
+                moving averages of their means over the last and the second
+                to last axis, from which the full second moment is estimated
+                with a rank one product, as in Adafactor. The state of a
+                `(rows, cols)` kernel takes `rows + cols` values instead of
+                `rows * cols`. Parameters updated lazily keep full second
+                moments. Not available with `fused`.
+            first_moment_dtype: `None` or dtype, such as `'float16'`, of the
+                stored first moments, defaults to the dtype of the parameters
+                (float32 for float16 parameters). The updates are still
+                computed in the dtype of the parameters.
+                See `get_state_report` for the memory saved.
 
         # References
+            - [Adafactor: Adaptive Learning Rates with Sublinear Memory Cost](https://arxiv.org/abs/1804.04235)
             - [Closing the Generalization Gap of Adaptive Gradient Methods in Training Deep Neural Networks](https://arxiv.org/pdf/1806.06763.pdf)
 
         """
@@ -30,63 +84,256 @@ class Padam(Optimizer):
                 "value of `0.5`, since higher values will cause divergence "
                 "during training."
             )
+        if factored and fused:
+            raise ValueError('Padam: `factored` second moments can not be stored in '
+                             'the flat buffers of `fused` updates.')
         super(Padam, self).__init__(**kwargs)
         with K.name_scope(self.__class__.__name__):
             self.iterations = K.variable(0, dtype='int64', name='iterations')
-            self.lr = K.variable(lr, name='lr')
-            self.beta_1 = K.variable(beta_1, name='beta_1')
-            self.beta_2 = K.variable(beta_2, name='beta_2')
-            self.decay = K.variable(decay, name='decay')
+            self.lr = K.variable(lr, dtype='float32', name='lr')
+            self.beta_1 = K.variable(beta_1, dtype='float32', name='beta_1')
+            self.beta_2 = K.variable(beta_2, dtype='float32', name='beta_2')
+            self.decay = K.variable(decay, dtype='float32', name='decay')
         if epsilon is None:
             epsilon = K.epsilon()
         self.epsilon = epsilon
         self.partial = partial
         self.initial_decay = decay
         self.amsgrad = amsgrad
+        self.loss_scaler = LossScaler(loss_scale)
+        self.fused = fused
+        self.lazy = lazy
+        self.factored = factored
+        self.first_moment_dtype = first_moment_dtype
+
+    def _is_factored(self, shape):
+        return self.factored and len(shape) >= 2
+
+    def get_state_report(self, params):
+        """Returns the memory used by the slots of this optimizer for `params`.
+
+        The report assumes dense gradients: with `lazy`, the parameters
+        receiving sparse gradients keep full second moments.
+
+        # Arguments
+            params: List of variables, such as `model.trainable_weights`.
+
+        # Returns
+            A dict with the bytes of the slots, `state_bytes`, the bytes of
+            the slots of a `Padam` storing full moments in the dtype of the
+            parameters, `dense_state_bytes`, and their difference,
+            `saved_bytes`.
+        """
+        state_bytes = 0
+        dense_state_bytes = 0
+        moments = 3 if self.amsgrad else 2
+        for p in params:
+            shape = K.int_shape(p)
+            dtype = 'float32' if K.dtype(p) == 'float16' else K.dtype(p)
+            itemsize = np.dtype(dtype).itemsize
+            size = int(np.prod(shape))
+            dense_state_bytes += moments * size * itemsize
+            state_bytes += size * np.dtype(self.first_moment_dtype or dtype).itemsize
+            if self._is_factored(shape):
+                second_moment_size = sum(int(np.prod(s)) for s in _factored_shapes(shape))
+            else:
+                second_moment_size = size
+            state_bytes += (moments - 1) * second_moment_size * itemsize
+        return {'state_bytes': state_bytes,
+                'dense_state_bytes': dense_state_bytes,
+                'saved_bytes': dense_state_bytes - state_bytes}
+
+    def _second_moment_zeros(self, w, factored):
+        if factored:
+            return [K.zeros(shape, dtype=K.dtype(w)) for shape in _factored_shapes(K.int_shape(w))]
+        return [K.zeros(K.int_shape(w), dtype=K.dtype(w))]
 
     def get_updates(self, loss, params):
-        grads = self.get_gradients(loss, params)
-        self.updates = [K.update_add(self.iterations, 1)]
+        grads = self.loss_scaler.get_gradients(self, loss, params)
+        update = self.loss_scaler.update
+        # the step is computed once, and the increment assigns it: the other
+        # reads of a variable are not ordered with its update in the training
+        # function, and could see the incremented value
+        step = self.iterations + 1
+        self.updates = [update(self.iterations, step)]
 
         lr = self.lr
         if self.initial_decay > 0:
-            lr *= (1. / (1. + self.decay * K.cast(self.iterations,
+            lr *= (1. / (1. + self.decay * K.cast(step - 1,
                                                   K.dtype(self.decay))))
 
-        t = K.cast(self.iterations, K.floatx()) + 1
+        t = K.cast(step, 'float32')
         lr_t = lr * (K.sqrt(1. - K.pow(self.beta_2, t)) /
                      (1. - K.pow(self.beta_1, t)))
 
-        ms = [K.zeros(K.int_shape(p), dtype=K.dtype(p)) for p in params]
-        vs = [K.zeros(K.int_shape(p), dtype=K.dtype(p)) for p in params]
+        masters = get_master_weights(params)
+        sparse_grads = [KC.sparse_gradient(g) if self.lazy and getattr(p, 'constraint', None) is None else None
+                        for p, g in zip(params, grads)]
+        if self.fused:
+            self.master_weights = [w for w, p in zip(masters, params) if w is not p]
+            self.weights = [self.iterations]
+            dense = [i for i, sparse in enumerate(sparse_grads) if sparse is None]
+            for group in group_by_dtype([masters[i] for i in dense]):
+                group = [dense[i] for i in group]
+                self._fused_updates([params[i] for i in group], [masters[i] for i in group],
+                                    [grads[i] for i in group], lr_t)
+            for p, w, sparse in zip(params, masters, sparse_grads):
+                if sparse is not None:
+                    m = K.zeros(K.int_shape(w), dtype=self.first_moment_dtype or K.dtype(w))
+                    v = K.zeros(K.int_shape(w), dtype=K.dtype(w))
+                    vhat = K.zeros(K.int_shape(w), dtype=K.dtype(w)) if self.amsgrad else None
+                    self.weights += [m, v] + ([vhat] if self.amsgrad else [])
+                    self._lazy_updates(p, w, sparse, lr_t, step, m, v, vhat)
+            self.weights += self.master_weights
+            return self.updates + self.loss_scaler.get_updates()
+
+        factored = [self._is_factored(K.int_shape(w)) and sparse is None
+                    for w, sparse in zip(masters, sparse_grads)]
+        ms = [K.zeros(K.int_shape(p), dtype=self.first_moment_dtype or K.dtype(p)) for p in masters]
+        vs = [self._second_moment_zeros(p, f) for p, f in zip(masters, factored)]
         if self.amsgrad:
-            vhats = [K.zeros(K.int_shape(p), dtype=K.dtype(p)) for p in params]
+            vhats = [self._second_moment_zeros(p, f) for p, f in zip(masters, factored)]
         else:
-            vhats = [K.zeros(1) for _ in params]
-        self.weights = [self.iterations] + ms + vs + vhats
-
-        for p, g, m, v, vhat in zip(params, grads, ms, vs, vhats):
-            m_t = (self.beta_1 * m) + (1. - self.beta_1) * g
-            v_t = (self.beta_2 * v) + (1. - self.beta_2) * K.square(g)
-            if self.amsgrad:
-                vhat_t = K.maximum(vhat, v_t)
-                denom = (K.sqrt(vhat_t) + self.epsilon)
-                self.updates.append(K.update(vhat, vhat_t))
+            vhats = [[K.zeros(1)] for _ in params]
+        self.master_weights = [w for w, p in zip(masters, params) if w is not p]
+        self.weights = ([self.iterations] + ms + [x for v in vs for x in v] +
+                        [x for vhat in vhats for x in vhat] + self.master_weights)
+
+        for p, w, g, sparse, f, m, v, vhat in zip(params, masters, grads, sparse_grads, factored, ms, vs, vhats):
+            if sparse is not None:
+                self._lazy_updates(p, w, sparse, lr_t, step, m, v[0], vhat[0] if self.amsgrad else None)
+                continue
+            dtype = K.dtype(w)
+            beta_1 = K.cast(self.beta_1, dtype)
+            beta_2 = K.cast(self.beta_2, dtype)
+            m_t = (beta_1 * _cast(m, dtype)) + (1. - beta_1) * g
+            if f:
+                denom = self._factored_denominator(v, vhat, g, beta_2)
             else:
-                denom = (K.sqrt(v_t) + self.epsilon)
+                v, vhat = v[0], vhat[0]
+                v_t = (beta_2 * v) + (1. - beta_2) * K.square(g)
+                if self.amsgrad:
+                    vhat_t = K.maximum(vhat, v_t)
+                    denom = (K.sqrt(vhat_t) + self.epsilon)
+                    self.updates.append(update(vhat, vhat_t))
+                else:
+                    denom = (K.sqrt(v_t) + self.epsilon)
+                self.updates.append(update(v, v_t))
 
-            self.updates.append(K.update(m, m_t))
-            self.updates.append(K.update(v, v_t))
+            self.updates.append(update(m, _cast(m_t, K.dtype(m))))
 
             # Partial momentum adaption.
-            new_p = p - (lr_t * (m_t / (denom ** (self.partial * 2))))
+            new_p = read_master_weight(p, w) - (K.cast(lr_t, dtype) * (m_t / (denom ** (self.partial * 2))))
+
+            # Apply constraints.
+            if getattr(p, 'constraint', None) is not None:
+                new_p = p.constraint(new_p)
+
+            self.updates.append(update(w, new_p))
+            if w is not p:
+                self.updates.append(update(p, K.cast(new_p, K.dtype(p))))
+        return self.updates + self.loss_scaler.get_updates()
+
+    def _factored_denominator(self, v, vhat, g, beta_2):
+        update = self.loss_scaler.update
+        v_row, v_col = v
+        # as in Adafactor, a tiny constant keeps the statistics positive
+        g2 = K.square(g) + 1e-30
+        v_row_t = (beta_2 * v_row) + (1. - beta_2) * K.mean(g2, axis=-1)
+        v_col_t = (beta_2 * v_col) + (1. - beta_2) * K.mean(g2, axis=-2)
+        self.updates.append(update(v_row, v_row_t))
+        self.updates.append(update(v_col, v_col_t))
+        if self.amsgrad:
+            vhat_row, vhat_col = vhat
+            v_row_t = K.maximum(vhat_row, v_row_t)
+            v_col_t = K.maximum(vhat_col, v_col_t)
+            self.updates.append(update(vhat_row, v_row_t))
+            self.updates.append(update(vhat_col, v_col_t))
+
+        # rank one estimate of the second moment from its row and column means
+        v_row_t = v_row_t / K.mean(v_row_t, axis=-1, keepdims=True)
+        v_t = K.expand_dims(v_row_t, -1) * K.expand_dims(v_col_t, -2)
+        return K.sqrt(v_t) + self.epsilon
+
+    def _lazy_updates(self, p, w, sparse, lr_t, step, m, v, vhat):
+        update = self.loss_scaler.scatter_update
+        values, indices = sparse
+        dtype = K.dtype(w)
+        # step at which each row was last updated
+        last_steps = K.zeros((K.int_shape(w)[0],), dtype='int64')
+        self.weights.append(last_steps)
+
+        last = K.gather(last_steps, indices)
+        skipped = K.cast(step - 1 - last, dtype)
+        skipped = K.reshape(skipped, (-1,) + (1,) * (K.ndim(w) - 1))
+        beta_1 = K.cast(self.beta_1, dtype)
+        beta_2 = K.cast(self.beta_2, dtype)
+        m_rows = K.gather(m, indices)
+        m_rows_value = _cast(m_rows, dtype)
+        v_rows = K.gather(v, indices)
+        w_rows = read_master_weight(p, w, indices)
+        # the moments are decayed for the skipped steps, in which the
+        # gradients of the rows were 0, before the update of this step
+        m_t = K.pow(beta_1, skipped + 1.) * m_rows_value + (1. - beta_1) * values
+        v_t = K.pow(beta_2, skipped + 1.) * v_rows + (1. - beta_2) * K.square(values)
+        if vhat is not None:
+            vhat_rows = K.gather(vhat, indices)
+            vhat_t = K.maximum(vhat_rows, v_t)
+            denom = (K.sqrt(vhat_t) + self.epsilon)
+            self.updates.append(update(vhat, indices, vhat_rows, vhat_t))
+        else:
+            denom = (K.sqrt(v_t) + self.epsilon)
+
+        self.updates.append(update(m, indices, m_rows, _cast(m_t, K.dtype(m))))
+        self.updates.append(update(v, indices, v_rows, v_t))
+        self.updates.append(update(last_steps, indices, last, K.ones_like(last) * step))
+
+        # Partial momentum adaption.
+        new_rows = w_rows - (K.cast(lr_t, dtype) * (m_t / (denom ** (self.partial * 2))))
+
+        self.updates.append(update(w, indices, w_rows, new_rows))
+        if w is not p:
+            self.updates.append(update(p, indices, K.gather(p, indices), K.cast(new_rows, K.dtype(p))))
+
+    def _fused_updates(self, params, masters, grads, lr_t):
+        update = self.loss_scaler.update
+        dtype = K.dtype(masters[0])
+        shapes = [K.int_shape(w) for w in masters]
+        size = flat_size(shapes)
+        m = K.zeros((size,), dtype=self.first_moment_dtype or dtype)
+        v = K.zeros((size,), dtype=dtype)
+        slots = [m, v]
+
+        w = flatten([read_master_weight(p, w) for p, w in zip(params, masters)])
+        g = flatten(grads)
+        beta_1 = K.cast(self.beta_1, dtype)
+        beta_2 = K.cast(self.beta_2, dtype)
+        m_t = (beta_1 * _cast(m, dtype)) + (1. - beta_1) * g
+        v_t = (beta_2 * v) + (1. - beta_2) * K.square(g)
+        if self.amsgrad:
+            vhat = K.zeros((size,), dtype=dtype)
+            slots.append(vhat)
+            vhat_t = K.maximum(vhat, v_t)
+            denom = (K.sqrt(vhat_t) + self.epsilon)
+            self.updates.append(update(vhat, vhat_t))
+        else:
+            denom = (K.sqrt(v_t) + self.epsilon)
+
+        self.updates.append(update(m, _cast(m_t, K.dtype(m))))
+        self.updates.append(update(v, v_t))
+
+        # Partial momentum adaption.
+        new_w = w - (K.cast(lr_t, dtype) * (m_t / (denom ** (self.partial * 2))))
 
+        for p, w, new_p in zip(params, masters, split(new_w, shapes)):
             # Apply constraints.
             if getattr(p, 'constraint', None) is not None:
                 new_p = p.constraint(new_p)
 
-            self.updates.append(K.update(p, new_p))
-        return self.updates
+            self.updates.append(update(w, new_p))
+            if w is not p:
+                self.updates.append(update(p, K.cast(new_p, K.dtype(p))))
+        self.weights += slots
 
     def get_config(self):
         config = {'lr': float(K.get_value(self.lr)),
@@ -95,7 +342,12 @@ class Padam(Optimizer):
                   'decay': float(K.get_value(self.decay)),
                   'epsilon': self.epsilon,
                   'amsgrad': self.amsgrad,
-                  'partial': self.partial}
+                  'partial': self.partial,
+                  'loss_scale': self.loss_scaler.loss_scale,
+                  'fused': self.fused,
+                  'lazy': self.lazy,
+                  'factored': self.factored,
+                  'first_moment_dtype': self.first_moment_dtype}
         base_config = super(Padam, self).get_config()
         return dict(list(base_config.items()) + list(config.items()))
 
@@ -3,4 +3,5 @@ from . import image_segmentation
 
 # Globally-importable preprocessing
 from .image_segmentation import SegDirectoryIterator
+from .image_segmentation import SegBucketSequence
 from .image_segmentation import SegDataGenerator
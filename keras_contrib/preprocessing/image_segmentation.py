@@ -3,6 +3,10 @@
     adapted from: https://github.com/aurora95/Keras-FCN
 """
 from keras.preprocessing.image import Iterator
+from keras.preprocessing.image import array_to_img
+from keras.preprocessing.image import img_to_array
+from keras.preprocessing.image import load_img
+from keras.utils import Sequence
 from keras.applications.imagenet_utils import preprocess_input
 from .. import backend as K
 from PIL import Image
@@ -119,7 +123,7 @@ class SegDirectoryIterator(Iterator):
         self.label_dir = label_dir
         self.classes = classes
         self.seg_data_generator = seg_data_generator
-        self.target_size = tuple(target_size)
+        self.target_size = tuple(target_size) if target_size else None
         self.ignore_label = ignore_label
         self.crop_mode = crop_mode
         self.label_cval = label_cval
@@ -310,6 +314,146 @@ class SegDirectoryIterator(Iterator):
             return batch_x
 
 
+class SegBucketSequence(Sequence):
+    '''
+    Batches of natural size images for inference, grouped by size.
+
+    `SegDirectoryIterator` needs a batch size of 1 without `target_size`.
+    Here images are sorted by size and consecutive images are batched together
+    as long as padding them to a shared shape wastes at most `max_pad_ratio`
+    of the batch. Images are padded at the bottom and right with 0 and labels
+    with `label_cval`, so predictions are cropped back with `crop`.
+
+    file_path: location of train.txt, or val.txt in PASCAL VOC2012 format,
+        listing image file path components without extension
+    data_dir: location of image files referred to by file in file_path
+    data_suffix: image file extension, such as `.jpg` or `.png`
+    label_dir: location of label files, or None to only return images
+    label_suffix: label file suffix, such as `.png`, or `.npy`
+    size_multiple: padded sizes are rounded up to a multiple of it, such as
+        the output stride of the model
+    max_pad_ratio: maximum fraction of padded pixels in a batch
+    '''
+
+    def __init__(self, file_path, seg_data_generator,
+                 data_dir, data_suffix,
+                 label_dir=None, label_suffix='.png', classes=None,
+                 ignore_label=255, label_cval=255, color_mode='rgb',
+                 data_format='default', batch_size=32, size_multiple=32,
+                 max_pad_ratio=0.25):
+        if data_format == 'default':
+            data_format = K.image_data_format()
+        if color_mode not in {'rgb', 'grayscale'}:
+            raise ValueError('Invalid color mode:', color_mode,
+                             '; expected "rgb" or "grayscale".')
+        self.seg_data_generator = seg_data_generator
+        self.data_dir = data_dir
+        self.label_dir = label_dir
+        self.classes = classes
+        self.ignore_label = ignore_label
+        self.label_cval = label_cval
+        self.color_mode = color_mode
+        self.data_format = data_format
+        self.size_multiple = size_multiple
+
+        with open(file_path) as fp:
+            lines = [line.strip() for line in fp if line.strip()]
+        self.data_files = [line + data_suffix for line in lines]
+        self.label_files = [line + label_suffix for line in lines]
+        self.label_file_format = 'npy' if label_suffix.endswith('npy') else 'img'
+        # only reads the image headers
+        self.image_sizes = []
+        for data_file in self.data_files:
+            img = Image.open(os.path.join(data_dir, data_file))
+            self.image_sizes.append((img.size[1], img.size[0]))
+            img.close()
+
+        self.batches = []
+        batch = []
+        for j in sorted(range(len(lines)), key=lambda j: self.image_sizes[j]):
+            candidate = batch + [j]
+            rows, cols = self._padded_size(candidate)
+            area = sum(self.image_sizes[i][0] * self.image_sizes[i][1] for i in candidate)
+            if batch and (len(candidate) > batch_size or
+                          1. - area / float(len(candidate) * rows * cols) > max_pad_ratio):
+                self.batches.append(batch)
+                candidate = [j]
+            batch = candidate
+        if batch:
+            self.batches.append(batch)
+
+    def _padded_size(self, index_array):
+        m = self.size_multiple
+        rows = max(self.image_sizes[j][0] for j in index_array)
+        cols = max(self.image_sizes[j][1] for j in index_array)
+        return (-(-rows // m) * m, -(-cols // m) * m)
+
+    def __len__(self):
+        return len(self.batches)
+
+    def __getitem__(self, idx):
+        index_array = self.batches[idx]
+        rows, cols = self._padded_size(index_array)
+        channels = 1 if self.color_mode == 'grayscale' else 3
+        if self.data_format == 'channels_first':
+            image_shape = (channels, rows, cols)
+        else:
+            image_shape = (rows, cols, channels)
+        batch_x = np.zeros((len(index_array),) + image_shape)
+        batch_y = None
+        for i, j in enumerate(index_array):
+            img = load_img(os.path.join(self.data_dir, self.data_files[j]),
+                           grayscale=self.color_mode == 'grayscale')
+            x = img_to_array(img, data_format=self.data_format)
+            x = self._pad(x, rows, cols, 0.)
+            batch_x[i] = self.seg_data_generator.standardize(x)
+
+            if self.label_dir is None:
+                continue
+            label_filepath = os.path.join(self.label_dir, self.label_files[j])
+            if self.label_file_format == 'npy':
+                y = np.load(label_filepath)
+                if y.ndim == 2:
+                    y = np.expand_dims(y, 0 if self.data_format == 'channels_first' else -1)
+            else:
+                y = img_to_array(Image.open(label_filepath),
+                                 data_format=self.data_format).astype(int)
+            y = self._pad(y, rows, cols, self.label_cval)
+            if self.ignore_label:
+                y[np.where(y == self.ignore_label)] = self.classes
+            if batch_y is None:
+                batch_y = np.zeros((len(index_array),) + y.shape, dtype=y.dtype)
+            batch_y[i] = y
+
+        batch_x = preprocess_input(batch_x)
+        if batch_y is None:
+            return batch_x
+        return batch_x, batch_y
+
+    def _pad(self, x, rows, cols, cval):
+        if self.data_format == 'channels_first':
+            pad = ((0, 0), (0, rows - x.shape[1]), (0, cols - x.shape[2]))
+        else:
+            pad = ((0, rows - x.shape[0]), (0, cols - x.shape[1]), (0, 0))
+        return np.lib.pad(x, pad, 'constant', constant_values=cval)
+
+    def crop(self, idx, outputs):
+        """Crops the padded model `outputs` of batch `idx` back to the image sizes.
+
+        # Returns
+            A list of `(image index, output)` tuples.
+        """
+        results = []
+        for j, output in zip(self.batches[idx], outputs):
+            rows, cols = self.image_sizes[j]
+            if self.data_format == 'channels_first':
+                output = output[:, :rows, :cols]
+            else:
+                output = output[:rows, :cols]
+            results.append((j, output))
+        return results
+
+
 class SegDataGenerator(object):
 
     def __init__(self,
@@ -394,6 +538,20 @@ class SegDataGenerator(object):
             save_format=save_format,
             loss_shape=loss_shape)
 
+    def flow_buckets_from_directory(self, file_path, data_dir, data_suffix,
+                                    label_dir=None, label_suffix='.png', classes=None,
+                                    ignore_label=255, color_mode='rgb',
+                                    batch_size=32, size_multiple=32, max_pad_ratio=0.25):
+        """Returns a `SegBucketSequence` of standardized natural size images."""
+        return SegBucketSequence(
+            file_path, self,
+            data_dir=data_dir, data_suffix=data_suffix,
+            label_dir=label_dir, label_suffix=label_suffix,
+            classes=classes, ignore_label=ignore_label,
+            label_cval=self.label_cval, color_mode=color_mode,
+            data_format=self.data_format, batch_size=batch_size,
+            size_multiple=size_multiple, max_pad_ratio=max_pad_ratio)
+
     def standardize(self, x):
         if self.rescale:
             x *= self.rescale
@@ -3,9 +3,12 @@ import pytest
 import numpy as np
 
 from keras.utils import test_utils
+from keras import backend as K
 from keras import optimizers
 from keras.models import Sequential
 from keras.layers.core import Dense, Activation
+from keras.layers.embeddings import Embedding
+from keras.layers.pooling import GlobalAveragePooling1D
 from keras.utils.np_utils import to_categorical
 
 
@@ -41,3 +44,112 @@ def _test_optimizer(optimizer, target=0.75):
     optim = optimizers.deserialize(config)
     new_config = optimizers.serialize(optim)
     assert config == new_config
+
+
+def _single_layer_model(input_dim, output_dim):
+    # the gradients of the weights do not read other weights, which may be
+    # updated first in the same training step
+    model = Sequential()
+    model.add(Dense(output_dim, input_shape=(input_dim,)))
+    model.add(Activation('softmax'))
+    return model
+
+
+def _test_same_updates(optimizer, fused_optimizer, steps=3):
+    """Checks that an optimizer and its fused version compute the same update
+    from the same state.
+
+    The slots of `optimizer` are set by a few steps, and copied to the flat
+    buffers of `fused_optimizer`, which hold the slots of all the parameters."""
+    x_train, y_train = get_test_data()
+    model = _single_layer_model(x_train.shape[1], y_train.shape[1])
+    fused_model = _single_layer_model(x_train.shape[1], y_train.shape[1])
+    model.compile(loss='categorical_crossentropy', optimizer=optimizer)
+    fused_model.compile(loss='categorical_crossentropy', optimizer=fused_optimizer)
+    fused_model._make_train_function()
+    for i in range(steps):
+        batch = slice(16 * i, 16 * (i + 1))
+        model.train_on_batch(x_train[batch], y_train[batch])
+    fused_model.set_weights(model.get_weights())
+
+    def fused_values():
+        # the iterations, then the slots of each kind for all the parameters
+        values = optimizer.get_weights()
+        num_params = len(model.trainable_weights)
+        slots = [values[i:i + num_params] for i in range(1, len(values), num_params)]
+        values = [values[0]] + [np.concatenate([s.ravel() for s in kind]) for kind in slots]
+        return values[:len(fused_optimizer.weights)]
+
+    fused_optimizer.set_weights(fused_values())
+    batch = slice(16 * steps, 16 * (steps + 1))
+    model.train_on_batch(x_train[batch], y_train[batch])
+    fused_model.train_on_batch(x_train[batch], y_train[batch])
+    for w, fused_w in zip(model.get_weights(), fused_model.get_weights()):
+        np.testing.assert_allclose(w, fused_w, rtol=1e-5, atol=1e-6)
+    for w, fused_w in zip(fused_values(), fused_optimizer.get_weights()):
+        np.testing.assert_allclose(w, fused_w, rtol=1e-5, atol=1e-6)
+
+
+def _lazy_model():
+    # the gradients of the embeddings do not read other weights, which may be
+    # updated first in the same training step
+    model = Sequential()
+    model.add(Embedding(10, 2, input_length=10))
+    model.add(GlobalAveragePooling1D())
+    model.add(Activation('softmax'))
+    return model
+
+
+def _test_lazy_updates(optimizer, lazy_optimizer, steps=3):
+    """Checks that a lazy optimizer computes the same update as the dense
+    optimizer, from the same state, when every row is used."""
+    np.random.seed(1337)
+    x_train = np.array([np.random.permutation(10) for _ in range(16 * (steps + 1))])
+    y_train = to_categorical(np.random.randint(0, 2, len(x_train)))
+    model = _lazy_model()
+    lazy_model = _lazy_model()
+    model.compile(loss='categorical_crossentropy', optimizer=optimizer)
+    lazy_model.compile(loss='categorical_crossentropy', optimizer=lazy_optimizer)
+    lazy_model._make_train_function()
+
+    # the slots of the dense optimizer are set by a few steps, and copied to
+    # the lazy optimizer, whose rows were all last updated at the last step
+    for i in range(steps):
+        batch = slice(16 * i, 16 * (i + 1))
+        model.train_on_batch(x_train[batch], y_train[batch])
+    lazy_model.set_weights(model.get_weights())
+    values = optimizer.get_weights()
+    lazy_weights = lazy_optimizer.weights
+    lazy_values = [np.reshape(value, K.int_shape(w)) for value, w in zip(values, lazy_weights)]
+    lazy_values += [np.full(K.int_shape(w), values[0]) for w in lazy_weights[len(values):]]
+    lazy_optimizer.set_weights(lazy_values)
+
+    batch = slice(16 * steps, 16 * (steps + 1))
+    model.train_on_batch(x_train[batch], y_train[batch])
+    lazy_model.train_on_batch(x_train[batch], y_train[batch])
+    for w, lazy_w in zip(model.get_weights(), lazy_model.get_weights()):
+        np.testing.assert_allclose(w, lazy_w, rtol=1e-5, atol=1e-6)
+
+
+def _train_lazy_catch_up(optimizer, skipped_steps=3):
+    """Trains an embedding model whose rows 5 to 9 are left out of
+    `skipped_steps` batches, then are in a batch with zero gradients.
+
+    Returns the embeddings and the optimizer weights after the first step,
+    and the optimizer weights after the last step."""
+    np.random.seed(1337)
+    model = _lazy_model()
+    model.compile(loss='categorical_crossentropy', optimizer=optimizer)
+    y = to_categorical(np.random.randint(0, 2, 16), 2)
+    model.train_on_batch(np.array([np.random.permutation(10) for _ in range(16)]), y)
+    embeddings = model.get_weights()[0]
+    first_weights = optimizer.get_weights()
+    for _ in range(skipped_steps):
+        model.train_on_batch(np.random.randint(0, 5, (16, 10)), y)
+    # the rows 5 to 9 are in all the samples but the first, whose weight is 0
+    x = np.array([np.random.permutation(np.arange(5, 10).repeat(2)) for _ in range(16)])
+    x[0] = np.random.permutation(np.arange(5).repeat(2))
+    sample_weight = np.zeros(16)
+    sample_weight[0] = 1.
+    model.train_on_batch(x, y, sample_weight=sample_weight)
+    return embeddings, first_weights, optimizer.get_weights()
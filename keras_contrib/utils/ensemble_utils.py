@@ -0,0 +1,109 @@
+""" Inference with the snapshot ensembles of `SnapshotCallbackBuilder`. """
+from __future__ import print_function
+
+import glob
+import re
+
+import six
+from keras import backend as K
+from keras.layers import Input
+from keras.layers import average
+from keras.models import Model
+from keras.models import clone_model
+
+
+def _natural_key(filepath):
+    # `Model-10.h5` comes after `Model-9.h5`
+    return [int(s) if s.isdigit() else s for s in re.split(r'(\d+)', filepath)]
+
+
+class SnapshotEnsemble(object):
+    """Averages the predictions of the snapshots of a model.
+
+    The weights of all the snapshots are loaded once. With `mode='batched'`,
+    the members are copies of the model combined in a single model sharing
+    its inputs, so each batch is evaluated by all the members in one forward
+    pass, at the cost of keeping all the weights on the device. With
+    `mode='swap'`, a single copy of the model is kept on the device and the
+    weights of the members, kept in host memory, are swapped in turn, each
+    member predicting all the inputs before the next one.
+
+    # Arguments
+        model: a model of the architecture of the snapshots. It is copied,
+            its own weights are left unchanged.
+        filepaths: list of weight files saved by `model.save_weights`, such
+            as those of `SnapshotModelCheckpoint`, or a glob pattern such as
+            `'weights/Model-[0-9]*.h5'`, sorted by snapshot number.
+        mode: `'batched'` or `'swap'`.
+
+    # Raises
+        ValueError: if `mode` is unknown or there are no weight files.
+
+    # Example
+        ```python
+            builder = SnapshotCallbackBuilder(nb_epochs=200, nb_snapshots=5)
+            model.fit(x_train, y_train, epochs=200,
+                      callbacks=builder.get_callbacks(model_prefix='Model'))
+            ensemble = SnapshotEnsemble(model, 'weights/Model-[0-9]*.h5')
+            y_pred = ensemble.predict(x_test, batch_size=64)
+        ```
+    """
+
+    def __init__(self, model, filepaths, mode='batched'):
+        if mode not in ['batched', 'swap']:
+            raise ValueError('`mode` must be "batched" or "swap", got: ' + str(mode))
+        if isinstance(filepaths, six.string_types):
+            filepaths = sorted(glob.glob(filepaths), key=_natural_key)
+        if not filepaths:
+            raise ValueError('`SnapshotEnsemble` requires at least one weight file.')
+        self.filepaths = list(filepaths)
+        self.mode = mode
+
+        runner = clone_model(model)
+        self.member_weights = []
+        for filepath in self.filepaths:
+            runner.load_weights(filepath)
+            self.member_weights.append(runner.get_weights())
+
+        if mode == 'swap':
+            self.model = runner
+            return
+        inputs = [Input(batch_shape=K.int_shape(x), dtype=K.dtype(x)) for x in model.inputs]
+        members = []
+        for i, weights in enumerate(self.member_weights):
+            member = runner if i == 0 else clone_model(model)
+            member.name = '%s_snapshot_%d' % (model.name, i)
+            member.set_weights(weights)
+            outputs = member(inputs if len(inputs) > 1 else inputs[0])
+            members.append(outputs if isinstance(outputs, list) else [outputs])
+        if len(members) == 1:
+            outputs = members[0]
+        else:
+            outputs = [average(list(member_outputs)) for member_outputs in zip(*members)]
+        self.model = Model(inputs, outputs if len(outputs) > 1 else outputs[0])
+        # the weights are held by the combined model
+        self.member_weights = None
+
+    def predict(self, x, batch_size=32, verbose=0):
+        """Returns the mean of the predictions of the members for `x`.
+
+        # Arguments
+            x: input data, as for `model.predict`.
+            batch_size: number of samples per batch.
+            verbose: verbosity mode, 0 or 1.
+
+        # Returns
+            Numpy array(s) of predictions.
+        """
+        if self.mode == 'batched':
+            return self.model.predict(x, batch_size=batch_size, verbose=verbose)
+        total = None
+        for weights in self.member_weights:
+            self.model.set_weights(weights)
+            y = self.model.predict(x, batch_size=batch_size, verbose=verbose)
+            if total is None:
+                total = y if isinstance(y, list) else [y]
+            else:
+                total = [t + y_i for t, y_i in zip(total, y if isinstance(y, list) else [y])]
+        outputs = [t / float(len(self.member_weights)) for t in total]
+        return outputs if len(outputs) > 1 else outputs[0]
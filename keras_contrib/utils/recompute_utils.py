@@ -0,0 +1,183 @@
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import six
+from keras import backend as K
+from keras.engine import InputLayer
+from keras.layers import Add
+from keras.layers import Concatenate
+from keras.optimizers import clip_norm
+
+from keras_contrib import backend as KC
+
+
+def select_checkpoint_layers(model, segments=None, layer_types=(Add, Concatenate)):
+    """Picks the layers of `model` whose outputs are kept in memory during training.
+
+    The outputs of the merge layers closing a block (the `add` of a
+    `_residual_block`, the `concatenate` of a NASNet cell) are natural segment
+    boundaries, since everything inside the block only depends on them.
+
+    # Arguments
+        model: Keras model instance.
+        segments: number of checkpoints to keep, evenly spaced among the
+            candidates. Defaults to every candidate layer.
+        layer_types: tuple of layer classes that are candidate checkpoints.
+
+    # Returns
+        A list of layers, in topological order.
+    """
+    candidates = [layer for layer in model.layers
+                  if isinstance(layer, layer_types) and layer.name not in model.output_names]
+    if segments is None or segments >= len(candidates):
+        return candidates
+    if segments < 1:
+        return []
+    step = len(candidates) / segments
+    return [candidates[int((i + 1) * step) - 1] for i in range(segments)]
+
+
+def _get_checkpoint_layers(model, checkpoints):
+    layers = []
+    for checkpoint in checkpoints:
+        if isinstance(checkpoint, six.string_types):
+            checkpoint = model.get_layer(checkpoint)
+        layers.append(checkpoint)
+    return layers
+
+
+def _output_bytes(layer, batch_size):
+    shape = layer.output_shape
+    if isinstance(shape, list):
+        shapes = shape
+    else:
+        shapes = [shape]
+    itemsize = np.dtype(K.floatx()).itemsize
+    return sum(batch_size * itemsize * np.prod([d or 1 for d in s[1:]], dtype='int64')
+               for s in shapes)
+
+
+def checkpointing_report(model, checkpoints, batch_size=1):
+    """Estimates the memory/time trade-off of checkpointing `model`.
+
+    The size of the activations is estimated from the layer output shapes,
+    `None` dimensions count as 1, so the model should have a fixed input shape.
+    Recomputing a fraction `r` of the forward pass costs roughly `r / 3` of a
+    training step, since the backward pass is about twice as expensive as the
+    forward pass.
+
+    # Arguments
+        model: Keras model instance.
+        checkpoints: list of layers (or layer names) whose outputs are kept.
+        batch_size: batch size used for the byte counts.
+
+    # Returns
+        A dict with the following entries:
+            - `segments`: number of recomputed segments.
+            - `activation_bytes`: activations stored without checkpointing.
+            - `checkpointed_bytes`: peak activations stored with checkpointing,
+                the checkpoints plus the largest segment.
+            - `memory_ratio`: `checkpointed_bytes / activation_bytes`.
+            - `recompute_ratio`: fraction of the forward pass recomputed.
+            - `step_overhead`: estimated relative increase of the step time.
+    """
+    checkpoints = set(_get_checkpoint_layers(model, checkpoints))
+    total = 0
+    kept = 0
+    segment = 0
+    largest_segment = 0
+    recomputed = 0
+    for layer in model.layers:
+        if isinstance(layer, InputLayer):
+            continue
+        size = _output_bytes(layer, batch_size)
+        total += size
+        segment += size
+        if layer in checkpoints:
+            kept += size
+            recomputed += segment
+            largest_segment = max(largest_segment, segment)
+            segment = 0
+    # the layers after the last checkpoint are differentiated as usual
+    largest_segment = max(largest_segment, segment)
+    checkpointed = kept + largest_segment
+    return {'segments': len(checkpoints),
+            'activation_bytes': int(total),
+            'checkpointed_bytes': int(checkpointed),
+            'memory_ratio': checkpointed / max(total, 1),
+            'recompute_ratio': recomputed / max(total, 1),
+            'step_overhead': recomputed / max(total, 1) / 3.}
+
+
+def print_checkpointing_report(report):
+    """Prints a report returned by `checkpointing_report`."""
+    print('Gradient checkpointing with %d segments:' % report['segments'])
+    print('  activations: %.1f MB -> %.1f MB (%.0f%%)' % (
+        report['activation_bytes'] / 2. ** 20,
+        report['checkpointed_bytes'] / 2. ** 20,
+        100 * report['memory_ratio']))
+    print('  recomputed forward pass: %.0f%%, estimated step overhead: %.0f%%' % (
+        100 * report['recompute_ratio'], 100 * report['step_overhead']))
+
+
+def enable_gradient_checkpointing(model, checkpoints=None, segments=None,
+                                  batch_size=1, verbose=0):
+    """Makes a compiled `model` recompute its activations during the backward pass.
+
+    Only the outputs of the `checkpoints` layers are kept in memory after the
+    forward pass, the activations between two checkpoints are recomputed when
+    their gradients are needed. This trades roughly one extra forward pass for
+    a memory footprint close to the checkpoints plus a single segment, which
+    allows larger batch sizes or resolutions with deep models such as
+    `ResNet152`, `NASNetLarge` or `AtrousFCN_Resnet50_16s`.
+
+    Must be called after `compile` and before training. Only the TensorFlow
+    backend recomputes activations, other backends train as usual.
+
+    # Arguments
+        model: compiled Keras model instance.
+        checkpoints: list of layers (or layer names) whose outputs are kept.
+            Defaults to `select_checkpoint_layers(model, segments)`.
+        segments: number of checkpoints, used when `checkpoints` is None.
+        batch_size: batch size used for the memory estimates of the report.
+        verbose: if 1, prints the report.
+
+    # Returns
+        The dict returned by `checkpointing_report`.
+
+    # Raises
+        ValueError: if the model is not compiled.
+    """
+    if getattr(model, 'optimizer', None) is None:
+        raise ValueError('`enable_gradient_checkpointing` requires '
+                         'a compiled model.')
+    if checkpoints is None:
+        checkpoints = select_checkpoint_layers(model, segments)
+    checkpoints = _get_checkpoint_layers(model, checkpoints)
+    tensors = [layer.output for layer in checkpoints]
+    optimizer = model.optimizer
+
+    def get_gradients(loss, params):
+        grads = KC.gradients_with_checkpoints(loss, params, tensors)
+        if None in grads:
+            raise ValueError('An operation has `None` for gradient. '
+                             'Please make sure that all of your ops have a '
+                             'gradient defined (i.e. are differentiable). '
+                             'Common ops without gradient: '
+                             'K.argmax, K.round, K.eval.')
+        if hasattr(optimizer, 'clipnorm') and optimizer.clipnorm > 0:
+            norm = K.sqrt(sum([K.sum(K.square(g)) for g in grads]))
+            grads = [clip_norm(g, optimizer.clipnorm, norm) for g in grads]
+        if hasattr(optimizer, 'clipvalue') and optimizer.clipvalue > 0:
+            grads = [K.clip(g, -optimizer.clipvalue, optimizer.clipvalue) for g in grads]
+        return grads
+
+    optimizer.get_gradients = get_gradients
+    # the training function is built lazily and picks up the new gradients
+    model.train_function = None
+
+    report = checkpointing_report(model, checkpoints, batch_size)
+    if verbose:
+        print_checkpointing_report(report)
+    return report
@@ -1,12 +1,29 @@
+from __future__ import print_function
+
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
 import warnings
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 import h5py
+import keras
 import keras.backend as K
 from keras import optimizers
 from keras.engine import saving
+from six.moves import queue
+import numpy as np
+
+# atomic on POSIX, and on Windows with python 3
+_replace = getattr(os, 'replace', os.rename)
 
 
-def save_all_weights(model, filepath, include_optimizer=True):
+def save_all_weights(model, filepath, include_optimizer=True, compression=None,
+                     optimizer_quantization=None, block_size=256):
     """
     Save model weights and optimizer weights but not configuration to a HDF5 file.
     Functionally between `save` and `save_weights`.
@@ -15,20 +32,41 @@ def save_all_weights(model, filepath, include_optimizer=True):
         - the model's weights
         - the model's optimizer's state (if any)
     If you have a complicated model or set of models that do not serialize to JSON correctly, use this method.
+
+    The optimizer slots, such as the moments of `Padam` or `FTML`, can be
+    stored with a lossy quantization, which `load_all_weights` reverts. The
+    iterations, the integer step counters, the float32 master copies of
+    float16 weights and the slots listed in the `exact_weights` of the
+    optimizer, such as the `z` and `d` of `FTML`, are always stored exactly. Non-negative slots, such as
+    second moments, are quantized in log space, so that their small values,
+    the denominators of the updates, keep a bounded relative error.
     # Arguments
         model: Keras model instance to be saved.
         filepath: String, path where to save the model.
         include_optimizer: If True, save optimizer's state together.
+        compression: None, `'gzip'` or `'lzf'`, lossless compression of the
+            (chunked) datasets.
+        optimizer_quantization: None, `'float16'`, or `'uint8'` for a linear
+            quantization to 8 bits over blocks of `block_size` values, each
+            with its own offset and scale.
+        block_size: number of values per quantization block.
     # Raises
         ImportError: if h5py is not available.
+        ValueError: if `optimizer_quantization` is unknown.
     """
     if h5py is None:
         raise ImportError('`save_all_weights` requires h5py.')
+    if optimizer_quantization not in {None, 'float16', 'uint8'}:
+        raise ValueError('`optimizer_quantization` must be None, "float16" or "uint8", '
+                         'got: ' + str(optimizer_quantization))
 
     with h5py.File(filepath, 'w') as f:
         model_weights_group = f.create_group('model_weights')
-        model_layers = model.layers
-        saving.save_weights_to_hdf5_group(model_weights_group, model_layers)
+        if compression is None:
+            model_layers = model.layers
+            saving.save_weights_to_hdf5_group(model_weights_group, model_layers)
+        else:
+            _save_snapshot_to_group(model_weights_group, snapshot_weights(model), compression)
 
         if include_optimizer and hasattr(model, 'optimizer') and model.optimizer:
             if isinstance(model.optimizer, optimizers.TFOptimizer):
@@ -63,16 +101,97 @@ def save_all_weights(model, filepath, include_optimizer=True):
                                 name = 'param_' + str(i)
                         weight_names.append(name.encode('utf8'))
                     optimizer_weights_group.attrs['weight_names'] = weight_names
-                    for name, val in zip(weight_names, weight_values):
-                        param_dset = optimizer_weights_group.create_dataset(
-                            name,
-                            val.shape,
-                            dtype=val.dtype)
-                        if not val.shape:
-                            # scalar
-                            param_dset[()] = val
+                    # the master weights are the parameters themselves, the
+                    # iterations count the steps of the bias corrections, and
+                    # the `exact_weights` of an optimizer, such as the `z` and
+                    # `d` of `FTML`, determine its parameters
+                    exact = set(id(w) for w in getattr(model.optimizer, 'master_weights', []))
+                    optimizer = model.optimizer
+                    while optimizer is not None:
+                        if hasattr(optimizer, 'iterations'):
+                            exact.add(id(optimizer.iterations))
+                        exact.update(id(w) for w in getattr(optimizer, 'exact_weights', []))
+                        # the optimizer wrapped by `GradientAccumulation`
+                        optimizer = getattr(optimizer, 'optimizer', None)
+                    for w, name, val in zip(symbolic_weights, weight_names, weight_values):
+                        if (optimizer_quantization is not None and id(w) not in exact and
+                                val.size and np.issubdtype(val.dtype, np.floating)):
+                            _save_quantized(optimizer_weights_group, name, val,
+                                            optimizer_quantization, block_size, compression)
                         else:
-                            param_dset[:] = val
+                            _create_dataset(optimizer_weights_group, name, val, compression)
+
+
+def _create_dataset(group, name, val, compression=None):
+    if not val.shape:
+        # scalar, can not be chunked
+        param_dset = group.create_dataset(name, val.shape, dtype=val.dtype)
+        param_dset[()] = val
+    else:
+        group.create_dataset(name, data=val, compression=compression)
+
+
+def _save_quantized(group, name, val, quantization, block_size, compression):
+    # 0 is stored as log(0) = -inf
+    log_space = bool(np.all(val >= 0))
+    if log_space:
+        with np.errstate(divide='ignore'):
+            val_q = np.log(val.astype('float32'))
+    else:
+        val_q = val.astype('float32')
+    if quantization == 'float16':
+        param_dset = group.create_dataset(name, data=val_q.astype('float16'), compression=compression)
+        param_dset.attrs['quantization'] = quantization
+        param_dset.attrs['dtype'] = val.dtype.str
+        param_dset.attrs['log_space'] = log_space
+        return
+    flat = val_q.ravel()
+    blocks = -(-flat.size // block_size)
+    flat = np.pad(flat, (0, blocks * block_size - flat.size), 'edge').reshape((blocks, block_size))
+    finite = np.isfinite(flat)
+    # the code 0 is reserved for the zeros of log space values
+    levels = 254. if log_space else 255.
+    offset = np.where(finite, flat, np.inf).min(axis=1)
+    offset[~np.isfinite(offset)] = 0.
+    scale = (np.where(finite, flat, -np.inf).max(axis=1) - offset) / levels
+    scale[~(scale > 0)] = 1.
+    codes = np.round((np.where(finite, flat, offset[:, None]) - offset[:, None]) / scale[:, None])
+    if log_space:
+        codes = np.where(finite, codes + 1, 0)
+    codes = codes.astype('uint8')
+    g = group.create_group(name)
+    g.attrs['quantization'] = quantization
+    g.attrs['dtype'] = val.dtype.str
+    g.attrs['shape'] = val.shape
+    g.attrs['log_space'] = log_space
+    g.create_dataset('codes', data=codes, compression=compression)
+    g.create_dataset('offset', data=offset)
+    g.create_dataset('scale', data=scale)
+
+
+def _load_optimizer_weight(obj):
+    """Reads an optimizer weight saved by `save_all_weights`, reverting its quantization."""
+    quantization = obj.attrs.get('quantization')
+    if quantization is None:
+        return obj[()]
+    if isinstance(quantization, bytes):
+        quantization = quantization.decode('utf8')
+    dtype = obj.attrs['dtype']
+    log_space = bool(obj.attrs.get('log_space', False))
+    if quantization == 'float16':
+        val = obj[()].astype('float32')
+    else:
+        codes = obj['codes'][()].astype('float32')
+        if log_space:
+            flat = (codes - 1.) * obj['scale'][()][:, None] + obj['offset'][()][:, None]
+            flat[codes == 0] = -np.inf
+        else:
+            flat = codes * obj['scale'][()][:, None] + obj['offset'][()][:, None]
+        shape = tuple(obj.attrs['shape'])
+        val = flat.ravel()[:int(np.prod(shape))].reshape(shape)
+    if log_space:
+        val = np.exp(val)
+    return val.astype(dtype)
 
 
 def load_all_weights(model, filepath, include_optimizer=True):
@@ -99,6 +218,557 @@ def load_all_weights(model, filepath, include_optimizer=True):
             optimizer_weights_group = f['optimizer_weights']
             optimizer_weight_names = [n.decode('utf8') for n in
                                       optimizer_weights_group.attrs['weight_names']]
-            optimizer_weight_values = [optimizer_weights_group[n] for n in
+            optimizer_weight_values = [_load_optimizer_weight(optimizer_weights_group[n]) for n in
                                        optimizer_weight_names]
             model.optimizer.set_weights(optimizer_weight_values)
+
+
+def snapshot_weights(model):
+    """Copies the weights of a model to host memory in a single batched call.
+
+    # Arguments
+        model: Keras model instance.
+
+    # Returns
+        A list of `(layer name, weight names, weight values)` tuples, in the
+        layout of `model.save_weights`.
+    """
+    symbolic_weights = [w for layer in model.layers for w in layer.weights]
+    weight_values = K.batch_get_value(symbolic_weights)
+    snapshot = []
+    start = 0
+    for layer in model.layers:
+        weight_names = []
+        for i, w in enumerate(layer.weights):
+            if hasattr(w, 'name') and w.name:
+                weight_names.append(str(w.name))
+            else:
+                weight_names.append('param_' + str(i))
+        snapshot.append((layer.name, weight_names, weight_values[start:start + len(weight_names)]))
+        start += len(weight_names)
+    return snapshot
+
+
+def save_weights_snapshot(snapshot, filepath):
+    """Writes a `snapshot_weights` snapshot in the format of `model.save_weights`.
+
+    The weights are written to a temporary file which is then renamed to
+    `filepath`, so readers never see a partially written file.
+
+    # Arguments
+        snapshot: list returned by `snapshot_weights`.
+        filepath: String, path of the weights file.
+    """
+    tmp_filepath = filepath + '.tmp'
+    with h5py.File(tmp_filepath, 'w') as f:
+        _save_snapshot_to_group(f, snapshot)
+    _replace(tmp_filepath, filepath)
+
+
+def _save_snapshot_to_group(f, snapshot, compression=None):
+    saving.save_attributes_to_hdf5_group(
+        f, 'layer_names', [name.encode('utf8') for name, _, _ in snapshot])
+    f.attrs['backend'] = K.backend().encode('utf8')
+    f.attrs['keras_version'] = str(keras.__version__).encode('utf8')
+    for layer_name, weight_names, weight_values in snapshot:
+        g = f.create_group(layer_name)
+        weight_names = [name.encode('utf8') for name in weight_names]
+        saving.save_attributes_to_hdf5_group(g, 'weight_names', weight_names)
+        for name, val in zip(weight_names, weight_values):
+            _create_dataset(g, name, val, compression)
+
+
+class AsyncWeightsWriter(object):
+    """Saves model weights on a background thread.
+
+    `save` copies the weights to host memory and returns, the files are
+    written by a background thread in the format of `model.save_weights`.
+    At most `max_pending` snapshots wait to be written, `save` blocks when
+    the queue is full so that memory use stays bounded.
+
+    # Arguments
+        max_pending: maximum number of snapshots waiting to be written.
+
+    # Raises
+        Errors of the background thread are raised by the next call to
+        `save`, `wait` or `close`.
+    """
+
+    def __init__(self, max_pending=2):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                save_weights_snapshot(*item)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def save(self, model, filepath):
+        """Snapshots the weights of `model` and queues them to be written to `filepath`."""
+        self._raise_error()
+        if not self.thread.is_alive():
+            raise ValueError('`save` called on a closed `AsyncWeightsWriter`.')
+        self.queue.put((snapshot_weights(model), filepath))
+
+    def wait(self):
+        """Blocks until all the queued snapshots are written."""
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Writes the queued snapshots and stops the background thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self._raise_error()
+
+
+def _optimizer_weights(model):
+    if not getattr(model, 'optimizer', None) or isinstance(model.optimizer, optimizers.TFOptimizer):
+        return []
+    if not model.optimizer.weights and hasattr(model, '_make_train_function'):
+        # the slots are created with the training function, as in `load_model`
+        model._make_train_function()
+    return getattr(model.optimizer, 'weights')
+
+
+def _hash_weight(value):
+    value = np.ascontiguousarray(value)
+    digest = hashlib.sha1(str((value.dtype.str, value.shape)).encode('utf8'))
+    digest.update(value.tobytes())
+    return digest.hexdigest()
+
+
+def _incremental_manifests(dirpath):
+    return sorted(glob.glob(os.path.join(dirpath, 'manifest-*.json')))
+
+
+def save_incremental_weights(model, dirpath, include_optimizer=True):
+    """Saves model and optimizer weights, only writing the tensors that changed.
+
+    Each weight tensor is identified by the hash of its content. A checkpoint
+    is a `manifest-NNNNN.json` file listing the hash and the chunk file holding
+    each tensor. Tensors whose hash is already referenced by the previous
+    manifest are not written again, the others are written to a new
+    `chunk-NNNNN.h5` file. With frozen layers, or a model fine tuned for a few
+    steps between checkpoints, only a fraction of the weights is written.
+
+    Files are written under a temporary name and renamed, the manifest last,
+    so an interrupted save leaves the previous checkpoints usable.
+
+    # Arguments
+        model: Keras model instance to be saved.
+        dirpath: String, directory of the checkpoints, created if needed.
+        include_optimizer: If True, save optimizer's state together.
+
+    # Returns
+        The path of the manifest of the new checkpoint.
+    """
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath)
+    manifests = _incremental_manifests(dirpath)
+    known = {}
+    checkpoint = 0
+    if manifests:
+        with open(manifests[-1]) as f:
+            previous = json.load(f)
+        checkpoint = previous['checkpoint'] + 1
+        for entry in previous['model_weights'] + previous['optimizer_weights']:
+            known[entry['hash']] = entry['chunk']
+
+    model_weights = [(layer.name, w) for layer in model.layers for w in layer.weights]
+    optimizer_weights = _optimizer_weights(model) if include_optimizer else []
+    values = K.batch_get_value([w for _, w in model_weights] + optimizer_weights)
+    chunk = 'chunk-%05d.h5' % checkpoint
+
+    manifest = {'checkpoint': checkpoint, 'model_weights': [], 'optimizer_weights': []}
+    new_values = {}
+    for i, value in enumerate(values):
+        digest = _hash_weight(value)
+        if digest not in known:
+            known[digest] = chunk
+            new_values[digest] = value
+        entry = {'hash': digest, 'chunk': known[digest], 'shape': list(np.shape(value))}
+        if i < len(model_weights):
+            entry['layer'] = model_weights[i][0]
+            entry['name'] = str(model_weights[i][1].name)
+            manifest['model_weights'].append(entry)
+        else:
+            entry['name'] = str(getattr(optimizer_weights[i - len(model_weights)], 'name', ''))
+            manifest['optimizer_weights'].append(entry)
+
+    if new_values:
+        chunk_path = os.path.join(dirpath, chunk)
+        with h5py.File(chunk_path + '.tmp', 'w') as f:
+            for digest, value in new_values.items():
+                f.create_dataset(digest, data=value)
+        _replace(chunk_path + '.tmp', chunk_path)
+    manifest_path = os.path.join(dirpath, 'manifest-%05d.json' % checkpoint)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    _replace(manifest_path + '.tmp', manifest_path)
+    return manifest_path
+
+
+def load_incremental_weights(model, dirpath, checkpoint=None, include_optimizer=True):
+    """Loads the weights of a model saved via `save_incremental_weights`.
+
+    # Arguments
+        model: instantiated model with architecture matching the saved model.
+            Compile the model beforehand if you want to load optimizer weights,
+            its training function is built if it has not been trained yet.
+        dirpath: String, directory of the checkpoints.
+        checkpoint: int, index of the checkpoint to load, defaults to the last.
+        include_optimizer: If True, load optimizer's state together.
+
+    # Returns
+        None. The model will have its weights updated.
+
+    # Raises
+        ValueError: if there is no such checkpoint, or the saved weights do
+            not match the model.
+    """
+    manifests = _incremental_manifests(dirpath)
+    if checkpoint is not None:
+        manifests = [m for m in manifests if m.endswith('manifest-%05d.json' % checkpoint)]
+    if not manifests:
+        raise ValueError('No incremental checkpoint found in ' + dirpath)
+    with open(manifests[-1]) as f:
+        manifest = json.load(f)
+
+    entries = manifest['model_weights']
+    symbolic_weights = [w for layer in model.layers for w in layer.weights]
+    layer_names = [layer.name for layer in model.layers for _ in layer.weights]
+    if [e['layer'] for e in entries] != layer_names:
+        raise ValueError('The checkpoint does not match the layers of the model, '
+                         'it contains weights for ' + str(len(entries)) + ' tensors, '
+                         'the model has ' + str(len(symbolic_weights)) + '.')
+    optimizer_weights = _optimizer_weights(model) if include_optimizer else []
+    if optimizer_weights and manifest['optimizer_weights']:
+        if len(optimizer_weights) != len(manifest['optimizer_weights']):
+            raise ValueError('The checkpoint does not match the optimizer of the model.')
+        entries = entries + manifest['optimizer_weights']
+        symbolic_weights = symbolic_weights + optimizer_weights
+
+    # reads each chunk file once
+    by_chunk = {}
+    for entry in entries:
+        by_chunk.setdefault(entry['chunk'], set()).add(entry['hash'])
+    values = {}
+    for chunk, digests in by_chunk.items():
+        with h5py.File(os.path.join(dirpath, chunk), mode='r') as f:
+            for digest in digests:
+                values[digest] = f[digest][()]
+
+    weight_value_tuples = []
+    for w, entry in zip(symbolic_weights, entries):
+        value = values[entry['hash']]
+        if K.int_shape(w) != value.shape:
+            raise ValueError('Weight ' + str(getattr(w, 'name', '')) + ' has shape ' +
+                             str(K.int_shape(w)) + ', the saved weight has shape ' +
+                             str(value.shape) + '.')
+        weight_value_tuples.append((w, value))
+    K.batch_set_value(weight_value_tuples)
+
+
+def _read_dataset(filepath, dset):
+    """Reads `dset`, memory mapping the file when its layout is contiguous."""
+    offset = dset.id.get_offset() if dset.chunks is None and dset.compression is None else None
+    if offset is None or not dset.shape:
+        # chunked, compressed or scalar datasets are read through h5py
+        return dset[()]
+    value = np.empty(dset.shape, dtype=dset.dtype)
+    value[...] = np.memmap(filepath, dtype=dset.dtype, mode='r', offset=offset, shape=dset.shape)
+    return value
+
+
+def load_weights_parallel(model, filepath, include_optimizer=True, workers=8, verbose=0):
+    """Loads the weights of a model with parallel reads and a single assignment.
+
+    Reads weight files written by `save_weights`, `save_all_weights` or
+    `save_model`. The layers are read by a pool of `workers` threads,
+    uncompressed contiguous datasets, the default layout of Keras weight files,
+    being memory mapped so that the reads do not hold the h5py lock. All the
+    weights are then assigned with a single `K.batch_set_value` call.
+
+    # Arguments
+        model: instantiated model with architecture matching the saved model.
+            Compile the model beforehand if you want to load optimizer weights.
+        filepath: String, path to the saved weights.
+        include_optimizer: If True, load optimizer's state if present.
+        workers: number of reading threads.
+        verbose: if 1, prints the load time of each layer.
+
+    # Returns
+        An `OrderedDict` of the read time of each layer, in seconds, with the
+        time of the assignment under `'batch_set_value'`.
+
+    # Raises
+        ValueError: in case of mismatch between the model and the weight file.
+    """
+    layers = [layer for layer in model.layers if layer.weights]
+    timings = OrderedDict()
+    with h5py.File(filepath, mode='r') as f:
+        g = f['model_weights'] if 'model_weights' in f else f
+        if 'keras_version' in g.attrs:
+            original_keras_version = g.attrs['keras_version'].decode('utf8')
+        else:
+            original_keras_version = '1'
+        if 'backend' in g.attrs:
+            original_backend = g.attrs['backend'].decode('utf8')
+        else:
+            original_backend = None
+        layer_names = [name for name in saving.load_attributes_from_hdf5_group(g, 'layer_names')
+                       if saving.load_attributes_from_hdf5_group(g[name], 'weight_names')]
+        if len(layer_names) != len(layers):
+            raise ValueError('You are trying to load a weight file '
+                             'containing ' + str(len(layer_names)) +
+                             ' layers into a model with ' +
+                             str(len(layers)) + ' layers.')
+        datasets = [[g[name][weight_name] for weight_name in
+                     saving.load_attributes_from_hdf5_group(g[name], 'weight_names')]
+                    for name in layer_names]
+
+        def read_layer(k):
+            start = time.time()
+            values = [_read_dataset(filepath, dset) for dset in datasets[k]]
+            return values, time.time() - start
+
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(read_layer, range(len(layers)))
+        finally:
+            pool.close()
+
+        weight_value_tuples = []
+        for k, (layer, (weight_values, elapsed)) in enumerate(zip(layers, results)):
+            weight_values = saving.preprocess_weights_for_loading(layer, weight_values,
+                                                                  original_keras_version,
+                                                                  original_backend)
+            if len(weight_values) != len(layer.weights):
+                raise ValueError('Layer #' + str(k) + ' (named "' + layer.name +
+                                 '" in the current model) expects ' +
+                                 str(len(layer.weights)) + ' weights, but the saved '
+                                 'weights have ' + str(len(weight_values)) + ' elements.')
+            weight_value_tuples += zip(layer.weights, weight_values)
+            timings[layer.name] = elapsed
+
+        if (include_optimizer and 'optimizer_weights' in f and
+                getattr(model, 'optimizer', None)):
+            optimizer_weights_group = f['optimizer_weights']
+            optimizer_weight_names = [n.decode('utf8') for n in
+                                      optimizer_weights_group.attrs['weight_names']]
+            optimizer_weights = model.optimizer.weights
+            if len(optimizer_weights) != len(optimizer_weight_names):
+                raise ValueError('The optimizer of the model has ' + str(len(optimizer_weights)) +
+                                 ' weights, the saved optimizer has ' +
+                                 str(len(optimizer_weight_names)) + '.')
+            weight_value_tuples += [(w, _load_optimizer_weight(optimizer_weights_group[n]))
+                                    for w, n in zip(optimizer_weights, optimizer_weight_names)]
+
+    start = time.time()
+    K.batch_set_value(weight_value_tuples)
+    timings['batch_set_value'] = time.time() - start
+    if verbose:
+        for name, elapsed in timings.items():
+            print('%-40s %8.2f ms' % (name, 1000 * elapsed))
+    return timings
+
+
+def _file_sha256(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_shard(dirpath, filename, layers, optimizer_items, compression):
+    filepath = os.path.join(dirpath, filename)
+    with h5py.File(filepath + '.tmp', 'w') as f:
+        for layer_name, weight_names, weight_values in layers:
+            g = f.create_group(layer_name)
+            g.attrs['weight_names'] = [name.encode('utf8') for name in weight_names]
+            for i, val in enumerate(weight_values):
+                _create_dataset(g, str(i), val, compression)
+        if optimizer_items:
+            g = f.create_group('optimizer_weights')
+            for i, val in optimizer_items:
+                _create_dataset(g, str(i), val, compression)
+    _replace(filepath + '.tmp', filepath)
+    return {'file': filename, 'sha256': _file_sha256(filepath),
+            'bytes': os.path.getsize(filepath)}
+
+
+def save_sharded_weights(model, dirpath, num_shards=4, include_optimizer=True,
+                         compression=None, workers=None):
+    """Saves model and optimizer weights across several files written concurrently.
+
+    The weights are copied to host memory in a single call, then split in
+    `num_shards` files of similar sizes, keeping the weights of a layer in the
+    same file, which are written by a pool of threads. An `index.json` file
+    lists the shard of each layer and the SHA-256 checksum of each shard, it is
+    written last so that an interrupted save leaves no valid index.
+
+    # Arguments
+        model: Keras model instance to be saved.
+        dirpath: String, directory of the checkpoint, created if needed.
+        num_shards: number of shard files.
+        include_optimizer: If True, save optimizer's state together.
+        compression: None, `'gzip'` or `'lzf'`, compression of the datasets.
+        workers: number of writing threads, defaults to `num_shards`.
+
+    # Returns
+        The path of the index file.
+    """
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath)
+    snapshot = [item for item in snapshot_weights(model) if item[1]]
+    optimizer_weights = _optimizer_weights(model) if include_optimizer else []
+    optimizer_values = K.batch_get_value(optimizer_weights)
+
+    # largest first, to the least filled shard
+    shard_layers = [[] for _ in range(num_shards)]
+    shard_optimizer = [[] for _ in range(num_shards)]
+    shard_bytes = [0] * num_shards
+    items = [(sum(v.nbytes for v in item[2]), 'layer', item) for item in snapshot]
+    items += [(v.nbytes, 'optimizer', (i, v)) for i, v in enumerate(optimizer_values)]
+    for nbytes, kind, item in sorted(items, key=lambda x: -x[0]):
+        shard = int(np.argmin(shard_bytes))
+        shard_bytes[shard] += nbytes
+        if kind == 'layer':
+            shard_layers[shard].append(item)
+        else:
+            shard_optimizer[shard].append(item)
+
+    filenames = ['shard-%05d-of-%05d.h5' % (i, num_shards) for i in range(num_shards)]
+    pool = ThreadPool(workers or num_shards)
+    try:
+        shards = pool.map(lambda i: _write_shard(dirpath, filenames[i], shard_layers[i],
+                                                 shard_optimizer[i], compression),
+                          range(num_shards))
+    finally:
+        pool.close()
+
+    index = {'keras_version': str(keras.__version__),
+             'backend': K.backend(),
+             'shards': shards,
+             'layers': OrderedDict(),
+             'optimizer_weights': [None] * len(optimizer_values)}
+    for shard, layers in enumerate(shard_layers):
+        for layer_name, weight_names, _ in layers:
+            index['layers'][layer_name] = {'shard': shard, 'weights': len(weight_names)}
+        for i, _ in shard_optimizer[shard]:
+            index['optimizer_weights'][i] = shard
+    index_path = os.path.join(dirpath, 'index.json')
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump(index, f)
+    _replace(index_path + '.tmp', index_path)
+    return index_path
+
+
+def load_sharded_weights(model, dirpath, layers=None, include_optimizer=True,
+                         workers=None, verify=True):
+    """Loads the weights of a model saved via `save_sharded_weights`.
+
+    Weights are matched to the layers of `model` by name. Only the shards
+    holding the requested layers are checked and read, so that, for instance,
+    the backbone of a model can be loaded in a model with a different head.
+
+    # Arguments
+        model: instantiated model with layers matching the saved model.
+            Compile the model beforehand if you want to load optimizer weights,
+            its training function is built if it has not been trained yet.
+        dirpath: String, directory of the checkpoint.
+        layers: list of layer names to load, defaults to all the layers of
+            `model` with weights, which must all be in the checkpoint.
+        include_optimizer: If True, and all layers are loaded, load the
+            optimizer's state too.
+        workers: number of reading threads, defaults to the number of shards read.
+        verify: If True, checks the SHA-256 checksum of the shards read.
+
+    # Returns
+        None. The model will have its weights updated.
+
+    # Raises
+        ValueError: if a layer or shard is missing, a checksum does not match,
+            or the saved weights do not match the model.
+    """
+    with open(os.path.join(dirpath, 'index.json')) as f:
+        index = json.load(f)
+    # builds the optimizer slots of a model not trained yet
+    optimizer_weights = _optimizer_weights(model) if layers is None and include_optimizer else []
+    load_optimizer = bool(index['optimizer_weights'] and optimizer_weights)
+    if layers is None:
+        layers = [layer.name for layer in model.layers if layer.weights]
+    missing = [name for name in layers if name not in index['layers']]
+    if missing:
+        raise ValueError('Layers not found in the checkpoint: ' + str(missing))
+    needed = set(index['layers'][name]['shard'] for name in layers)
+    if load_optimizer:
+        if len(optimizer_weights) != len(index['optimizer_weights']):
+            raise ValueError('The optimizer of the model has ' + str(len(optimizer_weights)) +
+                             ' weights, the saved optimizer has ' +
+                             str(len(index['optimizer_weights'])) + '.')
+        needed.update(index['optimizer_weights'])
+    needed = sorted(needed)
+
+    def read_shard(shard):
+        info = index['shards'][shard]
+        filepath = os.path.join(dirpath, info['file'])
+        if not os.path.exists(filepath):
+            raise ValueError('Missing shard: ' + filepath)
+        if verify and _file_sha256(filepath) != info['sha256']:
+            raise ValueError('Checksum mismatch, the shard is corrupted: ' + filepath)
+        values = {}
+        with h5py.File(filepath, mode='r') as f:
+            for name in layers:
+                if index['layers'][name]['shard'] == shard:
+                    g = f[name]
+                    values[name] = [g[str(i)][()] for i in range(index['layers'][name]['weights'])]
+            if load_optimizer and 'optimizer_weights' in f:
+                g = f['optimizer_weights']
+                for i, optimizer_shard in enumerate(index['optimizer_weights']):
+                    if optimizer_shard == shard:
+                        values[i] = g[str(i)][()]
+        return values
+
+    pool = ThreadPool(workers or len(needed) or 1)
+    try:
+        values = {}
+        for shard_values in pool.map(read_shard, needed):
+            values.update(shard_values)
+    finally:
+        pool.close()
+
+    weight_value_tuples = []
+    for name in layers:
+        layer = model.get_layer(name)
+        if len(values[name]) != len(layer.weights):
+            raise ValueError('Layer "' + name + '" expects ' + str(len(layer.weights)) +
+                             ' weights, but the saved weights have ' +
+                             str(len(values[name])) + ' elements.')
+        for w, val in zip(layer.weights, values[name]):
+            if K.int_shape(w) != val.shape:
+                raise ValueError('Layer "' + name + '" expects a weight of shape ' +
+                                 str(K.int_shape(w)) + ', the saved weight has shape ' +
+                                 str(val.shape) + '.')
+            weight_value_tuples.append((w, val))
+    if load_optimizer:
+        weight_value_tuples += [(w, values[i]) for i, w in enumerate(optimizer_weights)]
+    K.batch_set_value(weight_value_tuples)
@@ -0,0 +1,298 @@
+""" Inference and offline evaluation of semantic segmentation models.
+
+    Large images are segmented tile by tile with `predict_tiled`, and predicted
+    label images are compared to the ground truth of an image set, following the
+    `file_path` and `label_dir` conventions of `SegDirectoryIterator`:
+
+    ```
+    python -m keras_contrib.utils.segmentation_utils val.txt predictions/ SegmentationClass/ 21
+    ```
+"""
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+
+import numpy as np
+from keras import backend as K
+from PIL import Image
+
+from ..metrics.segmentation_metrics import confusion_matrix
+from ..metrics.segmentation_metrics import confusion_matrix_metrics
+
+
+def _tile_starts(size, tile, stride):
+    if size <= tile:
+        return [0]
+    starts = list(range(0, size - tile, stride))
+    # the last tile is aligned with the border of the image
+    return starts + [size - tile]
+
+
+def _blend_window(tile_size, overlap):
+    """Weights decreasing linearly over the `overlap` pixels of each border."""
+    windows = []
+    for tile, margin in zip(tile_size, overlap):
+        ramp = np.arange(1, tile + 1, dtype='float32') / (margin + 1)
+        windows.append(np.minimum(1., np.minimum(ramp, ramp[::-1])))
+    return windows[0][:, None] * windows[1][None, :]
+
+
+def _flip(x, flip):
+    # x is a batch of channels_last tiles
+    if flip == 'horizontal':
+        return x[:, :, ::-1]
+    if flip == 'vertical':
+        return x[:, ::-1]
+    return x
+
+
+def _tile_bytes(model, tile_size, channels):
+    """Estimates the memory used to predict one tile."""
+    itemsize = np.dtype(K.floatx()).itemsize
+    total = 0
+    for layer in model.layers:
+        shapes = layer.output_shape
+        if not isinstance(shapes, list):
+            shapes = [shapes]
+        for shape in shapes:
+            known = [d for d in shape[1:] if d is not None]
+            unknown = len(shape) - 1 - len(known)
+            # spatial dimensions left to `None` scale with the tile
+            total += np.prod(known, dtype='int64') * np.prod(tile_size[:unknown], dtype='int64')
+    return int(max(total, np.prod(tile_size) * channels) * itemsize)
+
+
+def predict_tiled(model, images, tile_size=None, overlap=0.25, batch_size=8,
+                  flips=(), memory_budget=None, data_format=None):
+    """Segments images of any size with overlapping tiles.
+
+    Each image is split in tiles of `tile_size` overlapping by `overlap`,
+    the last tile of each row and column being aligned with the border of the
+    image. Tiles of all the images are predicted together in batches, and the
+    predictions of overlapping tiles are blended with weights decreasing
+    linearly towards the tile borders, so that each pixel mostly depends on
+    the tiles in which it has the most context. Images smaller than a tile are
+    padded with zeros.
+
+    # Arguments
+        model: fully convolutional Keras model, such as `AtrousFCN_Resnet50_16s`
+            or `DenseNet_FCN`, whose output has the spatial size of its input.
+        images: a 4D numpy array, or a list of 3D numpy arrays of different sizes.
+        tile_size: tuple of 2 ints, `(rows, cols)` of a tile. Defaults to the
+            input size of `model`, which must then be fixed.
+        overlap: float in `[0, 1)`, fraction of a tile shared with its
+            neighbours, or tuple of 2 ints, overlap in pixels.
+        batch_size: maximum number of tiles per batch.
+        flips: test time augmentation, list of `'horizontal'` and `'vertical'`.
+            Each tile is also predicted flipped, and the predictions averaged.
+        memory_budget: int, maximum number of bytes of activations of a batch,
+            estimated from the layer output shapes of `model`. Reduces the
+            batch size when needed.
+        data_format: `'channels_first'` or `'channels_last'`. Defaults to
+            `K.image_data_format()`.
+
+    # Returns
+        The blended model outputs, a 4D numpy array if `images` is a 4D numpy
+        array, a list of 3D numpy arrays otherwise.
+
+    # Raises
+        ValueError: if the tile size is unknown, or the model output is not
+            the size of its input.
+    """
+    if data_format is None:
+        data_format = K.image_data_format()
+    channels_first = data_format == 'channels_first'
+    as_array = isinstance(images, np.ndarray)
+    if channels_first:
+        images = [np.moveaxis(image, 0, -1) for image in images]
+    if tile_size is None:
+        tile_size = model.input_shape[2:4] if channels_first else model.input_shape[1:3]
+        if None in tile_size:
+            raise ValueError('`tile_size` is required for a model without a fixed '
+                             'input size, got input shape: ' + str(model.input_shape))
+    tile_size = tuple(tile_size)
+    if not isinstance(overlap, (tuple, list)):
+        overlap = tuple(int(overlap * t) for t in tile_size)
+    stride = tuple(max(t - o, 1) for t, o in zip(tile_size, overlap))
+    flips = [None] + list(flips)
+    if memory_budget is not None:
+        tile_bytes = _tile_bytes(model, tile_size, images[0].shape[-1])
+        batch_size = max(1, min(batch_size, memory_budget // tile_bytes))
+    window = _blend_window(tile_size, overlap)[..., None]
+
+    # pads images smaller than a tile
+    padded = []
+    for image in images:
+        pad = [(0, max(t - s, 0)) for t, s in zip(tile_size, image.shape[:2])]
+        padded.append(np.pad(image, pad + [(0, 0)], 'constant'))
+    tiles = [(i, r, c, flip) for i, image in enumerate(padded)
+             for r in _tile_starts(image.shape[0], tile_size[0], stride[0])
+             for c in _tile_starts(image.shape[1], tile_size[1], stride[1])
+             for flip in flips]
+
+    outputs = [None] * len(padded)
+    weights = [np.zeros(image.shape[:2] + (1,), dtype='float32') for image in padded]
+    for start in range(0, len(tiles), batch_size):
+        batch = tiles[start:start + batch_size]
+        x = np.stack([_flip(padded[i][None, r:r + tile_size[0], c:c + tile_size[1]], flip)[0]
+                      for i, r, c, flip in batch])
+        if channels_first:
+            x = np.moveaxis(x, -1, 1)
+        y = model.predict_on_batch(x)
+        if channels_first:
+            y = np.moveaxis(y, 1, -1)
+        if y.shape[1:3] != tile_size:
+            raise ValueError('`predict_tiled` requires a model whose output has the '
+                             'size of its input, got output shape: ' + str(y.shape))
+        for (i, r, c, flip), y_tile in zip(batch, y):
+            if outputs[i] is None:
+                outputs[i] = np.zeros(padded[i].shape[:2] + y.shape[-1:], dtype='float32')
+            y_tile = _flip(y_tile[None], flip)[0]
+            outputs[i][r:r + tile_size[0], c:c + tile_size[1]] += window * y_tile
+            weights[i][r:r + tile_size[0], c:c + tile_size[1]] += window
+
+    results = []
+    for image, output, weight in zip(images, outputs, weights):
+        output = (output / weight)[:image.shape[0], :image.shape[1]]
+        if channels_first:
+            output = np.moveaxis(output, -1, 0)
+        results.append(output)
+    if as_array:
+        return np.stack(results)
+    return results
+
+
+def predict_buckets(model, sequence):
+    """Predicts the natural size images of a `SegBucketSequence`.
+
+    Each batch of images of similar sizes is predicted at once, then the
+    padded outputs are cropped back to the size of each image.
+
+    # Arguments
+        model: fully convolutional Keras model whose output has the spatial
+            size of its input, and accepts inputs of any size.
+        sequence: a `SegBucketSequence`, whose `size_multiple` should be a
+            multiple of the output stride of `model`.
+
+    # Returns
+        A list of 3D numpy arrays, the model outputs in the order of the
+        image set file.
+    """
+    outputs = [None] * len(sequence.image_sizes)
+    for idx in range(len(sequence)):
+        x = sequence[idx]
+        if isinstance(x, tuple):
+            x = x[0]
+        for j, output in sequence.crop(idx, model.predict_on_batch(x)):
+            outputs[j] = output
+    return outputs
+
+
+def load_label(filepath, classes=None):
+    """Loads a label image (`.png`, palette or grayscale) or a `.npy` array.
+
+    `.npy` arrays with a last axis of size `classes` hold scores and are
+    reduced to labels with an argmax.
+    """
+    if filepath.endswith('.npy'):
+        label = np.load(filepath)
+        if classes is not None and label.ndim == 3 and label.shape[-1] == classes:
+            label = label.argmax(axis=-1)
+    else:
+        label = np.array(Image.open(filepath))
+    if label.ndim == 3 and label.shape[-1] == 1:
+        label = label[..., 0]
+    return label
+
+
+def _chunk_confusion(args):
+    names, pred_dir, pred_suffix, label_dir, label_suffix, classes, ignore_label = args
+    confusion = np.zeros((classes, classes), dtype='int64')
+    for name in names:
+        pred = load_label(os.path.join(pred_dir, name + pred_suffix), classes)
+        label = load_label(os.path.join(label_dir, name + label_suffix))
+        if pred.shape != label.shape:
+            raise ValueError('The prediction and the label of %s have different shapes: '
+                             '%s and %s' % (name, pred.shape, label.shape))
+        confusion += confusion_matrix(label, pred, classes, ignore_label)
+    return confusion
+
+
+def evaluate_segmentation(file_path, pred_dir, label_dir, classes,
+                          pred_suffix='.png', label_suffix='.png',
+                          ignore_label=255, workers=None, chunksize=8):
+    """Computes the segmentation metrics of a directory of predictions.
+
+    The images are split in chunks evaluated by a pool of processes, each
+    returning the confusion matrix of its chunk, and the matrices are summed,
+    so the metrics are the dataset level ones of `confusion_matrix_metrics`.
+
+    # Arguments
+        file_path: location of the image set file, such as `val.txt` in
+            PASCAL VOC2012 format, listing file names without extension.
+        pred_dir: location of the predicted label files.
+        label_dir: location of the ground truth label files.
+        classes: int, number of classes.
+        pred_suffix: predicted label file suffix, such as `.png`, or `.npy`.
+        label_suffix: ground truth label file suffix, such as `.png`, or `.npy`.
+        ignore_label: label of the pixels to leave out, in addition to any
+            label outside of `[0, classes)`.
+        workers: number of processes, defaults to the number of CPUs.
+            With 1 the images are evaluated in the current process.
+        chunksize: number of images evaluated by a process at a time.
+
+    # Returns
+        The dict of `confusion_matrix_metrics`, with the summed
+        `confusion_matrix` in addition.
+    """
+    with open(file_path) as f:
+        names = [line.strip() for line in f if line.strip()]
+    chunks = [(names[i:i + chunksize], pred_dir, pred_suffix, label_dir, label_suffix,
+               classes, ignore_label)
+              for i in range(0, len(names), chunksize)]
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    confusion = np.zeros((classes, classes), dtype='int64')
+    if workers <= 1:
+        for chunk in chunks:
+            confusion += _chunk_confusion(chunk)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            for chunk_confusion in pool.imap_unordered(_chunk_confusion, chunks):
+                confusion += chunk_confusion
+        finally:
+            pool.terminate()
+
+    metrics = confusion_matrix_metrics(confusion)
+    metrics['confusion_matrix'] = confusion
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluates predicted segmentation labels.')
+    parser.add_argument('file_path', help='image set file listing the file names without extension')
+    parser.add_argument('pred_dir', help='directory of the predicted labels')
+    parser.add_argument('label_dir', help='directory of the ground truth labels')
+    parser.add_argument('classes', type=int, help='number of classes')
+    parser.add_argument('--pred_suffix', default='.png')
+    parser.add_argument('--label_suffix', default='.png')
+    parser.add_argument('--ignore_label', type=int, default=255)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    metrics = evaluate_segmentation(args.file_path, args.pred_dir, args.label_dir, args.classes,
+                                    pred_suffix=args.pred_suffix, label_suffix=args.label_suffix,
+                                    ignore_label=args.ignore_label, workers=args.workers)
+    for i, iou in enumerate(metrics['class_iou']):
+        print('class %d IoU: %.4f' % (i, iou))
+    for name in ['mean_iou', 'pixel_accuracy', 'mean_accuracy']:
+        print('%s: %.4f' % (name, metrics[name]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+from keras import backend as K
+from keras_contrib.applications.densenet import DenseNet
+from keras_contrib.applications.densenet import DenseNetFCN
+from keras_contrib.utils.test_utils import keras_test
+
+
+def _input_shape(rows, cols, channels):
+    if K.image_data_format() == 'channels_first':
+        return (channels, rows, cols)
+    return (rows, cols, channels)
+
+
+@keras_test
+def test_densenet_efficient_matches_standard():
+    input_shape = _input_shape(16, 16, 3)
+    kwargs = dict(input_shape=input_shape, depth=10, nb_dense_block=2,
+                  growth_rate=4, bottleneck=True, reduction=0.5, classes=3)
+    standard = DenseNet(efficient=False, **kwargs)
+    efficient = DenseNet(efficient=True, **kwargs)
+    assert standard.count_params() == efficient.count_params()
+    efficient.set_weights(standard.get_weights())
+
+    x = np.random.random((4,) + input_shape)
+    y = np.eye(3)[np.random.randint(0, 3, 4)]
+    assert_allclose(standard.predict(x), efficient.predict(x), atol=1e-5)
+
+    # identical gradients give identical weights after a training step
+    for model in [standard, efficient]:
+        model.compile(loss='categorical_crossentropy', optimizer='sgd')
+        model.train_on_batch(x, y)
+    for w_standard, w_efficient in zip(standard.get_weights(), efficient.get_weights()):
+        assert_allclose(w_standard, w_efficient, atol=1e-4)
+
+
+@keras_test
+def test_densenet_fcn_efficient():
+    input_shape = _input_shape(16, 16, 3)
+    model = DenseNetFCN(input_shape, nb_dense_block=2, growth_rate=4,
+                        nb_layers_per_block=2, upsampling_type='upsampling',
+                        classes=3, efficient=True)
+    model.compile(loss='categorical_crossentropy', optimizer='sgd')
+    x = np.random.random((2,) + input_shape)
+    y = np.eye(3)[np.random.randint(0, 3, (2, 16, 16))]
+    model.train_on_batch(x, y)
+    assert model.predict(x).shape == (2, 16, 16, 3)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -206,6 +206,41 @@ class TestBackend(object):
                 actual = K_.eval(KC_.clip(K_.constant(x), min_value, max_value))
                 assert_allclose(expected, actual, atol=1e-5)
 
+    def test_conv2d_channels_first(self):
+        xval = np.random.random((2, 8, 8, 3))
+        kernel_val = np.random.random((3, 3, 3, 4))
+        for strides in [(1, 1), (2, 2)]:
+            expected = KTF.eval(KCTF.conv2d(KTF.variable(xval), KTF.variable(kernel_val),
+                                            strides=strides, padding='same',
+                                            data_format='channels_last'))
+            # channels first kernels are in the Theano layout
+            ztf = KTF.eval(KCTF.conv2d(KTF.variable(xval.transpose(0, 3, 1, 2)),
+                                       KTF.variable(kernel_val.transpose(3, 2, 0, 1)),
+                                       strides=strides, padding='same',
+                                       data_format='channels_first'))
+            assert_allclose(expected.transpose(0, 3, 1, 2), ztf, atol=1e-05)
+
+    def test_transpose_pairs_are_elided(self):
+        x = KTF.variable(np.random.random((2, 3, 4, 5)))
+        y = KCTF._transpose(x, (0, 2, 3, 1))
+        assert y.op.type == 'Transpose'
+        z = KCTF._transpose(y, (0, 3, 1, 2))
+        assert z.op.type != 'Transpose'
+        assert_allclose(KTF.eval(x), KTF.eval(z))
+        # not the inverse permutation
+        w = KCTF._transpose(y, (0, 2, 3, 1))
+        assert w.op.type == 'Transpose'
+        assert KTF.int_shape(w) == (2, 5, 3, 4)
+
+        # consecutive channels first ops run without transposes in between
+        kernel = KTF.variable(np.random.random((4, 3, 3, 3)))
+        y = KCTF.conv2d(x, kernel, padding='same', data_format='channels_first')
+        z = KCTF.depth_to_space(y, 2, data_format='channels_first')
+        assert KTF.int_shape(z) == (2, 1, 8, 10)
+        if z.op.type == 'Transpose':
+            assert z.op.inputs[0].op.type == 'DepthToSpace'
+            assert z.op.inputs[0].op.inputs[0].op.type == 'Conv2D'
+
 
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -1,5 +1,6 @@
 import pytest
 import numpy as np
+from keras import backend as K
 from keras_contrib import callbacks
 from keras.models import Sequential
 from keras.layers import Dense, Input
@@ -111,5 +112,78 @@ def test_CyclicalLearningRate():
     custom_fn_test(X, y)
 
 
+@pytest.mark.skipif(K.backend() != 'tensorflow', reason='the graph-side schedule is read back with TensorFlow')
+@pytest.mark.parametrize('mode', ['triangular', 'triangular2', 'exp_range'])
+def test_CyclicalLearningRate_graph_mode(mode):
+    X = np.random.rand(200, 10)
+    y = np.random.rand(200).reshape(-1, 1)
+    histories = []
+    for graph_mode in [False, True]:
+        model = Sequential([Dense(1, activation='sigmoid', input_shape=(10,))])
+        model.compile(optimizer='sgd', loss='binary_crossentropy')
+        clr = callbacks.CyclicLR(step_size=20., mode=mode, gamma=0.99, graph_mode=graph_mode)
+        if graph_mode:
+            clr.attach(model.optimizer)
+        model.fit(X, y, batch_size=2, epochs=2, verbose=0, callbacks=[clr])
+        histories.append(clr.history['lr'])
+        if graph_mode:
+            # the recorded schedule is the one computed by the graph
+            assert_allclose(K.get_value(model.optimizer.lr), histories[1][-1], rtol=1e-5)
+    assert_allclose(histories[0], histories[1], rtol=1e-5)
+
+
+def test_CyclicalLearningRate_graph_mode_requires_attach():
+    model = Sequential([Dense(1, activation='sigmoid', input_shape=(10,))])
+    model.compile(optimizer='sgd', loss='binary_crossentropy')
+    clr = callbacks.CyclicLR(graph_mode=True)
+    with pytest.raises(ValueError):
+        model.fit(np.random.rand(4, 10), np.random.rand(4, 1), verbose=0, callbacks=[clr])
+
+
+def test_CyclicalLearningRate_bounded_history():
+    X = np.random.rand(100, 10)
+    y = np.random.rand(100).reshape(-1, 1)
+    model = Sequential([Dense(1, activation='sigmoid', input_shape=(10,))])
+    model.compile(optimizer='sgd', loss='binary_crossentropy')
+    clr = callbacks.CyclicLR(step_size=20., history_size=5, history_every=4)
+    model.fit(X, y, batch_size=1, epochs=1, verbose=0, callbacks=[clr])
+    assert list(clr.history['iterations']) == [84, 88, 92, 96, 100]
+    assert len(clr.history['lr']) == len(clr.history['loss']) == 5
+
+
+def test_lr_range_test():
+    np.random.seed(1337)
+    X = np.random.rand(320, 10)
+    y = (X.sum(axis=1, keepdims=True) > 5).astype('float32')
+    model = Sequential([
+        Dense(10, activation='relu', input_shape=(10,)),
+        Dense(1, activation='sigmoid')
+    ])
+    model.compile(optimizer='sgd', loss='binary_crossentropy', metrics=['accuracy'])
+    weights = model.get_weights()
+    lr = K.get_value(model.optimizer.lr)
+
+    result = callbacks.lr_range_test(model, X, y, min_lr=1e-4, max_lr=1e3,
+                                     num_batches=50, batch_size=16, seed=0)
+    assert len(result['lrs']) == len(result['losses']) == len(result['smoothed_losses'])
+    assert len(result['lrs']) <= 50
+    assert_allclose(result['lrs'][:2], [1e-4, 1e-4 * (1e7 ** (1. / 49))])
+    assert 1e-4 <= result['base_lr'] <= result['max_lr'] / 4. <= 1e3
+    # the minimum is taken after the warm-up batches
+    assert result['max_lr'] >= result['lrs'][10]
+    for w, new_w in zip(weights, model.get_weights()):
+        assert_allclose(w, new_w)
+    assert_allclose(K.get_value(model.optimizer.lr), lr)
+
+    with pytest.raises(ValueError):
+        callbacks.lr_range_test(model, X, y, mode='cosine')
+
+    # learning rates too small to decrease the loss
+    with pytest.warns(UserWarning):
+        result = callbacks.lr_range_test(model, X, y, min_lr=1e-10, max_lr=1e-9,
+                                         num_batches=20, batch_size=16, seed=0)
+    assert 1e-10 <= result['base_lr'] <= result['max_lr'] <= 1e-9
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
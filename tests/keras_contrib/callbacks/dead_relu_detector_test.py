@@ -205,5 +205,53 @@ def test_DeadDeadReluDetector_activation():
     )
 
 
+def test_DeadDeadReluDetector_batches():
+    """
+    Neurons firing on a single sample are alive, whether the samples come in batches or from a generator
+    """
+    n_samples = 10
+    weights = np.eye(n_out)
+    weights[:, 0] = 0
+    dataset = np.zeros((n_samples, n_out))
+    dataset[-1] = 1.
+
+    model = Sequential()
+    model.add(Dense(n_out, activation='relu', input_shape=(n_out,), use_bias=True,
+                    weights=[weights, np.zeros(n_out)], name='dense'))
+    model.add(Activation('relu'))
+
+    def batches():
+        while True:
+            for start in range(0, n_samples, 3):
+                yield dataset[start:start + 3], np.zeros((len(dataset[start:start + 3]), n_out))
+
+    for detector in [callbacks.DeadReluDetector(dataset, batch_size=3),
+                     callbacks.DeadReluDetector(batches(), steps=4)]:
+        detector.set_model(model)
+        fired_neurons = detector.get_fired_neurons()
+        assert len(fired_neurons) == 1
+        layer_index, fired, layer_name = fired_neurons[0]
+        assert layer_name == 'dense'
+        assert fired.tolist() == [False] + [True] * (n_out - 1)
+
+
+def test_DeadDeadReluDetector_get_relu_activations():
+    """
+    The deprecated get_relu_activations returns the outputs of the relu layers for the whole dataset
+    """
+    dataset = np.random.random((10, n_out))
+    model = Sequential()
+    model.add(Dense(n_out, activation='relu', input_shape=(n_out,), name='dense'))
+
+    detector = callbacks.DeadReluDetector(dataset, batch_size=3)
+    detector.set_model(model)
+    with pytest.warns(DeprecationWarning):
+        relu_activations = detector.get_relu_activations()
+    assert len(relu_activations) == 1
+    layer_index, activations, layer_name, weight_shape = relu_activations[0]
+    assert (layer_index, layer_name, weight_shape) == (0, 'dense', (n_out, n_out))
+    np.testing.assert_allclose(activations, model.predict(dataset), rtol=1e-5, atol=1e-6)
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -5,6 +5,7 @@ from keras import backend as K
 from keras_contrib import backend as KC
 from keras.utils import np_utils
 from keras_contrib import callbacks
+from keras_contrib.utils.test_utils import keras_test
 
 import os
 import sys
@@ -24,5 +25,37 @@ train_samples = 20
 test_samples = 20
 
 
+@keras_test
+def test_snapshot_async_save(tmpdir):
+    (x_train, y_train), (x_test, y_test) = get_test_data(num_train=train_samples,
+                                                         num_test=test_samples,
+                                                         input_shape=(input_dim,),
+                                                         classification=True,
+                                                         num_classes=nb_class)
+    y_train = np_utils.to_categorical(y_train)
+    y_test = np_utils.to_categorical(y_test)
+    model = Sequential()
+    model.add(Dense(nb_hidden, input_dim=input_dim, activation='relu'))
+    model.add(Dense(nb_class, activation='softmax'))
+    model.compile(loss='categorical_crossentropy', optimizer='sgd', metrics=['accuracy'])
+
+    fn_prefix = str(tmpdir.join('Model'))
+    snapshot = callbacks.SnapshotModelCheckpoint(4, 2, fn_prefix=fn_prefix, async_save=True)
+    best = callbacks.AsyncModelCheckpoint(str(tmpdir.join('Best.h5')), monitor='val_acc',
+                                          save_best_only=True)
+    model.fit(x_train, y_train, batch_size=batch_size, validation_data=(x_test, y_test),
+              callbacks=[snapshot, best], epochs=4, verbose=0)
+    assert snapshot.writer is None and best.writer is None
+    assert os.path.exists(fn_prefix + '-1.h5')
+    assert os.path.exists(fn_prefix + '-2.h5')
+    assert os.path.exists(str(tmpdir.join('Best.h5')))
+
+    weights = model.get_weights()
+    model.set_weights([np.zeros_like(w) for w in weights])
+    model.load_weights(fn_prefix + '-2.h5')
+    for w, w_expected in zip(model.get_weights(), weights):
+        np.testing.assert_allclose(w, w_expected)
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+from keras import backend as K
+from keras.callbacks import Callback
+from keras.layers import BatchNormalization, Dense, Input
+from keras.models import Model
+from keras_contrib import callbacks
+from keras_contrib.layers import BatchRenormalization
+from keras_contrib.utils.test_utils import keras_test
+
+
+class _WeightsRecorder(Callback):
+
+    def __init__(self):
+        super(_WeightsRecorder, self).__init__()
+        self.weights = []
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.weights.append({layer.name: layer.get_weights() for layer in self.model.layers})
+
+
+def _model():
+    inputs = Input(shape=(5,))
+    x = BatchNormalization(name='bn')(inputs)
+    x = Dense(4, activation='relu', name='dense')(x)
+    x = BatchRenormalization(name='brn')(x)
+    outputs = Dense(1, name='output')(x)
+    model = Model(inputs, outputs)
+    model.compile(loss='mse', optimizer='sgd')
+    return model
+
+
+@keras_test
+def test_stochastic_weight_averaging(tmpdir):
+    np.random.seed(1337)
+    x = 3. + 2. * np.random.random((64, 5))
+    y = np.random.random((64, 1))
+    model = _model()
+    filepath = os.path.join(str(tmpdir), 'swa.h5')
+    recorder = _WeightsRecorder()
+    swa = callbacks.StochasticWeightAveraging(6, 3, start_snapshot=2, filepath=filepath,
+                                              bn_data=x, batch_size=32)
+    model.fit(x, y, batch_size=16, epochs=6, verbose=0, callbacks=[recorder, swa])
+    assert swa.num_averaged == 2
+
+    # epochs 4 and 6 end the second and the third cycles
+    for name in ['dense', 'output']:
+        expected = [(a + b) / 2. for a, b in zip(recorder.weights[3][name], recorder.weights[5][name])]
+        weights = model.get_layer(name).get_weights()
+        assert len(weights) == len(expected)
+        for w, e in zip(weights, expected):
+            assert_allclose(w, e, rtol=1e-5)
+
+    bn = model.get_layer('bn')
+    assert_allclose(K.get_value(bn.moving_mean), x.mean(axis=0), rtol=1e-4)
+    expected_variance = np.mean([x[:32].var(axis=0, ddof=1), x[32:].var(axis=0, ddof=1)], axis=0)
+    assert_allclose(K.get_value(bn.moving_variance), expected_variance, rtol=1e-2)
+    assert np.all(np.isfinite(model.get_layer('brn').get_weights()))
+
+    saved = _model()
+    saved.load_weights(filepath)
+    for w, saved_w in zip(model.get_weights(), saved.get_weights()):
+        assert_allclose(w, saved_w)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
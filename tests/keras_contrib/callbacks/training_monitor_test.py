@@ -0,0 +1,58 @@
+import csv
+import pytest
+import numpy as np
+from keras.layers import Dense
+from keras.models import Sequential
+from keras_contrib.callbacks import TrainingMonitor
+from keras_contrib.utils.test_utils import keras_test
+
+
+def _model():
+    model = Sequential()
+    model.add(Dense(8, activation='relu', input_shape=(4,), name='relu'))
+    model.add(Dense(8, activation='tanh', name='tanh'))
+    model.add(Dense(3, activation='softmax', name='softmax'))
+    model.compile(optimizer='sgd', loss='categorical_crossentropy')
+    return model
+
+
+@keras_test
+def test_training_monitor(tmpdir):
+    x = np.random.random((40, 4))
+    y = np.eye(3)[np.random.randint(0, 3, 40)]
+    log_path = str(tmpdir.join('health.csv'))
+    monitor = TrainingMonitor(x, y, sample_every=2, batch_size=8, buffer_size=3,
+                              log_path=log_path, max_overhead=1.)
+    model = _model()
+    model.fit(x, y, batch_size=4, epochs=1, callbacks=[monitor], verbose=0)
+
+    history = monitor.get_history()
+    assert monitor.records == 5
+    assert history['layers'] == ['relu', 'tanh', 'softmax']
+    assert history['steps'].tolist() == [6, 8, 10]
+    for name in TrainingMonitor.statistics:
+        assert history[name].shape == (3, 3)
+    assert np.all(np.isnan(history['saturation'][:, 0]))
+    assert np.all(np.isfinite(history['saturation'][:, 1:]))
+    assert np.all(history['grad_norm'] > 0)
+    assert np.all((history['sparsity'] >= 0) & (history['sparsity'] <= 1))
+    assert 0 < monitor.overhead < 1
+
+    with open(log_path) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['step', 'layer'] + list(TrainingMonitor.statistics)
+    assert len(rows) == 1 + 5 * 3
+
+
+@keras_test
+def test_training_monitor_bounds_overhead():
+    x = np.random.random((40, 4))
+    y = np.eye(3)[np.random.randint(0, 3, 40)]
+    monitor = TrainingMonitor(x, y, sample_every=1, max_overhead=0.)
+    _model().fit(x, y, batch_size=4, epochs=1, callbacks=[monitor], verbose=0)
+    assert monitor.sample_every > 1
+    assert monitor.records < 10
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
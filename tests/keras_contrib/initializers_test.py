@@ -56,5 +56,19 @@ def test_cai(tensor_shape):
     _runner(initializers.ConvolutionAware(), tensor_shape,
             upper_bound=1, lower_bound=-1)
 
+
+@pytest.mark.parametrize('tensor_shape', [(5, 4, 8), (3, 3, 64, 32), (1, 1, 4, 8), (2, 3, 3, 4, 6)],
+                         ids=['1D', '2D', '2D_1x1_fourier', '3D'])
+def test_cai_shapes(tensor_shape):
+    init = initializers.ConvolutionAware(seed=1)
+    output = init(tensor_shape)
+    assert output.shape == tensor_shape
+    assert np.all(np.isfinite(output))
+    # the kernels are scaled to the He variance
+    fan_in = np.prod(tensor_shape[:-1])
+    np.testing.assert_allclose(output.var(), 2. / fan_in, rtol=1e-4)
+    np.testing.assert_allclose(output, init(tensor_shape))
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
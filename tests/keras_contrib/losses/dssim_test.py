@@ -99,5 +99,68 @@ def test_DSSIM_channels_first():
     K.set_image_data_format(prev_data)
 
 
+def _patch_dssim(y_true, y_pred, kernel_size, strides, k1=0.01, k2=0.03, sigma=None):
+    # reference computed on every channels last window, as a patch of all channels,
+    # whose pixels are weighted by a gaussian of standard deviation `sigma`, if any
+    c1, c2 = k1 ** 2, k2 ** 2
+    weights = np.ones((kernel_size, kernel_size))
+    if sigma is not None:
+        offsets = np.arange(kernel_size) - (kernel_size - 1) / 2.
+        weights = np.outer(np.exp(-offsets ** 2 / (2. * sigma ** 2)), np.exp(-offsets ** 2 / (2. * sigma ** 2)))
+    weights = np.repeat(weights[:, :, None], y_true.shape[-1], axis=-1).ravel()
+    weights /= weights.sum()
+
+    def mean(x):
+        return (x * weights).sum(-1)
+
+    rows = (y_true.shape[1] - kernel_size) // strides + 1
+    cols = (y_true.shape[2] - kernel_size) // strides + 1
+    ssim = []
+    for i in range(rows):
+        for j in range(cols):
+            window = (slice(None), slice(i * strides, i * strides + kernel_size),
+                      slice(j * strides, j * strides + kernel_size))
+            patch_true = y_true[window].reshape((len(y_true), -1))
+            patch_pred = y_pred[window].reshape((len(y_pred), -1))
+            u_true, u_pred = mean(patch_true), mean(patch_pred)
+            var_true = mean(patch_true ** 2) - u_true ** 2
+            var_pred = mean(patch_pred ** 2) - u_pred ** 2
+            covar = mean(patch_true * patch_pred) - u_true * u_pred
+            ssim.append((2 * u_true * u_pred + c1) * (2 * covar + c2) /
+                        ((u_true ** 2 + u_pred ** 2 + c1) * (var_true + var_pred + c2)))
+    return np.mean((1. - np.array(ssim)) / 2.)
+
+
+def test_DSSIM_matches_patches():
+    prev_data = K.image_data_format()
+    K.set_image_data_format('channels_last')
+    y_true = np.random.random((2, 11, 10, 3))
+    y_pred = np.random.random((2, 11, 10, 3))
+    for kernel_size, strides in [(3, None), (2, None), (3, 1), (4, 2)]:
+        dssim = DSSIMObjective(kernel_size=kernel_size, strides=strides)
+        expected = _patch_dssim(y_true, y_pred, kernel_size, strides or kernel_size)
+        actual = K.eval(dssim(K.constant(y_true), K.constant(y_pred)))
+        assert_allclose(expected, actual, atol=1e-5)
+    K.set_image_data_format(prev_data)
+
+
+def test_DSSIM_gaussian_window():
+    np.random.seed(1337)
+    x = np.random.random((2, 16, 16, 3))
+    # correlated with `x`, so the structural similarity is not 0
+    y = np.clip(x + 0.2 * np.random.standard_normal(x.shape), 0., 1.)
+    for kernel_size, strides in [(7, 1), (5, 2)]:
+        dssim = DSSIMObjective(kernel_size=kernel_size, strides=strides, window='gaussian', sigma=1.5)
+        expected = _patch_dssim(x, y, kernel_size, strides, sigma=1.5)
+        x_k, y_k = x, y
+        if K.image_data_format() == 'channels_first':
+            x_k, y_k = x.transpose(0, 3, 1, 2), y.transpose(0, 3, 1, 2)
+        assert_allclose(0.0, K.eval(dssim(K.constant(x_k), K.constant(x_k))), atol=1e-4)
+        assert_allclose(expected, K.eval(dssim(K.constant(x_k), K.constant(y_k))), atol=1e-5)
+
+    with pytest.raises(ValueError):
+        DSSIMObjective(window='disk')
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -1,12 +1,14 @@
 import pytest
 import numpy as np
+from numpy.testing import assert_allclose
 
 import keras
 from keras import backend as K
 from keras_contrib.metrics import segmentation_metrics
+from keras_contrib.metrics import ConfusionMatrixMetric
 
 
-shaped_obj = [segmentation_metrics.pixel_accuracy,
+shaped_obj = [segmentation_metrics.categorical_pixel_accuracy,
               segmentation_metrics.mean_accuracy,
               segmentation_metrics.mean_intersection_over_union]
 
@@ -22,5 +24,62 @@ def test_objective_shapes():
             assert K.eval(objective_output).shape == tuple()
 
 
+def test_confusion_matrix_metrics():
+    y_true = np.array([[0, 0, 1, 1], [2, 2, 255, 3]])
+    y_pred = np.array([[0, 1, 1, 1], [2, 0, 2, 0]])
+    confusion = segmentation_metrics.confusion_matrix(y_true, y_pred, 4, ignore_label=255)
+    assert confusion.sum() == 7
+    assert_allclose(confusion, [[1, 1, 0, 0],
+                                [0, 2, 0, 0],
+                                [1, 0, 1, 0],
+                                [1, 0, 0, 0]])
+    metrics = segmentation_metrics.confusion_matrix_metrics(confusion)
+    assert_allclose(metrics['class_iou'], [1. / 4, 2. / 3, 1. / 2, 0.])
+    assert_allclose(metrics['mean_iou'], np.mean([1. / 4, 2. / 3, 1. / 2, 0.]))
+    assert_allclose(metrics['pixel_accuracy'], 4. / 7)
+    assert_allclose(metrics['mean_accuracy'], np.mean([1. / 2, 1., 1. / 2, 0.]))
+
+
+@pytest.mark.parametrize('sparse_target', [True, False])
+def test_confusion_matrix_metric_streaming(sparse_target):
+    classes = 4
+    batches = [(np.random.randint(0, classes + 1, (2, 5, 6)), np.random.random((2, 5, 6, classes)))
+               for _ in range(3)]
+    expected = segmentation_metrics.confusion_matrix_metrics(
+        sum(segmentation_metrics.confusion_matrix(y_true, y_pred.argmax(-1), classes)
+            for y_true, y_pred in batches))
+
+    for metric in ['mean_iou', 'pixel_accuracy', 'mean_accuracy', 'class_iou']:
+        metric_fn = ConfusionMatrixMetric(classes, metric=metric, class_id=1,
+                                          sparse_target=sparse_target)
+        y_true = K.placeholder(ndim=4 if not sparse_target else 3)
+        y_pred = K.placeholder(ndim=4)
+        result = metric_fn(y_true, y_pred)
+        update = K.function([y_true, y_pred], [result], updates=metric_fn.updates)
+        for labels, y_pred_val in batches:
+            if not sparse_target:
+                # labels equal to `classes` are all-zero one-hot pixels
+                labels = np.eye(classes + 1)[labels][..., :classes]
+            value = update([labels, y_pred_val])[0]
+        expected_value = expected['class_iou'][1] if metric == 'class_iou' else expected[metric]
+        assert_allclose(value, expected_value, rtol=1e-5)
+
+        metric_fn.reset_states()
+        assert K.get_value(metric_fn.confusion).sum() == 0
+
+
+def test_confusion_matrix_metric_in_model():
+    model = keras.models.Sequential([keras.layers.Dense(3, activation='softmax', input_shape=(4, 2))])
+    model.compile(loss='sparse_categorical_crossentropy', optimizer='sgd',
+                  metrics=[ConfusionMatrixMetric(3, sparse_target=True)])
+    x = np.random.random((8, 4, 2))
+    y = np.random.randint(0, 3, (8, 4, 1))
+    history = model.fit(x, y, batch_size=2, epochs=1, verbose=0)
+    assert 0. <= history.history['mean_iou'][0] <= 1.
+    expected = segmentation_metrics.confusion_matrix_metrics(
+        segmentation_metrics.confusion_matrix(y, model.predict(x).argmax(-1), 3))
+    assert_allclose(model.evaluate(x, y, batch_size=8, verbose=0)[1], expected['mean_iou'], rtol=1e-5)
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -1,6 +1,53 @@
 from __future__ import print_function
+import pytest
+import numpy as np
+from keras import backend as K
 from keras_contrib.tests import optimizers
 from keras_contrib.optimizers import ftml
+from keras_contrib.utils.test_utils import keras_test
 
 optimizers._test_optimizer(ftml())
 optimizers._test_optimizer(ftml(lr=0.003, beta_1=0.8, beta_2=0.9, epsilon=1e-5, decay=1e-3))
+optimizers._test_optimizer(ftml(loss_scale='dynamic'))
+optimizers._test_optimizer(ftml(fused=True))
+optimizers._test_optimizer(ftml(lazy=True))
+
+
+@keras_test
+def test_same_updates_fused():
+    optimizers._test_same_updates(ftml(), ftml(fused=True))
+
+
+@keras_test
+@pytest.mark.skipif(K.backend() != 'tensorflow', reason='sparse gradients are only supported on TensorFlow')
+@pytest.mark.parametrize('fused', [False, True])
+def test_lazy_updates(fused):
+    optimizers._test_lazy_updates(ftml(fused=fused), ftml(lazy=True, fused=fused))
+
+
+@keras_test
+@pytest.mark.skipif(K.backend() != 'tensorflow', reason='sparse gradients are only supported on TensorFlow')
+def test_lazy_catch_up():
+    skipped_steps = 3
+    lr, beta_1, beta_2, epsilon = 0.0025, 0.6, 0.999, 1e-8
+    w_first, first, last = optimizers._train_lazy_catch_up(ftml(lazy=True), skipped_steps)
+    w_first = w_first[5:]
+    # iterations, then the z, v and d slots of the embeddings
+    z_first, v_first, d_first = first[1][5:], first[2][5:], first[3][5:]
+    z_last, v_last, d_last = last[1][5:], last[2][5:], last[3][5:]
+
+    # the gradients of the rows are 0 at their last step: their second moment
+    # is decayed for the skipped steps and the last step, and the other slots
+    # are updated from their values at the first step
+    t = skipped_steps + 2
+    expected_v = beta_2 ** (skipped_steps + 1) * v_first
+    expected_d = (np.sqrt(expected_v / (1. - beta_2 ** t)) + epsilon) * (1. - beta_1 ** t) / lr
+    expected_z = beta_1 * z_first - (expected_d - beta_1 * d_first) * w_first
+    np.testing.assert_allclose(v_last, expected_v, rtol=1e-4)
+    np.testing.assert_allclose(d_last, expected_d, rtol=1e-4)
+    np.testing.assert_allclose(z_last, expected_z, rtol=1e-3, atol=1e-6)
+    assert np.all(last[-1][5:] == t)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,82 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+from keras import backend as K
+from keras.optimizers import SGD
+from keras_contrib.callbacks import CyclicLR
+from keras_contrib.optimizers import FTML
+from keras_contrib.optimizers import GradientAccumulation
+from keras_contrib.optimizers import Padam
+from keras_contrib.tests import optimizers
+from keras_contrib.utils.test_utils import keras_test
+
+
+@keras_test
+@pytest.mark.parametrize('optimizer', [lambda: SGD(lr=0.1, momentum=0.9), Padam, FTML])
+def test_same_updates_as_large_batches(optimizer):
+    x_train, y_train = optimizers.get_test_data()
+    model = optimizers.get_model(x_train.shape[1], 10, y_train.shape[1])
+    accumulated_model = optimizers.get_model(x_train.shape[1], 10, y_train.shape[1])
+    accumulated_model.set_weights(model.get_weights())
+    model.compile(loss='categorical_crossentropy', optimizer=optimizer())
+    accumulated_model.compile(loss='categorical_crossentropy',
+                              optimizer=GradientAccumulation(optimizer(), accum_steps=4))
+    for i in range(3):
+        model.train_on_batch(x_train[32 * i:32 * (i + 1)], y_train[32 * i:32 * (i + 1)])
+        for j in range(4):
+            batch = slice(32 * i + 8 * j, 32 * i + 8 * (j + 1))
+            accumulated_model.train_on_batch(x_train[batch], y_train[batch])
+    for w, accumulated_w in zip(model.get_weights(), accumulated_model.get_weights()):
+        assert_allclose(w, accumulated_w, rtol=1e-5, atol=1e-6)
+
+
+@keras_test
+def test_updates_every_accum_steps():
+    x_train, y_train = optimizers.get_test_data()
+    model = optimizers.get_model(x_train.shape[1], 10, y_train.shape[1])
+    opt = GradientAccumulation(Padam(), accum_steps=3)
+    model.compile(loss='categorical_crossentropy', optimizer=opt)
+    weights = model.get_weights()
+    for i in range(2):
+        model.train_on_batch(x_train[8 * i:8 * (i + 1)], y_train[8 * i:8 * (i + 1)])
+        for w, new_w in zip(weights, model.get_weights()):
+            assert_allclose(w, new_w)
+    model.train_on_batch(x_train[16:24], y_train[16:24])
+    assert any(np.any(w != new_w) for w, new_w in zip(weights, model.get_weights()))
+    assert K.get_value(opt.iterations) == 3
+    assert K.get_value(opt.optimizer.iterations) == 1
+
+
+@keras_test
+def test_cyclic_lr():
+    x_train, y_train = optimizers.get_test_data()
+    model = optimizers.get_model(x_train.shape[1], 10, y_train.shape[1])
+    model.compile(loss='categorical_crossentropy',
+                  optimizer=GradientAccumulation(Padam(), accum_steps=2))
+    clr = CyclicLR(base_lr=0.01, max_lr=0.1, step_size=8.)
+    model.fit(x_train[:160], y_train[:160], batch_size=16, epochs=1, callbacks=[clr], verbose=0)
+    assert_allclose(K.get_value(model.optimizer.lr), clr.clr())
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        GradientAccumulation(Padam(), accum_steps=0)
+    with pytest.raises(ValueError):
+        GradientAccumulation(Padam(loss_scale='dynamic'))
+
+
+@keras_test
+@pytest.mark.parametrize('optimizer', [Padam, lambda: 'adam'])
+def test_optimizer(optimizer):
+    optimizers._test_optimizer(GradientAccumulation(optimizer(), accum_steps=2))
+
+
+def test_from_config_keeps_config():
+    config = GradientAccumulation('adam', accum_steps=2).get_config()
+    class_name = config['optimizer']['class_name']
+    GradientAccumulation.from_config(config)
+    assert config['optimizer']['class_name'] == class_name
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,98 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+from keras import backend as K
+from keras.layers import Dense
+from keras_contrib.layers import CRF
+from keras.models import Sequential
+from keras_contrib.optimizers import FTML
+from keras_contrib.optimizers import Padam
+from keras_contrib.utils.test_utils import keras_test
+
+
+@keras_test
+@pytest.mark.parametrize('optimizer', [Padam, FTML])
+def test_dynamic_loss_scale_skips_overflow(optimizer):
+    model = Sequential([Dense(2, input_shape=(3,))])
+    opt = optimizer(loss_scale='dynamic')
+    model.compile(loss='mse', optimizer=opt)
+    x = np.random.random((4, 3))
+    y = 1e3 * np.random.random((4, 2))
+
+    # the gradients overflow, the step is skipped and the scale halved
+    max_scale = np.finfo('float32').max
+    K.set_value(opt.loss_scaler.scale, max_scale)
+    weights = model.get_weights()
+    model.train_on_batch(x, y)
+    for w, new_w in zip(weights, model.get_weights()):
+        assert_allclose(w, new_w)
+    assert_allclose(K.get_value(opt.loss_scaler.scale), max_scale / 2, rtol=1e-6)
+
+    # a finite step is applied
+    K.set_value(opt.loss_scaler.scale, 2. ** 10)
+    model.train_on_batch(x, y)
+    assert any(np.any(w != new_w) for w, new_w in zip(weights, model.get_weights()))
+    assert K.get_value(opt.loss_scaler.finite_steps) == 1
+
+
+@keras_test
+@pytest.mark.parametrize('optimizer', [Padam, FTML])
+def test_float16_training(optimizer):
+    floatx = K.floatx()
+    K.set_floatx('float16')
+    try:
+        crf = CRF(4)
+        model = Sequential([Dense(8, input_shape=(6, 5)), crf])
+        opt = optimizer(loss_scale='dynamic')
+        model.compile(loss=crf.loss_function, optimizer=opt)
+        x = np.random.random((8, 6, 5))
+        y = np.eye(4)[np.random.randint(0, 4, (8, 6))]
+        losses = [model.train_on_batch(x, y) for _ in range(5)]
+        assert np.all(np.isfinite(losses))
+
+        assert all(K.dtype(w) == 'float16' for w in model.trainable_weights)
+        assert len(opt.master_weights) == len(model.trainable_weights)
+        assert all(K.dtype(w) == 'float32' for w in opt.master_weights)
+        for w, master in zip(model.trainable_weights, opt.master_weights):
+            assert_allclose(K.get_value(w), K.get_value(master), rtol=1e-3, atol=1e-3)
+        # the hyperparameters and the bias corrections stay in float32
+        for hyperparameter in [opt.lr, opt.beta_1, opt.beta_2, opt.decay]:
+            assert K.dtype(hyperparameter) == 'float32'
+        assert K.dtype(opt.iterations) == 'int64'
+    finally:
+        K.set_floatx(floatx)
+
+
+@keras_test
+@pytest.mark.parametrize('fused', [False, True])
+def test_master_weights_follow_set_weights(fused):
+    floatx = K.floatx()
+    K.set_floatx('float16')
+    try:
+        model = Sequential([Dense(4, input_shape=(3,))])
+        opt = Padam(fused=fused)
+        model.compile(loss='mse', optimizer=opt)
+        x = np.random.random((8, 3))
+        y = np.random.random((8, 4))
+        model.train_on_batch(x, y)
+
+        # the weights set after the first step are not reverted by the next one
+        weights = [np.random.random(w.shape).astype('float16') for w in model.get_weights()]
+        model.set_weights(weights)
+        K.set_value(opt.lr, 0.)
+        model.train_on_batch(x, y)
+        for w, new_w in zip(weights, model.get_weights()):
+            assert_allclose(w, new_w)
+        for w, master in zip(weights, opt.master_weights):
+            assert_allclose(w, K.get_value(master))
+    finally:
+        K.set_floatx(floatx)
+
+
+def test_invalid_loss_scale():
+    with pytest.raises(ValueError):
+        Padam(loss_scale=-1.)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
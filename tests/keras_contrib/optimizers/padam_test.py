@@ -1,6 +1,80 @@
 from __future__ import print_function
+import pytest
+import numpy as np
+from keras import backend as K
+from keras.layers import Conv2D, Dense, Flatten
+from keras.models import Sequential
 from keras_contrib.tests import optimizers
 from keras_contrib.optimizers import Padam
+from keras_contrib.utils.test_utils import keras_test
+
 
 optimizers._test_optimizer(Padam())
 optimizers._test_optimizer(Padam(decay=1e-3))
+optimizers._test_optimizer(Padam(loss_scale='dynamic'))
+optimizers._test_optimizer(Padam(loss_scale=128.))
+optimizers._test_optimizer(Padam(fused=True))
+optimizers._test_optimizer(Padam(amsgrad=True, fused=True))
+optimizers._test_optimizer(Padam(lazy=True))
+optimizers._test_optimizer(Padam(factored=True))
+optimizers._test_optimizer(Padam(amsgrad=True, factored=True))
+optimizers._test_optimizer(Padam(first_moment_dtype='float16'))
+optimizers._test_optimizer(Padam(fused=True, first_moment_dtype='float16'))
+
+
+@keras_test
+def test_factored_state():
+    model = Sequential([Conv2D(8, (3, 3), input_shape=(6, 6, 2)),
+                        Flatten(),
+                        Dense(2)])
+    optimizer = Padam(amsgrad=True, factored=True, first_moment_dtype='float16')
+    report = optimizer.get_state_report(model.trainable_weights)
+    params = sum(int(np.prod(w.shape)) for w in model.get_weights())
+    assert report['dense_state_bytes'] == 3 * 4 * params
+    assert report['saved_bytes'] == report['dense_state_bytes'] - report['state_bytes']
+    assert report['saved_bytes'] > 0
+
+    model.compile(loss='mse', optimizer=optimizer)
+    model.train_on_batch(np.random.random((4, 6, 6, 2)), np.random.random((4, 2)))
+    slots = [w for w in optimizer.get_weights()[1:] if w.size > 1]
+    assert sum(w.nbytes for w in slots) == report['state_bytes']
+    assert all(np.isfinite(w).all() for w in model.get_weights())
+
+
+@keras_test
+@pytest.mark.parametrize('amsgrad', [False, True])
+def test_same_updates_fused(amsgrad):
+    optimizers._test_same_updates(Padam(amsgrad=amsgrad), Padam(amsgrad=amsgrad, fused=True))
+
+
+def test_factored_fused():
+    with pytest.raises(ValueError):
+        Padam(factored=True, fused=True)
+
+
+@keras_test
+@pytest.mark.skipif(K.backend() != 'tensorflow', reason='sparse gradients are only supported on TensorFlow')
+@pytest.mark.parametrize('kwargs', [{}, {'amsgrad': True}, {'fused': True}])
+def test_lazy_updates(kwargs):
+    optimizers._test_lazy_updates(Padam(**kwargs), Padam(lazy=True, **kwargs))
+
+
+@keras_test
+@pytest.mark.skipif(K.backend() != 'tensorflow', reason='sparse gradients are only supported on TensorFlow')
+def test_lazy_catch_up():
+    skipped_steps = 3
+    beta_1, beta_2 = 0.9, 0.999
+    _, first, last = optimizers._train_lazy_catch_up(Padam(lazy=True), skipped_steps)
+    # iterations, then the first and the second moments of the embeddings
+    m_first, v_first = first[1][5:], first[2][5:]
+    m_last, v_last = last[1][5:], last[2][5:]
+    # the gradients of the rows are 0 at their last step, so their moments
+    # are only decayed, once per skipped step and once for the last step
+    np.testing.assert_allclose(m_last, beta_1 ** (skipped_steps + 1) * m_first, rtol=1e-4)
+    np.testing.assert_allclose(v_last, beta_2 ** (skipped_steps + 1) * v_first, rtol=1e-4)
+    assert np.all(last[-1][5:] == skipped_steps + 2)
+    assert np.all(last[-1][:5] == skipped_steps + 2)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -1,4 +1,5 @@
 from keras.preprocessing.image import img_to_array, array_to_img
+from keras_contrib.preprocessing.image_segmentation import SegBucketSequence
 from keras_contrib.preprocessing.image_segmentation import SegDataGenerator
 from keras_contrib.preprocessing import image_segmentation
 from PIL import Image as PILImage
@@ -59,3 +60,33 @@ def test_pair_random_crop():
 
 def test_seg_data_generator():
     datagen = SegDataGenerator()
+
+
+def test_seg_bucket_sequence(tmpdir):
+    classes = 3
+    sizes = [(30, 40), (31, 38), (12, 10), (64, 64)]
+    names = ['image_%d' % i for i in range(len(sizes))]
+    for name, size in zip(names, sizes):
+        image = np.random.randint(0, 255, size + (3,)).astype('uint8')
+        PILImage.fromarray(image).save(str(tmpdir.join(name + '.jpg')))
+        label = np.random.randint(0, classes, size).astype('uint8')
+        PILImage.fromarray(label).save(str(tmpdir.join(name + '.png')))
+    file_path = str(tmpdir.join('val.txt'))
+    with open(file_path, 'w') as f:
+        f.write('\n'.join(names) + '\n')
+
+    sequence = SegBucketSequence(file_path, SegDataGenerator(data_format='channels_last'),
+                                 str(tmpdir), '.jpg', str(tmpdir), '.png', classes,
+                                 data_format='channels_last', batch_size=2,
+                                 size_multiple=16, max_pad_ratio=0.5)
+    assert sorted(j for batch in sequence.batches for j in batch) == list(range(len(sizes)))
+    assert [0, 1] in sequence.batches or [1, 0] in sequence.batches
+    for idx in range(len(sequence)):
+        batch_x, batch_y = sequence[idx]
+        assert batch_x.shape[1] % 16 == 0 and batch_x.shape[2] % 16 == 0
+        assert batch_x.shape[:3] == batch_y.shape[:3]
+        for j, y in sequence.crop(idx, batch_y):
+            assert y.shape[:2] == sizes[j]
+            assert y.max() < classes
+        # the padding is ignored by the loss
+        assert batch_y.max() <= classes
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+from keras.layers import Dense, Input
+from keras.models import Model
+from keras_contrib.utils.ensemble_utils import SnapshotEnsemble
+from keras_contrib.utils.test_utils import keras_test
+
+
+def _model():
+    inputs = Input(shape=(5,))
+    x = Dense(8, activation='relu')(inputs)
+    outputs = Dense(3, activation='softmax')(x)
+    return Model(inputs, outputs)
+
+
+def _save_snapshots(model, tmpdir, count=3):
+    predictions = []
+    x = np.random.random((10, 5))
+    for i in range(count):
+        model.set_weights([np.random.normal(size=w.shape) for w in model.get_weights()])
+        model.save_weights(os.path.join(str(tmpdir), 'Model-%d.h5' % (i + 1)))
+        predictions.append(model.predict(x))
+    return x, np.mean(predictions, axis=0)
+
+
+@keras_test
+@pytest.mark.parametrize('mode', ['batched', 'swap'])
+def test_snapshot_ensemble(tmpdir, mode):
+    model = _model()
+    x, y_mean = _save_snapshots(model, tmpdir)
+    weights = model.get_weights()
+
+    ensemble = SnapshotEnsemble(model, os.path.join(str(tmpdir), 'Model-[0-9]*.h5'), mode=mode)
+    assert [os.path.basename(f) for f in ensemble.filepaths] == ['Model-1.h5', 'Model-2.h5', 'Model-3.h5']
+    assert_allclose(ensemble.predict(x, batch_size=4), y_mean, rtol=1e-5, atol=1e-6)
+    for w, new_w in zip(weights, model.get_weights()):
+        assert_allclose(w, new_w)
+
+
+def test_snapshot_ensemble_errors(tmpdir):
+    with pytest.raises(ValueError):
+        SnapshotEnsemble(_model(), os.path.join(str(tmpdir), '*.h5'))
+    with pytest.raises(ValueError):
+        SnapshotEnsemble(_model(), ['Model-1.h5'], mode='sequential')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
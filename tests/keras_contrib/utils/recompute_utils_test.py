@@ -0,0 +1,82 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+from keras import backend as K
+from keras.layers import Input, Conv2D, BatchNormalization, Activation
+from keras.layers import GlobalAveragePooling2D, Dense, add
+from keras.models import Model
+from keras_contrib import backend as KC
+from keras_contrib.utils.recompute_utils import checkpointing_report
+from keras_contrib.utils.recompute_utils import enable_gradient_checkpointing
+from keras_contrib.utils.recompute_utils import select_checkpoint_layers
+from keras_contrib.utils.test_utils import keras_test
+
+
+def _residual_model(blocks=4):
+    inputs = Input(shape=(8, 8, 4))
+    x = inputs
+    for i in range(blocks):
+        y = Conv2D(4, (3, 3), padding='same', name='conv_%d' % i)(x)
+        y = BatchNormalization(name='bn_%d' % i)(y)
+        y = Activation('relu')(y)
+        x = add([x, y], name='add_%d' % i)
+    x = GlobalAveragePooling2D()(x)
+    outputs = Dense(3, activation='softmax')(x)
+    return Model(inputs, outputs)
+
+
+@keras_test
+def test_select_checkpoint_layers():
+    model = _residual_model(blocks=4)
+    assert [layer.name for layer in select_checkpoint_layers(model)] == ['add_0', 'add_1', 'add_2', 'add_3']
+    assert [layer.name for layer in select_checkpoint_layers(model, segments=2)] == ['add_1', 'add_3']
+
+
+@keras_test
+def test_checkpointing_report():
+    model = _residual_model(blocks=4)
+    report = checkpointing_report(model, ['add_1', 'add_3'], batch_size=2)
+    assert report['segments'] == 2
+    assert report['checkpointed_bytes'] < report['activation_bytes']
+    assert 0 < report['recompute_ratio'] < 1
+    assert report['memory_ratio'] < 1
+
+
+@keras_test
+def test_enable_gradient_checkpointing():
+    x = np.random.random((4, 8, 8, 4))
+    y = np.eye(3)[np.random.randint(0, 3, 4)]
+    model = _residual_model()
+    model.compile(loss='categorical_crossentropy', optimizer='sgd')
+    report = enable_gradient_checkpointing(model, ['add_1', 'add_3'])
+    assert report['segments'] == 2
+
+    # the gradients are evaluated in a single call, on the same batch
+    # statistics, instead of comparing the weights after training steps
+    loss = model.total_loss
+    weights = model.trainable_weights
+    checkpoints = [model.get_layer('add_1').output, model.get_layer('add_3').output]
+    grads = K.gradients(loss, weights)
+    checkpointed_grads = KC.gradients_with_checkpoints(loss, weights, checkpoints)
+    optimizer_grads = model.optimizer.get_gradients(loss, weights)
+    inputs = model._feed_inputs + model._feed_targets + model._feed_sample_weights
+    values = [x, y, np.ones(len(x))]
+    if model._uses_dynamic_learning_phase():
+        inputs += [K.learning_phase()]
+        values += [1]
+    f = K.function(inputs, grads + checkpointed_grads + optimizer_grads)
+    outputs = f(values)
+    n = len(weights)
+    for g, g_checkpointed, g_optimizer in zip(outputs[:n], outputs[n:2 * n], outputs[2 * n:]):
+        assert_allclose(g_checkpointed, g, rtol=1e-5, atol=1e-6)
+        assert_allclose(g_optimizer, g, rtol=1e-5, atol=1e-6)
+
+
+@keras_test
+def test_enable_gradient_checkpointing_requires_compile():
+    with pytest.raises(ValueError):
+        enable_gradient_checkpointing(_residual_model())
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
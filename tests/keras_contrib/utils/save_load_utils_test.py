@@ -1,5 +1,8 @@
 import pytest
+import json
 import os
+import h5py
+import numpy as np
 from keras import backend as K
 from keras.layers import Input, Dense
 from keras.models import Model
@@ -7,6 +10,12 @@ from numpy.testing import assert_allclose
 from keras.utils.test_utils import keras_test
 
 from keras_contrib.utils.save_load_utils import save_all_weights, load_all_weights
+from keras_contrib.utils.save_load_utils import AsyncWeightsWriter
+from keras_contrib.utils.save_load_utils import save_incremental_weights, load_incremental_weights
+from keras_contrib.utils.save_load_utils import load_weights_parallel
+from keras_contrib.utils.save_load_utils import save_sharded_weights, load_sharded_weights
+from keras_contrib.optimizers import FTML
+from keras_contrib.optimizers import Padam
 
 
 @pytest.mark.skipif(K.backend() != 'tensorflow', reason='save_all_weights and load_all_weights only supported on TensorFlow')
@@ -49,5 +58,292 @@ def test_save_and_load_all_weights():
     os.remove('model.h5')
 
 
+@keras_test
+def test_async_weights_writer(tmpdir):
+    def make_model():
+        _x = Input((10,))
+        _y = Dense(10)(Dense(5)(_x))
+        return Model(_x, _y)
+
+    m1 = make_model()
+    writer = AsyncWeightsWriter(max_pending=1)
+    filepaths = [str(tmpdir.join('weights-%d.h5' % i)) for i in range(3)]
+    weights = []
+    for filepath in filepaths:
+        m1.set_weights([w + 1 for w in m1.get_weights()])
+        weights.append(m1.get_weights())
+        writer.save(m1, filepath)
+    writer.close()
+
+    m2 = make_model()
+    for filepath, expected in zip(filepaths, weights):
+        assert not os.path.exists(filepath + '.tmp')
+        m2.load_weights(filepath)
+        for w, w_expected in zip(m2.get_weights(), expected):
+            assert_allclose(w, w_expected)
+    with pytest.raises(ValueError):
+        writer.save(m1, filepaths[0])
+
+
+@keras_test
+def test_save_and_load_incremental_weights(tmpdir):
+    def make_model():
+        _x = Input((50,))
+        _h = Dense(100, trainable=False, name='frozen')(_x)
+        _y = Dense(2, name='head')(_h)
+        _m = Model(_x, _y)
+        _m.compile('adam', 'mean_squared_error')
+        _m._make_train_function()
+        return _m
+
+    dirpath = str(tmpdir.join('checkpoints'))
+    m1 = make_model()
+    x = np.random.random((8, 50))
+    y = np.random.random((8, 2))
+    save_incremental_weights(m1, dirpath)
+    first_weights = m1.get_weights()
+    m1.train_on_batch(x, y)
+    save_incremental_weights(m1, dirpath)
+
+    # the frozen layer is only written in the first chunk
+    chunk_sizes = [os.path.getsize(str(tmpdir.join('checkpoints', 'chunk-%05d.h5' % i))) for i in range(2)]
+    assert chunk_sizes[1] < chunk_sizes[0]
+
+    m2 = make_model()
+    load_incremental_weights(m2, dirpath)
+    for w1, w2 in zip(m1.get_weights(), m2.get_weights()):
+        assert_allclose(w1, w2)
+    for w1, w2 in zip(m1.optimizer.get_weights(), m2.optimizer.get_weights()):
+        assert_allclose(w1, w2)
+    load_incremental_weights(m2, dirpath, checkpoint=0)
+    for w1, w2 in zip(first_weights, m2.get_weights()):
+        assert_allclose(w1, w2)
+    with pytest.raises(ValueError):
+        load_incremental_weights(m2, dirpath, checkpoint=5)
+
+
+@keras_test
+def test_incremental_weights_untrained_model(tmpdir):
+    def make_model():
+        _x = Input((10,))
+        _y = Dense(2)(_x)
+        _m = Model(_x, _y)
+        _m.compile('adam', 'mean_squared_error')
+        return _m
+
+    # the optimizer state is saved and loaded before the first step
+    dirpath = str(tmpdir.join('checkpoints'))
+    m1 = make_model()
+    manifest_path = save_incremental_weights(m1, dirpath)
+    with open(manifest_path) as f:
+        assert len(json.load(f)['optimizer_weights']) == len(m1.optimizer.weights) > 0
+    m1.train_on_batch(np.random.random((8, 10)), np.random.random((8, 2)))
+    save_incremental_weights(m1, dirpath)
+
+    m2 = make_model()
+    load_incremental_weights(m2, dirpath)
+    assert K.get_value(m2.optimizer.iterations) == 1
+    for w1, w2 in zip(m1.get_weights(), m2.get_weights()):
+        assert_allclose(w1, w2)
+    for w1, w2 in zip(m1.optimizer.get_weights(), m2.optimizer.get_weights()):
+        assert_allclose(w1, w2)
+
+
+@keras_test
+def test_load_weights_parallel(tmpdir):
+    def make_model():
+        _x = Input((10,))
+        _y = Dense(10, name='output')(Dense(5, name='hidden')(_x))
+        _m = Model(_x, _y)
+        _m.compile('adam', 'mean_squared_error')
+        _m._make_train_function()
+        return _m
+
+    m1 = make_model()
+    m1.train_on_batch(np.random.random((4, 10)), np.random.random((4, 10)))
+    weights_path = str(tmpdir.join('weights.h5'))
+    all_weights_path = str(tmpdir.join('all_weights.h5'))
+    m1.save_weights(weights_path)
+    save_all_weights(m1, all_weights_path)
+
+    for filepath in [weights_path, all_weights_path]:
+        m2 = make_model()
+        timings = load_weights_parallel(m2, filepath, workers=2)
+        assert list(timings.keys()) == ['hidden', 'output', 'batch_set_value']
+        for w1, w2 in zip(m1.get_weights(), m2.get_weights()):
+            assert_allclose(w1, w2)
+    for w1, w2 in zip(m1.optimizer.get_weights(), m2.optimizer.get_weights()):
+        assert_allclose(w1, w2)
+
+    _x = Input((10,))
+    with pytest.raises(ValueError):
+        load_weights_parallel(Model(_x, Dense(10)(_x)), weights_path)
+
+
+def _storage_size(obj):
+    # bytes of a dataset, or of the datasets of a quantized group
+    if isinstance(obj, h5py.Dataset):
+        return obj.id.get_storage_size()
+    return sum(_storage_size(obj[key]) for key in obj)
+
+
+@pytest.mark.parametrize('quantization', [None, 'float16', 'uint8'])
+@keras_test
+def test_save_all_weights_compressed(tmpdir, quantization):
+    def make_model():
+        _x = Input((64,))
+        _y = Dense(64)(_x)
+        _m = Model(_x, _y)
+        _m.compile(Padam(), 'mean_squared_error')
+        _m._make_train_function()
+        return _m
+
+    m1 = make_model()
+    for _ in range(3):
+        m1.train_on_batch(np.random.random((8, 64)), np.random.random((8, 64)))
+    raw_path = str(tmpdir.join('raw.h5'))
+    compressed_path = str(tmpdir.join('compressed.h5'))
+    save_all_weights(m1, raw_path)
+    save_all_weights(m1, compressed_path, compression='gzip',
+                     optimizer_quantization=quantization, block_size=64)
+    if quantization is not None:
+        # the chunks and groups of a file this small outweigh the savings, so
+        # the quantized datasets are compared, not the files
+        with h5py.File(raw_path, 'r') as raw, h5py.File(compressed_path, 'r') as compressed:
+            raw, compressed = raw['optimizer_weights'], compressed['optimizer_weights']
+            names = [name.decode('utf8') for name in raw.attrs['weight_names']]
+            quantized = [name for name in names if 'quantization' in compressed[name].attrs]
+            assert len(quantized) == len(names) - 1
+            assert (sum(_storage_size(compressed[name]) for name in quantized) <
+                    sum(_storage_size(raw[name]) for name in quantized))
+
+    for load in [load_all_weights, load_weights_parallel]:
+        m2 = make_model()
+        load(m2, compressed_path)
+        for w1, w2 in zip(m1.get_weights(), m2.get_weights()):
+            assert_allclose(w1, w2)
+        weights1 = m1.optimizer.get_weights()
+        weights2 = m2.optimizer.get_weights()
+        # the iterations are exact
+        assert weights1[0] == weights2[0]
+        for w1, w2 in zip(weights1[1:], weights2[1:]):
+            assert w1.dtype == w2.dtype
+            if np.all(w1 >= 0):
+                # second moments, quantized in log space
+                assert np.all((w1 == 0) == (w2 == 0))
+                assert_allclose(w1, w2, rtol=5e-2)
+            else:
+                assert_allclose(w1, w2, rtol=1e-2, atol=(np.max(w1) - np.min(w1)) / 255.)
+
+    with pytest.raises(ValueError):
+        save_all_weights(m1, compressed_path, optimizer_quantization='int4')
+
+
+@pytest.mark.parametrize('quantization', ['float16', 'uint8'])
+@pytest.mark.parametrize('optimizer', [lambda: Padam(amsgrad=True), FTML])
+@keras_test
+def test_quantized_resume(tmpdir, quantization, optimizer):
+    def make_model():
+        _x = Input((64,))
+        _y = Dense(64)(_x)
+        _m = Model(_x, _y)
+        _m.compile(optimizer(), 'mean_squared_error')
+        _m._make_train_function()
+        return _m
+
+    np.random.seed(1337)
+    m1 = make_model()
+    # gradients of very different scales, small second moments included
+    x = np.random.random((8, 64)) * np.logspace(-4, 0, 64)
+    y = np.random.random((8, 64))
+    for _ in range(5):
+        m1.train_on_batch(x, y)
+    raw_path = str(tmpdir.join('raw.h5'))
+    quantized_path = str(tmpdir.join('quantized.h5'))
+    save_all_weights(m1, raw_path)
+    save_all_weights(m1, quantized_path, optimizer_quantization=quantization, block_size=64)
+
+    # the first step after resuming from the quantized slots matches the
+    # step after resuming from the exact ones
+    steps = []
+    for path in [raw_path, quantized_path]:
+        m2 = make_model()
+        load_all_weights(m2, path)
+        assert K.get_value(m2.optimizer.iterations) == 5
+        weights = m2.get_weights()
+        m2.train_on_batch(x, y)
+        steps.append([w2 - w for w, w2 in zip(weights, m2.get_weights())])
+    for raw_step, quantized_step in zip(*steps):
+        assert_allclose(quantized_step, raw_step, rtol=5e-2, atol=1e-3 * np.max(np.abs(raw_step)))
+
+
+@keras_test
+def test_save_and_load_sharded_weights(tmpdir):
+    def make_model(head=10):
+        _x = Input((10,))
+        _h = Dense(20, name='backbone_1')(_x)
+        _h = Dense(20, name='backbone_2')(_h)
+        _y = Dense(head, name='head')(_h)
+        _m = Model(_x, _y)
+        _m.compile('adam', 'mean_squared_error')
+        _m._make_train_function()
+        return _m
+
+    dirpath = str(tmpdir.join('sharded'))
+    m1 = make_model()
+    m1.train_on_batch(np.random.random((4, 10)), np.random.random((4, 10)))
+    save_sharded_weights(m1, dirpath, num_shards=3)
+    assert len([f for f in os.listdir(dirpath) if f.startswith('shard-')]) == 3
+
+    m2 = make_model()
+    load_sharded_weights(m2, dirpath)
+    for w1, w2 in zip(m1.get_weights(), m2.get_weights()):
+        assert_allclose(w1, w2)
+    for w1, w2 in zip(m1.optimizer.get_weights(), m2.optimizer.get_weights()):
+        assert_allclose(w1, w2)
+
+    # only the backbone, in a model with another head
+    m3 = make_model(head=2)
+    head_weights = m3.get_layer('head').get_weights()
+    load_sharded_weights(m3, dirpath, layers=['backbone_1', 'backbone_2'])
+    for name in ['backbone_1', 'backbone_2']:
+        for w1, w3 in zip(m1.get_layer(name).get_weights(), m3.get_layer(name).get_weights()):
+            assert_allclose(w1, w3)
+    for w, w3 in zip(head_weights, m3.get_layer('head').get_weights()):
+        assert_allclose(w, w3)
+    with pytest.raises(ValueError):
+        load_sharded_weights(m3, dirpath)
+
+    # corrupted shards are detected
+    for filename in os.listdir(dirpath):
+        if filename.startswith('shard-'):
+            with open(os.path.join(dirpath, filename), 'ab') as f:
+                f.write(b'corrupted')
+    with pytest.raises(ValueError):
+        load_sharded_weights(m2, dirpath)
+
+
+@keras_test
+def test_sharded_weights_untrained_model(tmpdir):
+    def make_model():
+        _x = Input((10,))
+        _y = Dense(2, name='head')(_x)
+        _m = Model(_x, _y)
+        _m.compile('adam', 'mean_squared_error')
+        return _m
+
+    dirpath = str(tmpdir.join('sharded'))
+    m1 = make_model()
+    m1.train_on_batch(np.random.random((4, 10)), np.random.random((4, 2)))
+    save_sharded_weights(m1, dirpath, num_shards=2)
+
+    # the optimizer state is loaded in a model compiled but not trained yet
+    m2 = make_model()
+    load_sharded_weights(m2, dirpath)
+    assert K.get_value(m2.optimizer.iterations) == 1
+    for w1, w2 in zip(m1.optimizer.get_weights(), m2.optimizer.get_weights()):
+        assert_allclose(w1, w2)
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
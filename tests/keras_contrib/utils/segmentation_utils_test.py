@@ -0,0 +1,156 @@
+import os
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+from PIL import Image
+from keras.layers import Input, Conv2D
+from keras.models import Model
+from keras_contrib.metrics.segmentation_metrics import confusion_matrix
+from keras_contrib.preprocessing import SegDataGenerator
+from keras_contrib.utils.segmentation_utils import _blend_window
+from keras_contrib.utils.segmentation_utils import evaluate_segmentation
+from keras_contrib.utils.segmentation_utils import predict_buckets
+from keras_contrib.utils.segmentation_utils import predict_tiled
+from keras_contrib.utils.test_utils import keras_test
+
+
+def test_evaluate_segmentation(tmpdir):
+    classes = 5
+    label_dir = tmpdir.mkdir('labels')
+    pred_dir = tmpdir.mkdir('predictions')
+    names = ['image_%d' % i for i in range(7)]
+    confusion = np.zeros((classes, classes), dtype='int64')
+    for i, name in enumerate(names):
+        shape = (6 + i, 8)
+        label = np.random.randint(0, classes, shape).astype('uint8')
+        label[0, :3] = 255
+        Image.fromarray(label).save(os.path.join(str(label_dir), name + '.png'))
+        scores = np.random.random(shape + (classes,))
+        np.save(os.path.join(str(pred_dir), name + '.npy'), scores)
+        confusion += confusion_matrix(label, scores.argmax(-1), classes, ignore_label=255)
+    file_path = str(tmpdir.join('val.txt'))
+    with open(file_path, 'w') as f:
+        f.write('\n'.join(names) + '\n')
+
+    for workers in [1, 2]:
+        metrics = evaluate_segmentation(file_path, str(pred_dir), str(label_dir), classes,
+                                        pred_suffix='.npy', workers=workers, chunksize=2)
+        assert_allclose(metrics['confusion_matrix'], confusion)
+        assert metrics['confusion_matrix'].sum() == sum((6 + i) * 8 - 3 for i in range(7))
+        assert 0. <= metrics['mean_iou'] <= 1.
+
+
+def test_evaluate_segmentation_shape_mismatch(tmpdir):
+    Image.fromarray(np.zeros((4, 4), dtype='uint8')).save(str(tmpdir.join('a_label.png')))
+    Image.fromarray(np.zeros((4, 5), dtype='uint8')).save(str(tmpdir.join('a_pred.png')))
+    file_path = str(tmpdir.join('val.txt'))
+    with open(file_path, 'w') as f:
+        f.write('a\n')
+    with pytest.raises(ValueError):
+        evaluate_segmentation(file_path, str(tmpdir), str(tmpdir), 2, pred_suffix='_pred.png',
+                              label_suffix='_label.png', workers=1)
+
+
+def _pointwise_model(classes=4):
+    inputs = Input(shape=(None, None, 3))
+    outputs = Conv2D(classes, (1, 1), activation='softmax')(inputs)
+    return Model(inputs, outputs)
+
+
+def _spatial_model(classes=4):
+    inputs = Input(shape=(None, None, 3))
+    outputs = Conv2D(classes, (3, 3), padding='same')(inputs)
+    return Model(inputs, outputs)
+
+
+def _predict_tiled_reference(model, image, tile_size, stride, flips):
+    """Predicts each tile on its own and blends them with `_blend_window`."""
+    pad = [(0, max(t - s, 0)) for t, s in zip(tile_size, image.shape[:2])]
+    padded = np.pad(image, pad + [(0, 0)], 'constant')
+    starts = []
+    for size, tile, step in zip(padded.shape[:2], tile_size, stride):
+        starts.append([0] if size <= tile else list(range(0, size - tile, step)) + [size - tile])
+    window = _blend_window(tile_size, [t - s for t, s in zip(tile_size, stride)])[..., None]
+    output = 0.
+    weight = np.zeros(padded.shape[:2] + (1,))
+    for r in starts[0]:
+        for c in starts[1]:
+            tile = padded[r:r + tile_size[0], c:c + tile_size[1]]
+            y = model.predict(tile[None])[0]
+            if 'horizontal' in flips:
+                y += model.predict(tile[None, :, ::-1])[0, :, ::-1]
+            if 'vertical' in flips:
+                y += model.predict(tile[None, ::-1])[0, ::-1]
+            y /= 1 + len(flips)
+            blended = np.zeros(padded.shape[:2] + y.shape[-1:])
+            blended[r:r + tile_size[0], c:c + tile_size[1]] = window * y
+            output = output + blended
+            weight[r:r + tile_size[0], c:c + tile_size[1]] += window
+    return (output / weight)[:image.shape[0], :image.shape[1]]
+
+
+def test_blend_window():
+    window = _blend_window((8, 6), (2, 0))
+    rows = np.array([1, 2, 3, 3, 3, 3, 2, 1]) / 3.
+    assert_allclose(window, np.outer(rows, np.ones(6)))
+
+
+@keras_test
+def test_predict_tiled():
+    model = _spatial_model()
+    images = [np.random.random((37, 50, 3)), np.random.random((16, 9, 3))]
+    for flips in [(), ('horizontal', 'vertical')]:
+        outputs = predict_tiled(model, images, tile_size=(16, 16), overlap=0.25,
+                                batch_size=3, flips=flips)
+        for output, image in zip(outputs, images):
+            expected = _predict_tiled_reference(model, image, (16, 16), (12, 12), flips)
+            assert output.shape == image.shape[:2] + (4,)
+            assert_allclose(output, expected, atol=1e-5)
+
+    # only the pixels on the border of a tile lack context, the others
+    # match the untiled prediction
+    image = images[0]
+    untiled = model.predict(image[None])[0]
+    output = predict_tiled(model, image[None], tile_size=(16, 16), overlap=0.25)[0]
+    error = np.abs(output - untiled)
+    assert_allclose(error[:12, :12], 0., atol=1e-5)
+    assert error.max() > 1e-3
+
+    model = _pointwise_model()
+    batch = np.random.random((2, 20, 20, 3))
+    outputs = predict_tiled(model, batch, tile_size=(8, 8), overlap=(2, 2), memory_budget=1)
+    assert_allclose(outputs, model.predict(batch), atol=1e-5)
+
+
+@keras_test
+def test_predict_tiled_requires_tile_size():
+    with pytest.raises(ValueError):
+        predict_tiled(_pointwise_model(), np.zeros((1, 8, 8, 3)))
+
+
+@keras_test
+def test_predict_buckets(tmpdir):
+    sizes = [(20, 30), (40, 24), (21, 29), (8, 8), (39, 25)]
+    names = ['image_%d' % i for i in range(len(sizes))]
+    for name, size in zip(names, sizes):
+        image = np.random.randint(0, 255, size + (3,)).astype('uint8')
+        Image.fromarray(image).save(str(tmpdir.join(name + '.png')))
+    file_path = str(tmpdir.join('val.txt'))
+    with open(file_path, 'w') as f:
+        f.write('\n'.join(names) + '\n')
+
+    model = _pointwise_model()
+    datagen = SegDataGenerator()
+    buckets = datagen.flow_buckets_from_directory(file_path, str(tmpdir), '.png',
+                                                  batch_size=4, size_multiple=8)
+    singles = datagen.flow_buckets_from_directory(file_path, str(tmpdir), '.png',
+                                                  batch_size=1, size_multiple=1)
+    assert len(buckets) < len(singles) == len(sizes)
+    outputs = predict_buckets(model, buckets)
+    for output, expected, size in zip(outputs, predict_buckets(model, singles), sizes):
+        assert output.shape == size + (4,)
+        assert_allclose(output, expected, atol=1e-5)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])